@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.events import EventsRouter  # noqa: E402
+from recipe.async_views import AsyncReadRouter  # noqa: E402
+
+application = EventsRouter(AsyncReadRouter(django_application))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+import tempfile
 
 from datetime import timedelta
 
@@ -40,32 +41,155 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
-    'core',
+    'core.apps.CoreConfig',
     'user',
     'recipe',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.JWTAuthentication',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.RequestRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.environ.get('THROTTLE_READ_RATE', '1200/min'),
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '300/min'),
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '30/min'),
+    },
 }
 
+# Token buckets of the throttles, see core.throttling. the processes mapping
+# the THROTTLE_TABLE file share their buckets, in memory under /dev/shm by
+# default. an empty THROTTLE_TABLE gives each process buckets of its own, and
+# each its own budget.
+THROTTLE_TABLE = os.environ.get('THROTTLE_TABLE', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+    'recipe-app-throttle'))
+THROTTLE_SLOTS = 65536
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=3),
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.environ.get('JWT_ACCESS_MINUTES', 3 * 24 * 60))),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Access tokens issued within JWT_STATELESS_SECONDS authenticate from their
+# is_active and is_staff claims without a user query, 0 turns it off. pair
+# it with a JWT_ACCESS_MINUTES of the same window, clients refresh their
+# tokens at user/token/refresh/ which reads the claims again.
+JWT_STATELESS_SECONDS = int(os.environ.get('JWT_STATELESS_SECONDS', 0))
+
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.slow_query.SlowQueryMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.CsrfViewMiddleware',
+    'core.middleware.AuthenticationMiddleware',
+    'core.middleware.MessageMiddleware',
+    'core.middleware.XFrameOptionsMiddleware',
 ]
 
+# The api authenticates with JWT, the session, csrf, auth, messages and
+# clickjacking middleware of core.middleware skip the requests under
+# these paths. the admin keeps all of them.
+MIDDLEWARE_SKIPPED_PATHS = ('/api/', )
+
+# Request profiling, a request is profiled when it's sampled by SAMPLE_RATE
+# or it carries the HEADER with TOKEN as value. see `profile_report` command.
+
+REQUEST_PROFILER = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILER_SAMPLE_RATE', 0)),
+    'HEADER': 'HTTP_X_PROFILE',
+    'TOKEN': os.environ.get('PROFILER_TOKEN', ''),
+    'DIR': os.environ.get('PROFILER_DIR', '/vol/web/profiles'),
+}
+
+# Slow query log, off unless SLOW_QUERY_LOG=1. queries slower than
+# THRESHOLD_MS are logged to PATH with the view and caller that ran them, the
+# file rotates past MAX_BYTES. see `slow_queries` command.
+
+SLOW_QUERY_LOG = {
+    'ENABLED': os.environ.get('SLOW_QUERY_LOG', '0') == '1',
+    'THRESHOLD_MS': float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200)),
+    'EXPLAIN': os.environ.get('SLOW_QUERY_EXPLAIN', '0') == '1',
+    'PATH': os.environ.get('SLOW_QUERY_LOG_PATH',
+                           '/vol/web/logs/slow_queries.log'),
+    'MAX_BYTES': int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES',
+                                    10 * 1024 * 1024)),
+    'BACKUP_COUNT': 2,
+    'READ_BYTES': 1024 * 1024,
+}
+
+# Change events streamed by the asgi application, see core.events. the
+# local backend only reaches clients of the writing process, run several
+# processes with core.events.PostgresBackend.
+
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'core.events.LocalBackend')
+EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT', 15))
+EVENTS_QUEUE_SIZE = 100
+
+# The asgi application answers the recipe, tag and ingredient reads with
+# async queries when ASYNC_READS is set, see recipe.async_views. they use
+# asyncpg when it's installed, with pools of ASYNC_DB_POOL_SIZE.
+
+ASYNC_READS = os.environ.get('ASYNC_READS', '1') == '1'
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+
+# Batched requests, see core.batch. a batch holds up to BATCH_MAX_REQUESTS
+# requests of BATCH_PATHS, the reads between writes run on BATCH_MAX_WORKERS
+# threads.
+
+BATCH_PATHS = ('/api/recipe/', '/api/user/')
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+
+# Users created by one request to the provisioning api, see
+# user.views.ProvisionUsersView. their passwords are hashed in the request,
+# larger files go through the provision_users command.
+
+PROVISION_MAX_ROWS = 50
+
+# Caches. 'shared' is seen by every process through the database, run
+# createcachetable once. 'api' keeps the recent values of each process in
+# front of it, see core.cache.TwoLevelCache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'core_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    'api': {
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': int(os.environ.get('API_CACHE_SECONDS', 300)),
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 2,
+        },
+    },
+}
+API_CACHE = 'api'
+
+# In memory ingredient indexes of recipes/cook/, see recipe.coverage. each
+# process keeps those of the last COVERAGE_INDEX_USERS users searching, an
+# index is rebuilt rather than caught up past COVERAGE_INDEX_REBUILD changes.
+
+COVERAGE_INDEX_USERS = int(os.environ.get('COVERAGE_INDEX_USERS', 100))
+COVERAGE_INDEX_REBUILD = 5000
+
+# Seconds recipes/meal-plan/ searches for a better plan than the best found.
+
+MEAL_PLAN_TIME_LIMIT = float(os.environ.get('MEAL_PLAN_TIME_LIMIT', 0.5))
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -90,17 +214,85 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# DB_CONN_MAX_AGE keeps connections open between requests, they are checked
+# with a ping every DB_HEALTH_CHECK_INTERVAL seconds. DB_POOL_SIZE > 0 uses
+# the pooled backend of core, which is best combined with DB_CONN_MAX_AGE=0.
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql' if DB_POOL_SIZE
+        else 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
-
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+        },
     }
 }
 
+# Read replicas, DB_REPLICAS lists them as host=weight pairs, for example
+# "replica-a=3,replica-b=1". Safe requests under REPLICA_ROUTED_PATHS read
+# from a replica picked by weight, unless their user wrote in the last
+# REPLICA_STICKY_SECONDS. a write sets the signed REPLICA_STICKY_COOKIE on
+# the client for that long, the worker serving the next read checks it
+# without a lookup.
+
+DATABASE_REPLICAS = {}
+for index, replica in enumerate(
+        filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    replica_host, _, replica_weight = replica.partition('=')
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'],
+        HOST=replica_host,
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS[f'replica{index}'] = int(replica_weight or 1)
+
+if not DATABASE_REPLICAS:
+    # stand-in replica on the primary; it gets no traffic unless it's
+    # listed in DATABASE_REPLICAS, as the routing tests do.
+    DATABASES['replica'] = dict(DATABASES['default'],
+                                TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_ROUTED_PATHS = ('/api/', )
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_STICKY_COOKIE = 'replica_sticky'
+
+DB_HEALTH_CHECK_INTERVAL = int(os.environ.get('DB_HEALTH_CHECK_INTERVAL', 30))
+
+# seconds the /healthz database check is reused for.
+HEALTHZ_CACHE_SECONDS = 5
+
+# RECIPE_PARTITIONS > 1 makes the migrations hash partition the recipe
+# tables by owner (postgresql 12+). existing installs convert online with
+# the partition_recipes command.
+RECIPE_PARTITIONS = int(os.environ.get('RECIPE_PARTITIONS', 0))
+
+
+# Password hashing, PASSWORD_HASHER hashes the new passwords. the hashes of
+# the other hashers, or of other PASSWORD_PBKDF2_ITERATIONS, are hashed
+# again with it when their user logs in.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER',
+                                 'core.hashers.PBKDF2PasswordHasher')
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'core.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ) if hasher != PASSWORD_HASHER
+]
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 180000))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
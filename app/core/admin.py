@@ -1,13 +1,110 @@
-from django.contrib import admin
+import json
+
+from django.contrib import admin, messages
 from django.contrib.admin import ModelAdmin as BaseModelAdmin
-from django.utils.translation import gettext as _
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _, ngettext
+
+from . import similarity
+from .deletion import delete_recipe_attrs, request_recipe_deletion
+from .models import User, Tag, Ingredient, Recipe, RecipeTag, \
+    RecipeIngredient, Change
+
+
+def estimate_count(queryset):
+    """ return the number of rows of queryset the postgres planner
+    expects, or None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def in_batches(queryset, size):
+    """ yield querysets of the rows of queryset, size at a time in id
+    order.
+    """
+    ids = queryset.order_by('id').values_list('id', flat=True)
+    last = None
+    while True:
+        batch = list((ids if last is None else ids.filter(id__gt=last))
+                     [:size])
+        if not batch:
+            return
+        yield queryset.order_by().filter(id__in=batch)
+        last = batch[-1]
+
+
+class EstimatedCountPaginator(Paginator):
+    """ paginator counting up to exact_limit rows, the planner estimates
+    the count of larger results instead of a scan of all of them.
+    """
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        count = self.object_list.order_by()[:self.exact_limit + 1].count()
+        if count <= self.exact_limit:
+            return count
+        estimate = estimate_count(self.object_list)
+        if estimate is None:
+            return super().count
+
+        return max(estimate, count)
+
+
+class ScalableAdminMixin:
+    """ changelists for large tables: estimated counts, no second count
+    of the whole table, and a search of the indexed prefixes of the lower
+    cased search_fields.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """ find the rows where one of search_fields starts with the
+        term, read from the lower(field) indexes.
+        """
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        condition = Q()
+        for field in self.search_fields:
+            queryset = queryset.annotate(**{f'{field}_lower': Lower(field)})
+            condition |= Q(**{f'{field}_lower__startswith': term})
+
+        return queryset.filter(condition), False
+
+
+class BatchedActionsMixin:
+    """ actions working on action_batch_size rows at a time, in place of
+    the default delete which lists every related row first.
+    """
+    action_batch_size = 1000
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
 
-from .models import User, Tag, Ingredient, Recipe
+        return actions
 
 
-class ModelAdmin(BaseModelAdmin):
+class ModelAdmin(ScalableAdminMixin, BaseModelAdmin):
     ordering = ['id']
     list_display = ['name', 'email']
+    search_fields = ['email']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (_('Personal Info'), {'fields': ('name', )}),
@@ -25,7 +122,117 @@ class ModelAdmin(BaseModelAdmin):
     )
 
 
+class RecipeAttrAdmin(ScalableAdminMixin, BatchedActionsMixin,
+                      BaseModelAdmin):
+    list_display = ['name', 'user', 'recipe_count']
+    list_select_related = ['user']
+    search_fields = ['name']
+    autocomplete_fields = ['user']
+    ordering = ['-id']
+    actions = ['delete_in_batches', 'reconcile_counts']
+
+    def delete_in_batches(self, request, queryset):
+        """ delete the selected rows and their recipe links, a batch of
+        one owner per transaction.
+        """
+        deleted = 0
+        for batch in in_batches(queryset, self.action_batch_size):
+            ids = {}
+            for user_id, pk in batch.values_list('user_id', 'id'):
+                ids.setdefault(user_id, []).append(pk)
+            for user_id, user_ids in ids.items():
+                deleted += delete_recipe_attrs(
+                    self.model, user_id, user_ids, batch.db)['deleted']
+        self.message_user(request, _('Deleted %(count)d %(items)s.') % {
+            'count': deleted,
+            'items': self.opts.verbose_name_plural,
+        }, messages.SUCCESS)
+    delete_in_batches.short_description = _(
+        'Delete selected %(verbose_name_plural)s')
+
+    def reconcile_counts(self, request, queryset):
+        """ correct the recipe counts of the selected rows."""
+        corrected = sum(batch.reconcile() for batch in
+                        in_batches(queryset, self.action_batch_size))
+        self.message_user(request, ngettext(
+            'Corrected %d recipe count.', 'Corrected %d recipe counts.',
+            corrected) % corrected, messages.SUCCESS)
+    reconcile_counts.short_description = _('Reconcile recipe counts')
+
+
 admin.site.register(User, ModelAdmin)
-admin.site.register(Tag)
-admin.site.register(Ingredient)
-admin.site.register(Recipe)
+admin.site.register(Tag, RecipeAttrAdmin)
+admin.site.register(Ingredient, RecipeAttrAdmin)
+
+
+class RecipeTagInline(admin.TabularInline):
+    model = RecipeTag
+    exclude = ('user', )
+    autocomplete_fields = ('tag', )
+    extra = 1
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    exclude = ('user', )
+    autocomplete_fields = ('ingredient', )
+    extra = 1
+
+
+class RecipeAdmin(ScalableAdminMixin, BatchedActionsMixin, BaseModelAdmin):
+    inlines = [RecipeTagInline, RecipeIngredientInline]
+    list_display = ['title', 'user', 'created_at']
+    list_select_related = ['user']
+    search_fields = ['title']
+    autocomplete_fields = ['user']
+    date_hierarchy = 'created_at'
+    ordering = ['-id']
+    actions = ['queue_deletion']
+
+    def get_queryset(self, request):
+        """ hide the recipes that wait for deletion."""
+        return super().get_queryset(request).live()
+
+    def save_formset(self, request, form, formset, change):
+        """ store the recipe owner on the tag and ingredient rows.
+
+        the rows are saved without m2m_changed, the recipe change, the
+        recipe counts and the signature are kept up to date here.
+        """
+        recipe = form.instance
+        through = formset.model
+        column = f'{through.target}_id'
+        links = through.objects.filter(user_id=recipe.user_id,
+                                       recipe_id=recipe.pk)
+        before = set(links.values_list(column, flat=True))
+        for link in formset.save(commit=False):
+            link.user_id = recipe.user_id
+            link.save()
+        for link in formset.deleted_objects:
+            link.delete()
+        after = set(links.values_list(column, flat=True))
+        if before == after:
+            return
+
+        Change.objects.record(recipe.user_id, Change.RECIPE, [recipe.pk])
+        if recipe.deleted_at is None:
+            model = through._meta.get_field(through.target).related_model
+            for ids, sign in ((after - before, 1), (before - after, -1)):
+                model.objects.filter(id__in=sorted(ids)).update(
+                    recipe_count=F('recipe_count') + sign)
+        similarity.refresh(recipe.user_id, [recipe.pk])
+
+    def queue_deletion(self, request, queryset):
+        """ queue the selected recipes for deletion like the api does,
+        action_batch_size per transaction.
+        """
+        queued = sum(request_recipe_deletion(batch) for batch in
+                     in_batches(queryset, self.action_batch_size))
+        self.message_user(request, ngettext(
+            'Queued %d recipe for deletion.',
+            'Queued %d recipes for deletion.', queued) % queued,
+            messages.SUCCESS)
+    queue_deletion.short_description = _('Delete selected recipes')
+
+
+admin.site.register(Recipe, RecipeAdmin)
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import signals
+        from .db import check_connections
+
+        request_started.connect(check_connections)
+        signals.connect()
@@ -0,0 +1,125 @@
+import asyncio
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+try:
+    import asyncpg
+except ImportError:
+    # optional, the queries run in worker threads without it.
+    asyncpg = None
+
+
+PLACEHOLDER_RE = re.compile(r'%s')
+
+
+def numbered_placeholders(sql):
+    """ turn the %s placeholders of sql into asyncpg's $1, $2, ..."""
+    counter = iter(range(1, sql.count('%s') + 1))
+
+    return PLACEHOLDER_RE.sub(lambda match: f'${next(counter)}', sql)
+
+
+class ThreadDatabase:
+    """ run the queries of an alias on django connections, in a pool of
+    ASYNC_DB_POOL_SIZE threads.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.executor = ThreadPoolExecutor(
+            getattr(settings, 'ASYNC_DB_POOL_SIZE', 10),
+            thread_name_prefix=f'asyncdb-{alias}')
+        self.connections = set()
+
+    def _fetch(self, sql, params):
+        connection = connections[self.alias]
+        self.connections.add(connection)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        finally:
+            close_old_connections()
+
+    async def fetch(self, sql, params=()):
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, self._fetch, sql, list(params))
+
+    def _close(self):
+        self.executor.shutdown()
+        # the threads are gone, their connections can be closed from here.
+        for connection in self.connections:
+            connection.inc_thread_sharing()
+            connection.close()
+            connection.dec_thread_sharing()
+        self.connections.clear()
+
+    async def close(self):
+        await asyncio.get_event_loop().run_in_executor(None, self._close)
+
+
+class AsyncpgDatabase:
+    """ run the queries of an alias on a pool of asyncpg connections.
+
+    the pool is created by the first query, in the running event loop.
+    its size is set by ASYNC_DB_POOL_SIZE.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.pool = None
+        self.lock = asyncio.Lock()
+
+    async def get_pool(self):
+        async with self.lock:
+            if self.pool is None:
+                db = connections[self.alias].settings_dict
+                self.pool = await asyncpg.create_pool(
+                    host=db.get('HOST') or None,
+                    port=db.get('PORT') or None,
+                    database=db['NAME'],
+                    user=db.get('USER') or None,
+                    password=db.get('PASSWORD') or None,
+                    min_size=1,
+                    max_size=getattr(settings, 'ASYNC_DB_POOL_SIZE', 10),
+                )
+
+        return self.pool
+
+    async def fetch(self, sql, params=()):
+        pool = await self.get_pool()
+        rows = await pool.fetch(numbered_placeholders(sql), *params)
+
+        return [tuple(row) for row in rows]
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+_databases = {}
+
+
+def get_database(alias):
+    """ return the async database of alias for the running event loop."""
+    loop = asyncio.get_event_loop()
+    key = (alias, id(loop))
+    if key not in _databases:
+        use_asyncpg = asyncpg is not None and \
+            connections[alias].vendor == 'postgresql'
+        _databases[key] = (AsyncpgDatabase if use_asyncpg
+                           else ThreadDatabase)(alias)
+
+    return _databases[key]
+
+
+async def close_databases():
+    """ close the databases opened from the running event loop."""
+    loop_id = id(asyncio.get_event_loop())
+    for key in [key for key in _databases if key[1] == loop_id]:
+        await _databases.pop(key).close()
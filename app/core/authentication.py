@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_to_epoch
+
+
+CLAIMS = ('is_active', 'is_staff')
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """ jwt authentication that trusts the user claims of fresh tokens.
+
+    with JWT_STATELESS_SECONDS set, a token issued within that many
+    seconds gives a user built from its claims without a query, the
+    fields it doesn't carry load when they are read. older tokens and
+    tokens without the claims look the user up.
+    """
+
+    def get_user(self, validated_token):
+        user = self.get_token_user(validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+
+        return user
+
+    def get_token_user(self, token):
+        """ return the user of the claims of a fresh token, or None."""
+        window = getattr(settings, 'JWT_STATELESS_SECONDS', 0)
+        if not window or 'iat' not in token or \
+                any(claim not in token for claim in CLAIMS):
+            return None
+        if token['iat'] < datetime_to_epoch(token.current_time) - window:
+            return None
+        if not token['is_active']:
+            raise AuthenticationFailed('User is inactive',
+                                       code='user_inactive')
+
+        field_names = [api_settings.USER_ID_FIELD, *CLAIMS]
+        values = [token[api_settings.USER_ID_CLAIM],
+                  *[token[claim] for claim in CLAIMS]]
+
+        return get_user_model().from_db(DEFAULT_DB_ALIAS, field_names, values)
@@ -0,0 +1,51 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from core.db import get_pool, PoolTimeout
+
+from .creation import DatabaseCreation
+
+
+Database = base.Database
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """ postgresql backend that takes its connections from a pool.
+
+    closing a connection gives it back to the pool of the alias instead
+    of closing the socket. the pool is configured by the POOL entry of
+    the database settings: {'MAX_SIZE': 10, 'TIMEOUT': 5}.
+    """
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        try:
+            connection = self.pool.acquire(connect)
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc)) from exc
+
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        connection = self.connection
+        reusable = not self.errors_occurred and not connection.closed
+        if reusable:
+            try:
+                # end any open transaction before the connection is reused.
+                connection.rollback()
+            except Database.Error:
+                reusable = False
+
+        self.pool.release(connection, reusable)
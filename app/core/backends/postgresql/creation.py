@@ -0,0 +1,11 @@
+from django.db.backends.postgresql import creation
+
+from core.db import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would keep the test database in use.
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
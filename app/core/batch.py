@@ -0,0 +1,175 @@
+import io
+import json
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection, connections, \
+    transaction
+from django.urls import Resolver404, resolve
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+# headers the sub requests don't inherit from the batch request.
+DROPPED_META = (
+    'HTTP_AUTHORIZATION', 'HTTP_COOKIE', 'HTTP_ACCEPT', 'CONTENT_TYPE',
+    'CONTENT_LENGTH', 'QUERY_STRING',
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+# connections of the batch threads, kept open up to CONN_MAX_AGE.
+_connections = set()
+
+
+def get_executor():
+    """ return the threads the reads of batches run on."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                getattr(settings, 'BATCH_MAX_WORKERS', 4),
+                thread_name_prefix='batch')
+
+    return _executor
+
+
+def shutdown():
+    """ stop the batch threads and close their connections."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+        # the threads are gone, their connections can be closed from here.
+        for thread_connection in _connections:
+            thread_connection.inc_thread_sharing()
+            thread_connection.close()
+            thread_connection.dec_thread_sharing()
+        _connections.clear()
+
+
+def is_batchable(path):
+    """ return true if path may be requested in a batch."""
+    return urlsplit(path).path.startswith(
+        tuple(getattr(settings, 'BATCH_PATHS', ())))
+
+
+def sub_request(request, method, path, body=None):
+    """ return a request for path, sent by the user of request.
+
+    the user and token of request are forced on it, so the view doesn't
+    authenticate again.
+    """
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode('utf-8')
+    environ = {key: value for key, value in request.META.items()
+               if key not in DROPPED_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        # wsgi paths are the url decoded bytes, as latin-1.
+        'PATH_INFO': unquote_to_bytes(url.path).decode('iso-8859-1'),
+        'QUERY_STRING': url.query,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content),
+    })
+    sub = WSGIRequest(environ)
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+
+    return sub
+
+
+def response_body(response):
+    """ return the data of response, decoded from its content when the view
+    encoded it ahead of time.
+    """
+    data = getattr(response, 'data', None)
+    if data is not None or not hasattr(response, 'render'):
+        return data
+    response.render()
+
+    return json.loads(response.content) if response.content else None
+
+
+def dispatch(request):
+    """ run the view of request and return its status and data."""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+    request.resolver_match = match
+    response = match.func(request, *match.args, **match.kwargs)
+
+    return {
+        'status': response.status_code,
+        'body': response_body(response),
+    }
+
+
+def dispatch_in_thread(request):
+    try:
+        return dispatch(request)
+    finally:
+        close_old_connections()
+        # the batch threads of every request add theirs.
+        with _executor_lock:
+            _connections.update(thread_connection
+                                for thread_connection in connections.all()
+                                if thread_connection.connection is not None)
+
+
+def run_batch(request, operations):
+    """ run operations one after the other, the reads between two writes
+    concurrently, and return their responses in order.
+
+    the reads run in the request thread when it's in a transaction, the
+    other threads would not see what it wrote.
+    """
+    concurrent = getattr(settings, 'BATCH_MAX_WORKERS', 4) > 1 and \
+        not connection.in_atomic_block
+    responses = []
+    reads = []
+
+    def flush():
+        if len(reads) > 1 and concurrent:
+            responses.extend(get_executor().map(dispatch_in_thread, reads))
+        else:
+            responses.extend(dispatch(read) for read in reads)
+        reads.clear()
+
+    for operation in operations:
+        sub = sub_request(request, **operation)
+        if sub.method in SAFE_METHODS:
+            reads.append(sub)
+            continue
+        flush()
+        responses.append(dispatch(sub))
+    flush()
+
+    return responses
+
+
+def run_atomic_batch(request, operations):
+    """ run operations in order in one transaction, rolled back when one
+    of them fails. the operations after a failure are not run.
+    """
+    responses = []
+    with transaction.atomic():
+        for operation in operations:
+            response = dispatch(sub_request(request, **operation))
+            responses.append(response)
+            if response['status'] >= 400:
+                transaction.set_rollback(True)
+                break
+
+    skipped = {'status': 424, 'body': {'detail': 'Not run, the batch failed.'}}
+
+    return responses + [skipped] * (len(operations) - len(responses))
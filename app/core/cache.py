@@ -0,0 +1,306 @@
+import secrets
+import threading
+import time
+
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+MISSING = object()
+
+
+class LocalCache:
+    """ values of one process, the least recently used dropped past
+    max_entries and any of them after timeout seconds.
+
+    values are kept as they are, not copied, callers must not change them.
+    """
+
+    def __init__(self, max_entries=1000, timeout=2):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, timeout=None):
+        """ keep value for timeout seconds at most, the local timeout by
+        default.
+        """
+        timeout = self.timeout if timeout is None else \
+            min(timeout, self.timeout)
+        if timeout <= 0:
+            return self.delete(key)
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ProcessState:
+    """ local cache, computations in flight and counts of a two level
+    cache, shared by the threads of the process.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.local = LocalCache(max_entries, timeout)
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+        self.counts = Counter()
+        self.counts_lock = threading.Lock()
+
+
+# django makes a cache backend per thread, their state is kept here.
+_states = {}
+_states_lock = threading.Lock()
+
+
+class TwoLevelCache(BaseCache):
+    """ cache backend answering from a LocalCache of the process in front
+    of the shared cache named by LOCATION.
+
+    OPTIONS are LOCAL_MAX_ENTRIES and LOCAL_TIMEOUT for the local cache,
+    which bounds how long a process sees a value another one replaced, and
+    LOCK_TIMEOUT and LOCK_WAIT for get_or_compute.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location or 'default'
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.lock_wait = options.get('LOCK_WAIT', 0.05)
+        with _states_lock:
+            state = _states.get(self.shared_alias)
+            if state is None:
+                state = _states[self.shared_alias] = ProcessState(
+                    options.get('LOCAL_MAX_ENTRIES', 1000),
+                    options.get('LOCAL_TIMEOUT', 2))
+        self.local = state.local
+        self.flights = state.flights
+        self.flights_lock = state.flights_lock
+        self.counts = state.counts
+        self.counts_lock = state.counts_lock
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        """ return the hits and misses of this process."""
+        with self.counts_lock:
+            counts = dict(self.counts)
+        lookups = sum(counts.get(name, 0)
+                      for name in ('local_hits', 'shared_hits', 'misses'))
+        hits = counts.get('local_hits', 0) + counts.get('shared_hits', 0)
+
+        return {
+            'local_hits': counts.get('local_hits', 0),
+            'shared_hits': counts.get('shared_hits', 0),
+            'misses': counts.get('misses', 0),
+            'computed': counts.get('computed', 0),
+            'coalesced': counts.get('coalesced', 0),
+            'hit_ratio': hits / lookups if lookups else None,
+        }
+
+    def timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def lookup(self, key):
+        """ return the value of a made key, or MISSING, from the local
+        cache first.
+        """
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            self.count('local_hits')
+            return value
+        value = self.shared.get(key, MISSING)
+        if value is not MISSING:
+            self.count('shared_hits')
+            self.local.set(key, value)
+            return value
+        self.count('misses')
+
+        return MISSING
+
+    def get(self, key, default=None, version=None):
+        value = self.lookup(self.make_key(key, version))
+
+        return default if value is MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        timeout = self.timeout(timeout)
+        self.shared.set(key, value, timeout)
+        self.local.set(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        timeout = self.timeout(timeout)
+        added = self.shared.add(key, value, timeout)
+        if added:
+            self.local.set(key, value, timeout)
+
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(self.make_key(key, version),
+                                 self.timeout(timeout))
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version)
+        self.local.delete(key)
+
+        return self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def namespace_version(self, namespace):
+        """ return the current version of the keys of namespace."""
+        key = self.make_key(f'namespace:{namespace}')
+        version = self.local.get(key, MISSING)
+        if version is not MISSING:
+            return version
+        version = self.shared.get(key, MISSING)
+        if version is MISSING:
+            self.shared.add(key, secrets.token_hex(8), None)
+            version = self.shared.get(key)
+        self.local.set(key, version)
+
+        return version
+
+    def key_in(self, namespace, key):
+        """ return key versioned by namespace, see bump. other processes
+        may read the keys of the previous version for LOCAL_TIMEOUT.
+        """
+        return f'{namespace}:{self.namespace_version(namespace)}:{key}'
+
+    def bump(self, namespace):
+        """ replace the version of namespace, its keys are not read again.
+
+        versions are random so a version evicted from the shared cache
+        can't come back.
+        """
+        key = self.make_key(f'namespace:{namespace}')
+        version = secrets.token_hex(8)
+        self.shared.set(key, version, None)
+        self.local.set(key, version)
+
+    @contextmanager
+    def flight(self, key):
+        """ let one thread of the process at a time in for key."""
+        with self.flights_lock:
+            lock, waiting = self.flights.get(key, (threading.Lock(), 0))
+            self.flights[key] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.flights_lock:
+                lock, waiting = self.flights[key]
+                if waiting == 1:
+                    del self.flights[key]
+                else:
+                    self.flights[key] = (lock, waiting - 1)
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT,
+                       version=None):
+        """ return the value of key, computing and setting it on a miss.
+
+        a missing key is computed once: the threads of the process wait
+        for the first one, the other processes for the one holding its
+        lock in the shared cache, up to LOCK_TIMEOUT before computing it
+        themselves.
+        """
+        made_key = self.make_key(key, version)
+        value = self.lookup(made_key)
+        if value is not MISSING:
+            return value
+
+        with self.flight(made_key):
+            value = self.local.get(made_key, MISSING)
+            if value is MISSING:
+                value = self.shared.get(made_key, MISSING)
+            if value is not MISSING:
+                self.count('coalesced')
+                self.local.set(made_key, value)
+                return value
+
+            lock_key = f'lock:{made_key}'
+            locked = self.shared.add(lock_key, 1, self.lock_timeout)
+            if not locked:
+                value = self.wait_for(made_key, lock_key)
+                if value is not MISSING:
+                    self.count('coalesced')
+                    return value
+            try:
+                value = compute()
+                self.count('computed')
+                self.set(key, value, timeout, version)
+            finally:
+                if locked:
+                    self.shared.delete(lock_key)
+
+            return value
+
+    def wait_for(self, key, lock_key):
+        """ return the value another process is computing for a made key,
+        or MISSING if it gave up or took too long.
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_wait)
+            value = self.shared.get(key, MISSING)
+            if value is not MISSING:
+                self.local.set(key, value)
+                return value
+            if lock_key not in self.shared:
+                break
+
+        return MISSING
+
+
+def api_cache():
+    """ return the cache of the api responses, API_CACHE."""
+    return caches[getattr(settings, 'API_CACHE', 'api')]
+
+
+def user_namespace(user_id):
+    """ return the namespace of the keys of data owned by user_id."""
+    return f'user:{user_id}'
+
+
+def invalidate_user(user_id):
+    """ drop the cached data of user_id."""
+    api_cache().bump(user_namespace(user_id))
@@ -0,0 +1,209 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+
+class PoolTimeout(Exception):
+    """ no connection became free within the pool timeout."""
+
+
+class ConnectionPool:
+    """ a bounded, thread safe pool of raw database connections.
+
+    the pool opens at most max_size connections; acquire waits up to
+    timeout seconds for one to be released when all of them are in use.
+    """
+
+    def __init__(self, max_size, timeout=5.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'acquired': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+        }
+
+    def acquire(self, connect):
+        """ return an idle connection or a new one made by connect."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'no database connection free after {self.timeout}s '
+                        f'(pool size {self.max_size})')
+                self._condition.wait(remaining)
+
+            self._record_wait(time.monotonic() - start)
+            self._stats['acquired'] += 1
+            while self._idle:
+                connection = self._idle.pop()
+                if not getattr(connection, 'closed', False):
+                    return connection
+                self._size -= 1
+                self._stats['discarded'] += 1
+            self._size += 1
+
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._stats['created'] += 1
+
+        return connection
+
+    def release(self, connection, reusable=True):
+        """ give a connection back, closing it when it's not reusable."""
+        with self._condition:
+            if reusable:
+                self._idle.append(connection)
+            else:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            self._condition.notify()
+
+        if not reusable:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close_idle(self):
+        """ close the connections that are not in use."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _record_wait(self, waited):
+        if waited <= 0.001:
+            return
+        self._stats['waits'] += 1
+        self._stats['wait_seconds_total'] += waited
+        self._stats['wait_seconds_max'] = max(
+            self._stats['wait_seconds_max'], waited)
+
+    def stats(self):
+        """ return a snapshot of the pool size and wait time metrics."""
+        with self._condition:
+            return dict(
+                self._stats,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                max_size=self.max_size,
+            )
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    """ return the process wide pool of a database alias.
+
+    connections are only shared between identical targets, a test run
+    that renames the database gets a pool of its own.
+    """
+    key = (alias, settings_dict['NAME'], settings_dict['HOST'],
+           settings_dict['PORT'], settings_dict['USER'])
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[key] = ConnectionPool(
+                max_size=int(options.get('MAX_SIZE', 10)),
+                timeout=float(options.get('TIMEOUT', 5)),
+            )
+
+        return _pools[key]
+
+
+def pool_stats():
+    """ return the metrics of every pool opened by this process."""
+    with _pools_lock:
+        return {
+            f'{alias}:{name}': pool.stats()
+            for (alias, name, *_), pool in _pools.items()
+        }
+
+
+def close_pools():
+    """ close every idle pooled connection of this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+def check_connections(**kwargs):
+    """ close persistent connections that stopped working.
+
+    connected to request_started; each connection is checked at most once
+    per DB_HEALTH_CHECK_INTERVAL seconds so a broken connection kept by
+    CONN_MAX_AGE is replaced before the request uses it.
+    """
+    interval = getattr(settings, 'DB_HEALTH_CHECK_INTERVAL', 30)
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not connection.settings_dict['CONN_MAX_AGE']:
+            continue
+        checked_at = getattr(connection, 'health_checked_at', None)
+        if checked_at is None:
+            connection.health_checked_at = now
+            continue
+        if now - checked_at < interval:
+            continue
+
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+_readiness = {'checked_at': None, 'ready': False}
+
+
+def database_ready(alias='default'):
+    """ return whether the database answers, cached for a few seconds.
+
+    the open connection of the thread is reused when there is one, so
+    frequent probes don't open a new connection each time.
+    """
+    max_age = getattr(settings, 'HEALTHZ_CACHE_SECONDS', 5)
+    now = time.monotonic()
+    checked_at = _readiness['checked_at']
+    if checked_at is not None and now - checked_at < max_age:
+        return _readiness['ready']
+
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        ready = connection.is_usable()
+    except DatabaseError:
+        ready = False
+
+    _readiness.update(checked_at=now, ready=ready)
+
+    return ready
@@ -0,0 +1,210 @@
+import time
+
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from . import similarity
+from .models import Change, Recipe, RecipeTag, RecipeIngredient, Tag, \
+    Ingredient, RecipeSignature, RecipeBucket
+
+
+def in_clause(values):
+    return '({})'.format(', '.join(['%s'] * len(values)))
+
+
+def request_user_deletion(user):
+    """ deactivate user and queue the account for deletion."""
+    get_user_model().objects.filter(pk=user.pk).update(
+        is_active=False,
+        deleted_at=timezone.now()
+    )
+
+
+def request_recipe_deletion(queryset):
+    """ hide the recipes of queryset and queue them for deletion.
+
+    return the number of recipes queued.
+    """
+    recipes = queryset.live()
+    using = recipes.db
+    with transaction.atomic(using=using):
+        # the lock makes a concurrent request wait and then skip the
+        # recipes hidden here, so their links are uncounted once.
+        recipe_ids = {}
+        for user_id, recipe_id in recipes.select_for_update().order_by(
+                'id').values_list('user_id', 'id'):
+            recipe_ids.setdefault(user_id, []).append(recipe_id)
+        queued = 0
+        for user_id, ids in recipe_ids.items():
+            Change.objects.record(user_id, Change.RECIPE, ids, deleted=True,
+                                  using=using)
+            # hidden recipes no longer count, purging them won't uncount.
+            for through in (RecipeTag, RecipeIngredient):
+                through.objects.using(using).filter(
+                    user_id=user_id, recipe_id__in=ids).update_counts(-1)
+            queued += Recipe.objects.using(using).filter(
+                user_id=user_id, id__in=ids).update(deleted_at=timezone.now())
+
+        return queued
+
+
+def delete_recipe_attrs(model, user_id, ids, using=DEFAULT_DB_ALIAS):
+    """ delete the tags or ingredients of ids owned by user_id, unlinking
+    them from their recipes, with one statement per table.
+
+    return the number of rows deleted and of recipe links removed.
+    """
+    through = model.recipe_links.rel.related_model
+    column = f'{through.target}_id'
+    kind = {Tag: Change.TAG, Ingredient: Change.INGREDIENT}[model]
+    with transaction.atomic(using=using), \
+            connections[using].cursor() as cursor:
+        ids = list(model.objects.using(using).select_for_update().filter(
+            user_id=user_id, id__in=ids).order_by('id').values_list(
+            'id', flat=True))
+        if not ids:
+            return {'deleted': 0, 'unlinked': 0}
+        recipe_ids = list(through.objects.using(using).filter(
+            user_id=user_id, **{f'{column}__in': ids}
+        ).values_list('recipe_id', flat=True))
+        Change.objects.record(user_id, Change.RECIPE, recipe_ids,
+                              using=using)
+
+        cursor.execute(
+            f'DELETE FROM {through._meta.db_table} '
+            f'WHERE user_id = %s AND {column} IN {in_clause(ids)}',
+            [user_id, *ids])
+        unlinked = cursor.rowcount
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE user_id = %s AND id IN {in_clause(ids)}',
+            [user_id, *ids])
+        deleted = cursor.rowcount
+        Change.objects.record(user_id, kind, ids, deleted=True, using=using)
+        similarity.refresh(user_id, recipe_ids, using=using)
+
+    return {'deleted': deleted, 'unlinked': unlinked}
+
+
+def delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def delete_recipe_rows(cursor, rows):
+    """ delete recipes given as (user_id, id, image) rows with raw sql.
+
+    the statements are grouped by owner so each one reads one partition
+    of partitioned tables.
+    """
+    recipe_ids = {}
+    for user_id, recipe_id, _ in rows:
+        recipe_ids.setdefault(user_id, []).append(recipe_id)
+
+    tables = (
+        (RecipeTag._meta.db_table, 'recipe_id'),
+        (RecipeIngredient._meta.db_table, 'recipe_id'),
+        (RecipeSignature._meta.db_table, 'recipe_id'),
+        (RecipeBucket._meta.db_table, 'recipe_id'),
+        (Recipe._meta.db_table, 'id'),
+    )
+    for user_id, ids in recipe_ids.items():
+        for table, column in tables:
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE user_id = %s AND {column} IN {in_clause(ids)}',
+                [user_id, *ids]
+            )
+
+
+def purge_recipes(queryset, batch_size, pause=0):
+    """ delete the recipes of queryset in batches, return their number.
+
+    each batch commits on its own, its images are removed once it did.
+    rows locked by another worker are skipped.
+    """
+    using = queryset.db
+    storage = Recipe._meta.get_field('image').storage
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using), \
+                connections[using].cursor() as cursor:
+            rows = list(
+                queryset.select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('user_id', 'id', 'image')[:batch_size]
+            )
+            if not rows:
+                return deleted
+            delete_recipe_rows(cursor, rows)
+            images = [image for *_, image in rows if image]
+            transaction.on_commit(
+                partial(delete_files, storage, images), using=using)
+
+        deleted += len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def purge_rows(model, user, batch_size, using, links=None):
+    """ delete the rows of model owned by user in batches.
+
+    links lists (through model, column) pairs referencing these rows,
+    their rows are deleted first, by owner too so each statement reads
+    one partition of partitioned tables.
+    """
+    rows = model.objects.using(using).filter(user=user).order_by('id')
+    while True:
+        with transaction.atomic(using=using), \
+                connections[using].cursor() as cursor:
+            ids = list(rows.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+            for through, column in links or ():
+                cursor.execute(
+                    f'DELETE FROM {through._meta.db_table} '
+                    f'WHERE user_id = %s AND {column} IN {in_clause(ids)}',
+                    [user.pk, *ids])
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} '
+                f'WHERE user_id = %s AND id IN {in_clause(ids)}',
+                [user.pk, *ids])
+
+
+def purge_user(user, batch_size, pause=0, using=DEFAULT_DB_ALIAS):
+    """ delete a user and everything they own, a batch at a time.
+
+    the bulky rows go first in small transactions, the remaining
+    relations are deleted with the user by the orm.
+    """
+    purge_recipes(
+        Recipe.objects.using(using).filter(user=user), batch_size, pause)
+    purge_rows(Tag, user, batch_size, using,
+               links=[(RecipeTag, 'tag_id')])
+    purge_rows(Ingredient, user, batch_size, using,
+               links=[(RecipeIngredient, 'ingredient_id')])
+    purge_rows(Change, user, batch_size, using)
+
+    with transaction.atomic(using=using):
+        get_user_model().objects.using(using).filter(pk=user.pk).delete()
+
+
+def process_deletions(batch_size=500, pause=0, using=DEFAULT_DB_ALIAS):
+    """ delete every recipe and user that waits for deletion.
+
+    return the number of recipes and users deleted.
+    """
+    recipes = purge_recipes(
+        Recipe.objects.using(using).pending_deletion(), batch_size, pause)
+
+    users = 0
+    pending = get_user_model().objects.using(using).filter(
+        deleted_at__isnull=False).order_by('deleted_at')
+    for user in list(pending):
+        purge_user(user, batch_size, pause, using)
+        users += 1
+
+    return {'recipes': recipes, 'users': users}
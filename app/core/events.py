@@ -0,0 +1,371 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction, \
+    DEFAULT_DB_ALIAS
+from django.utils.module_loading import import_string
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/api/recipe/events/'
+
+
+class Subscription:
+    """ the events of one user waiting to be sent to one client."""
+
+    def __init__(self, user_id, loop, size):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def put(self, events):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # the client is too slow, it has to resync from the feed.
+                self.overflowed = True
+                return
+
+
+class Broker:
+    """ in-process pub/sub of change events, keyed by user."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, user_id, size=100):
+        subscription = Subscription(
+            user_id, asyncio.get_event_loop(), size)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscribers.pop(subscription.user_id, None)
+
+    def dispatch(self, user_id, events):
+        """ hand events to the subscribers of user_id, from any thread."""
+        with self.lock:
+            subscriptions = list(self.subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, events)
+
+
+broker = Broker()
+
+
+class LocalBackend:
+    """ deliver events to the subscribers of this process only."""
+
+    def start(self, broker):
+        pass
+
+    def publish(self, user_id, events, using):
+        if not broker.subscribers:
+            return
+        transaction.on_commit(
+            lambda: broker.dispatch(user_id, events), using=using)
+
+
+class PostgresBackend(LocalBackend):
+    """ deliver events to every process through postgres LISTEN/NOTIFY.
+
+    notifications are sent when the writing transaction commits. each
+    process listens on one connection of its own, from a thread that
+    dispatches them to its subscribers.
+    """
+    channel = 'recipe_events'
+    # a notification payload must stay under 8000 bytes.
+    events_per_notify = 50
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, reconnect_delay=1,
+                 poll_timeout=5):
+        self.using = using
+        self.reconnect_delay = reconnect_delay
+        self.poll_timeout = poll_timeout
+        self.listener = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def publish(self, user_id, events, using):
+        with connections[using].cursor() as cursor:
+            for start in range(0, len(events), self.events_per_notify):
+                payload = json.dumps({
+                    'user': user_id,
+                    'events': events[start:start + self.events_per_notify],
+                })
+                cursor.execute('SELECT pg_notify(%s, %s)',
+                               [self.channel, payload])
+
+    def start(self, broker):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self.listen, args=(broker, ),
+                    name='events-listener', daemon=True)
+                self.listener.start()
+
+    def stop(self):
+        with self.lock:
+            if self.listener is not None:
+                self.stopping.set()
+                self.listener.join()
+                self.listener = None
+                self.stopping.clear()
+
+    def connect(self):
+        wrapper = connections[self.using]
+        connection = wrapper.Database.connect(
+            **wrapper.get_connection_params())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+
+        return connection
+
+    def listen(self, broker):
+        while not self.stopping.is_set():
+            try:
+                connection = self.connect()
+                try:
+                    while not self.stopping.is_set():
+                        select.select([connection], [], [], self.poll_timeout)
+                        connection.poll()
+                        while connection.notifies:
+                            notify = connection.notifies.pop(0)
+                            message = json.loads(notify.payload)
+                            broker.dispatch(message['user'],
+                                            message['events'])
+                finally:
+                    connection.close()
+            except Exception:
+                logger.exception('events listener failed, reconnecting')
+                self.stopping.wait(self.reconnect_delay)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'EVENTS_BACKEND', 'core.events.LocalBackend')
+        _backend = import_string(path)()
+
+    return _backend
+
+
+def publish(user_id, kind, object_ids, first_seq, deleted, using):
+    """ publish the changes recorded for objects of a user."""
+    events = [
+        {'kind': kind, 'id': object_id, 'seq': seq, 'deleted': deleted}
+        for seq, object_id in enumerate(object_ids, start=first_seq)
+    ]
+    get_backend().publish(user_id, events, using)
+
+
+def format_event(event):
+    return (f'id: {event["seq"]}\nevent: change\n'
+            f'data: {json.dumps(event)}\n\n').encode()
+
+
+def authenticate(raw_token):
+    """ return the id of the active user of an access token and its
+    expiry time, or None.
+    """
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+
+    from core.models import User
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    try:
+        if not User.objects.filter(pk=user_id, is_active=True).exists():
+            return None
+    finally:
+        close_old_connections()
+
+    return user_id, token['exp']
+
+
+def missed_events(user_id, since, limit):
+    """ return the changes of a user after since as events, or None when
+    there are more than limit.
+    """
+    from core.models import Change
+    try:
+        changes = list(Change.objects.filter(
+            user_id=user_id, seq__gt=since).order_by('seq').values_list(
+            'kind', 'object_id', 'seq', 'deleted')[:limit + 1])
+    finally:
+        close_old_connections()
+    if len(changes) > limit:
+        return None
+
+    return [
+        {'kind': kind, 'id': object_id, 'seq': seq, 'deleted': deleted}
+        for kind, object_id, seq, deleted in changes
+    ]
+
+
+def request_token(scope):
+    """ return the access token sent in the header or as ?token=.
+
+    browsers can't set headers on an EventSource, so the query string
+    is accepted as well.
+    """
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            parts = value.decode('latin1').split()
+            if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+    query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+
+    return query.get('token', [None])[0]
+
+
+def last_event_id(scope):
+    """ return the seq a reconnecting client has seen, if any."""
+    values = [value for name, value in scope.get('headers', ())
+              if name == b'last-event-id']
+    if not values:
+        query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+        values = [value.encode() for value in query.get('since', [])]
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+async def send_response(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream_events(scope, receive, send):
+    """ stream the change events of the authenticated user.
+
+    a client waiting for events costs a queue and a sleeping task, a
+    comment is sent every EVENTS_HEARTBEAT seconds to keep proxies from
+    closing the connection. the stream ends when the token expires.
+    """
+    if scope['method'] != 'GET':
+        return await send_response(
+            send, 405, b'{"detail": "Method not allowed."}')
+    raw_token = request_token(scope)
+    user = raw_token and await sync_to_async(
+        authenticate, thread_sensitive=True)(raw_token)
+    if not user:
+        return await send_response(
+            send, 401, b'{"detail": "Invalid or missing token."}')
+    user_id, expires = user
+
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    size = getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+    get_backend().start(broker)
+    subscription = broker.subscribe(user_id, size)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body',
+                    'body': b'retry: 5000\n\n', 'more_body': True})
+
+        # missed events are read after subscribing, so none falls in
+        # between; the live ones already sent are skipped by seq.
+        last_seq = last_event_id(scope)
+        if last_seq is not None:
+            events = await sync_to_async(
+                missed_events, thread_sensitive=True)(user_id, last_seq, size)
+            if events is None:
+                subscription.overflowed = True
+            for event in events or ():
+                await send({'type': 'http.response.body',
+                            'body': format_event(event), 'more_body': True})
+                last_seq = event['seq']
+
+        while time.time() < expires and not subscription.overflowed:
+            get = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                [get, disconnected], timeout=heartbeat,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                get.cancel()
+                return
+            if get not in done:
+                get.cancel()
+                body = b': ping\n\n'
+            elif subscription.overflowed:
+                break
+            else:
+                event = get.result()
+                if last_seq is not None and event['seq'] <= last_seq:
+                    continue
+                body = format_event(event)
+            await send({'type': 'http.response.body',
+                        'body': body, 'more_body': True})
+
+        if subscription.overflowed:
+            # the client catches up with the sync endpoint and reconnects.
+            await send({'type': 'http.response.body',
+                        'body': b'event: resync\ndata: {}\n\n',
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+class EventsRouter:
+    """ asgi application serving the event stream, other requests go to
+    the django application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+            return await stream_events(scope, receive, send)
+
+        return await self.application(scope, receive, send)
@@ -0,0 +1,167 @@
+from django.db import models, router, transaction
+from django.db.models import Prefetch, signals
+from django.db.models.fields.related_descriptors import ManyToManyDescriptor
+from django.utils.functional import cached_property
+
+
+def create_user_scoped_manager(superclass, scope_field):
+    """ extend a many to many manager to read and write the through rows
+    of the owner only.
+
+    the reads get the owner as an extra condition of the join the relation
+    makes, the writes go through the through model filtered by owner. with
+    the through table partitioned by owner those queries read a single
+    partition.
+    """
+
+    class UserScopedManyRelatedManager(superclass):
+
+        def __init__(self, instance=None):
+            super().__init__(instance)
+            self.scope_value = getattr(instance, f'{scope_field}_id')
+            self.core_filters['{}__{}_id'.format(
+                self.target_field.related_query_name(), scope_field
+            )] = self.scope_value
+
+        def links(self, db):
+            """ return the through rows of the instance."""
+            return self.through._default_manager.using(db).filter(**{
+                f'{scope_field}_id': self.scope_value,
+                self.source_field_name: self.related_val[0],
+            })
+
+        def target_ids(self, objs):
+            ids = set()
+            for obj in objs:
+                if isinstance(obj, self.model):
+                    if obj.pk is None:
+                        raise ValueError(
+                            f'Cannot link the unsaved {obj!r} to '
+                            f'{self.instance!r}.')
+                    obj = obj.pk
+                ids.add(obj)
+
+            return ids
+
+        def send(self, action, pk_set, db):
+            signals.m2m_changed.send(
+                sender=self.through, action=action, instance=self.instance,
+                reverse=self.reverse, model=self.model, pk_set=pk_set,
+                using=db)
+
+        def add(self, *objs, through_defaults=None):
+            self._remove_prefetched_objects()
+            db = router.db_for_write(self.through, instance=self.instance)
+            target = self.target_field_name
+            ids = self.target_ids(objs)
+            with transaction.atomic(using=db, savepoint=False):
+                missing = ids.difference(self.links(db).filter(**{
+                    f'{target}__in': ids
+                }).values_list(target, flat=True))
+                self.send('pre_add', missing, db)
+                self.through._default_manager.using(db).bulk_create([
+                    self.through(**{
+                        **(through_defaults or {}),
+                        f'{scope_field}_id': self.scope_value,
+                        f'{self.source_field_name}_id': self.related_val[0],
+                        f'{target}_id': target_id,
+                    })
+                    for target_id in missing
+                ])
+                self.send('post_add', missing, db)
+        add.alters_data = True
+
+        def remove(self, *objs):
+            self._remove_prefetched_objects()
+            if not objs:
+                return
+            db = router.db_for_write(self.through, instance=self.instance)
+            ids = self.target_ids(objs)
+            with transaction.atomic(using=db, savepoint=False):
+                self.send('pre_remove', ids, db)
+                self.links(db).filter(**{
+                    f'{self.target_field_name}__in': ids
+                }).delete()
+                self.send('post_remove', ids, db)
+        remove.alters_data = True
+
+        def clear(self):
+            db = router.db_for_write(self.through, instance=self.instance)
+            with transaction.atomic(using=db, savepoint=False):
+                self.send('pre_clear', None, db)
+                self._remove_prefetched_objects()
+                self.links(db).delete()
+                self.send('post_clear', None, db)
+        clear.alters_data = True
+
+    return UserScopedManyRelatedManager
+
+
+def links_attr(name):
+    """ return the attribute prefetch_links() sets for the relation name."""
+    return f'{name}_links'
+
+
+def prefetch_links(model, name, scope_value, targets=False):
+    """ return a Prefetch of the through rows of the UserScopedManyToManyField
+    name of model owned by scope_value, with their targets if asked.
+
+    the rows land in the links_attr(name) list of each object in target
+    order, read by owner and source from the through table alone.
+    """
+    field = model._meta.get_field(name)
+    through = field.remote_field.through
+    source = through._meta.get_field(field.m2m_field_name())
+    target = field.m2m_reverse_field_name()
+    links = through._default_manager.filter(**{
+        f'{field.scope_field}_id': scope_value,
+    }).order_by(f'{target}_id')
+    if targets:
+        links = links.select_related(target)
+
+    return Prefetch(source.remote_field.get_accessor_name(), queryset=links,
+                    to_attr=links_attr(name))
+
+
+class UserScopedManyToManyDescriptor(ManyToManyDescriptor):
+
+    @cached_property
+    def related_manager_cls(self):
+        return create_user_scoped_manager(
+            super().related_manager_cls,
+            self.field.scope_field,
+        )
+
+
+class UserScopedManyToManyField(models.ManyToManyField):
+    """ a many to many relation whose rows are stored with their owner.
+
+    the through model must have a foreign key named scope_field, both
+    ends of the relation must have it too. the related managers fill it
+    in on add() and filter by it on every query.
+    """
+
+    def __init__(self, *args, scope_field='user', **kwargs):
+        self.scope_field = scope_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.scope_field != 'user':
+            kwargs['scope_field'] = self.scope_field
+
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.name,
+                UserScopedManyToManyDescriptor(self.remote_field,
+                                               reverse=False))
+
+    def contribute_to_related_class(self, cls, related):
+        super().contribute_to_related_class(cls, related)
+        if not self.remote_field.is_hidden() and \
+                not related.related_model._meta.swapped:
+            setattr(cls, related.get_accessor_name(),
+                    UserScopedManyToManyDescriptor(self.remote_field,
+                                                   reverse=True))
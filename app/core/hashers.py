@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """ pbkdf2 sha256 with PASSWORD_PBKDF2_ITERATIONS iterations.
+
+    hashes of other iterations still check, they are hashed again with the
+    setting when their user logs in.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS',
+                       hashers.PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.coverage import CoverageIndex
+
+
+class Command(BaseCommand):
+    """ django command to time the coverage searches of recipes/cook/."""
+    help = ('Time the ingredient coverage index against checking every '
+            'recipe, on synthetic recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100000,
+            help='number of recipes indexed.')
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='number of distinct ingredients.')
+        parser.add_argument(
+            '--searches', type=int, default=100,
+            help='number of searches per run.')
+
+    def naive(self, recipes, have, limit):
+        """ rank recipes checking each one, as the index ranks them."""
+        ranked = []
+        for position, (recipe_id, ingredients) in enumerate(recipes.items()):
+            covered = len(ingredients & have)
+            if covered:
+                ranked.append((len(ingredients) - covered, -covered,
+                               -position, recipe_id))
+
+        return [row[-1] for row in sorted(ranked)[:limit]]
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        ingredients = range(options['ingredients'])
+        # a few staples are in most recipes, like salt.
+        weights = [1 / (i + 1) for i in ingredients]
+        recipes = {
+            recipe_id: frozenset(rng.choices(ingredients, weights,
+                                             k=rng.randint(3, 12)))
+            for recipe_id in range(options['recipes'])
+        }
+        queries = [set(rng.choices(ingredients, weights, k=10))
+                   for _ in range(options['searches'])]
+
+        start = time.perf_counter()
+        index = CoverageIndex()
+        index.load(recipes)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [index.search(have, 20) for have in queries]
+        indexed = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        expected = [self.naive(recipes, have, 20) for have in queries]
+        naive = (time.perf_counter() - start) / len(queries)
+
+        if [[row[0] for row in rows] for rows in results] != expected:
+            self.stderr.write('the index and the scan ranked differently.')
+        self.stdout.write(f'load    {load * 1e3:>10.2f} ms')
+        self.stdout.write(f'index   {indexed * 1e3:>10.2f} ms per search')
+        self.stdout.write(f'scan    {naive * 1e3:>10.2f} ms per search')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(recipes)} recipes, {len(queries)} searches per run.'))
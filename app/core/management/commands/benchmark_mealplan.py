@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.mealplan import Candidate, Solver
+
+
+class Command(BaseCommand):
+    """ django command to time the plans of recipes/meal-plan/."""
+    help = ('Time the meal plan search against its greedy first plan, on '
+            'synthetic recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=5000,
+            help='number of candidate recipes.')
+        parser.add_argument(
+            '--tags', type=int, default=30,
+            help='number of distinct tags.')
+        parser.add_argument(
+            '--days', type=int, default=7)
+        parser.add_argument(
+            '--meals', type=int, default=1)
+        parser.add_argument(
+            '--budget', type=int, default=10000,
+            help='budget in cents.')
+        parser.add_argument(
+            '--minutes', type=int, default=60,
+            help='minutes of cooking a day.')
+        parser.add_argument(
+            '--time-limit', type=float, action='append',
+            help='seconds of search, can be repeated.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        tags = range(options['tags'])
+        candidates = [
+            Candidate(pk, rng.randint(200, 4000), rng.randint(10, 120),
+                      sum(1 << tag for tag in rng.sample(tags,
+                                                         rng.randint(1, 4))))
+            for pk in range(1, options['recipes'] + 1)
+        ]
+        args = (candidates, options['days'], options['meals'],
+                options['budget'], options['minutes'])
+
+        start = time.perf_counter()
+        solver = Solver(*args)
+        solver.greedy()
+        greedy = time.perf_counter() - start
+        tags, price = solver.best_key if solver.best else (0, 0)
+        self.stdout.write(f'greedy  {greedy * 1e3:>10.2f} ms '
+                          f'{tags:>4} tags {-price:>8} cents')
+
+        for time_limit in options['time_limit'] or [0.1, 0.5, 2]:
+            start = time.perf_counter()
+            solver = Solver(*args)
+            plan = solver.solve(time_limit)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'search  {elapsed * 1e3:>10.2f} ms {plan.tags:>4} tags '
+                f'{plan.price:>8} cents {solver.nodes:>9} nodes'
+                f'{" optimal" if plan.optimal else ""}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(candidates)} recipes, {len(solver.candidates)} kept.'))
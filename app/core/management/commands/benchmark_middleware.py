@@ -0,0 +1,56 @@
+import time
+
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from .benchmark_reads import request_host
+
+
+class StackHandler(BaseHandler):
+    """ request handler answering every request without a view, so only
+    the middleware is timed.
+    """
+
+    def _get_response(self, request):
+        return HttpResponse()
+
+
+class Command(BaseCommand):
+    """ django command to time the middleware stack on a path."""
+    help = ('Time the MIDDLEWARE stack on requests of a path, with and '
+            'without MIDDLEWARE_SKIPPED_PATHS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/api/recipe/recipes/',
+            help='path of the requests.')
+        parser.add_argument(
+            '--requests', type=int, default=10000,
+            help='number of requests per run.')
+
+    def time_stack(self, path, requests):
+        """ return the seconds the middleware takes per request."""
+        handler = StackHandler()
+        handler.load_middleware()
+        factory = RequestFactory(HTTP_HOST=request_host())
+        pending = [factory.get(path) for _ in range(requests)]
+
+        start = time.perf_counter()
+        for request in pending:
+            handler.get_response(request)
+
+        return (time.perf_counter() - start) / requests
+
+    def handle(self, *args, **options):
+        path, requests = options['path'], options['requests']
+        lean = self.time_stack(path, requests)
+        with override_settings(MIDDLEWARE_SKIPPED_PATHS=()):
+            full = self.time_stack(path, requests)
+
+        self.stdout.write(f'full stack {full * 1e6:>8.1f} us per request')
+        self.stdout.write(f'lean stack {lean * 1e6:>8.1f} us per request')
+        self.stdout.write(self.style.SUCCESS(
+            f'{(full - lean) * 1e6:.1f} us saved per request of {path}.'))
@@ -0,0 +1,199 @@
+import asyncio
+import io
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.asyncdb import close_databases
+from core.deletion import purge_user
+from core.models import Tag, Ingredient, Recipe
+
+
+def request_host():
+    """ return a host name the requests are allowed to be sent to."""
+    hosts = [host for host in settings.ALLOWED_HOSTS
+             if host != '*' and not host.startswith('.')]
+
+    return hosts[0] if hosts else 'localhost'
+
+
+def percentile(timings, fraction):
+    return sorted(timings)[int(fraction * (len(timings) - 1))]
+
+
+class Command(BaseCommand):
+    """ django command to compare the read throughput of wsgi and asgi."""
+    help = ('Run concurrent reads through the wsgi handler and the asgi '
+            'application, in process, and compare their throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default='/api/recipe/recipes/',
+            help='path to read.')
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='number of requests per run.')
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='requests in flight on the asgi application.')
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='worker threads of the wsgi handler.')
+        parser.add_argument(
+            '--recipes', type=int, default=50,
+            help='recipes of the benchmark user.')
+        parser.add_argument(
+            '--email', default='benchmark@reads.local',
+            help='benchmark user, created and deleted unless it exists.')
+
+    def setup_user(self, email, recipes):
+        """ return the benchmark user and whether it was created."""
+        user = get_user_model().objects.filter(email=email).first()
+        if user is not None:
+            return user, False
+
+        user = get_user_model().objects.create_user(email, 'benchmark')
+        tags = [Tag.objects.create(user=user, name=f'tag {i}')
+                for i in range(5)]
+        ingredients = [Ingredient.objects.create(user=user, name=f'ing {i}')
+                       for i in range(10)]
+        for i in range(recipes):
+            recipe = Recipe.objects.create(user=user, title=f'recipe {i}',
+                                           time_minutes=i, price=i)
+            recipe.tags.add(tags[i % 5], tags[(i + 1) % 5])
+            recipe.ingredients.add(*ingredients[i % 7:i % 7 + 3])
+
+        return user, True
+
+    def run_wsgi(self, path, token, requests, threads):
+        handler = WSGIHandler()
+        host = request_host()
+
+        def read(_):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': host,
+                'SERVER_PORT': '80',
+                'HTTP_HOST': host,
+                'HTTP_AUTHORIZATION': f'Bearer {token}',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            status = response.status_code
+            response.close()
+            if status != 200:
+                raise CommandError(f'{path} answered {status}')
+
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(read, range(requests)))
+
+    def run_asgi(self, path, token, requests, concurrency):
+        from app.asgi import application
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', request_host().encode()),
+                        (b'authorization', f'Bearer {token}'.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (request_host(), 80),
+        }
+
+        async def read(semaphore):
+            status = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                start = time.perf_counter()
+                await application(dict(scope), receive, send)
+                if status != [200]:
+                    raise CommandError(f'{path} answered {status}')
+
+                return time.perf_counter() - start
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            try:
+                return await asyncio.gather(
+                    *[read(semaphore) for _ in range(requests)])
+            finally:
+                await close_databases()
+
+        return asyncio.get_event_loop().run_until_complete(run())
+
+    def report(self, name, timings, elapsed):
+        self.stdout.write(
+            f'{name:<24} {len(timings) / elapsed:>9.1f} req/s '
+            f'{percentile(timings, 0.5) * 1000:>8.1f} ms p50 '
+            f'{percentile(timings, 0.99) * 1000:>8.1f} ms p99')
+
+    def handle(self, *args, **options):
+        path, requests = options['path'], options['requests']
+        user, created = self.setup_user(options['email'], options['recipes'])
+        token = str(AccessToken.for_user(user))
+        connections.close_all()
+
+        runs = (
+            ('wsgi', lambda: self.run_wsgi(
+                path, token, requests, options['threads'])),
+            ('asgi, django views', lambda: self.run_asgi(
+                path, token, requests, options['concurrency'])),
+            ('asgi, async reads', lambda: self.run_asgi(
+                path, token, requests, options['concurrency'])),
+        )
+        opened = set()
+
+        def track(sender, connection, **kwargs):
+            opened.add(connection)
+        connection_created.connect(track)
+        try:
+            for name, run in runs:
+                with override_settings(ASYNC_READS=name.endswith('reads')):
+                    start = time.perf_counter()
+                    timings = run()
+                    elapsed = time.perf_counter() - start
+                self.report(name, timings, elapsed)
+        finally:
+            connection_created.disconnect(track)
+            # close what the request threads left open.
+            for connection in opened:
+                connection.inc_thread_sharing()
+                connection.close()
+                connection.dec_thread_sharing()
+            if created:
+                purge_user(user, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{requests} requests of {path} per run.'))
@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.similarity import RERANK, buckets, estimate, jaccard, signature
+
+
+class Command(BaseCommand):
+    """ django command to compare the similar recipes found from the
+    signature buckets with exact jaccard similarity.
+    """
+    help = ('Time the similar recipe lookups of the lsh buckets against '
+            'exact jaccard over every recipe and report their recall, on '
+            'synthetic recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=20000,
+            help='number of recipes of the user.')
+        parser.add_argument(
+            '--queries', type=int, default=200,
+            help='number of lookups per run.')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='similar recipes per lookup.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.5,
+            help='similarity from which a recipe has to be found.')
+
+    def synthetic(self, rng, count):
+        """ return recipes varying from a dish of every twenty, with a few
+        tags and ingredients added and removed.
+        """
+        dishes = [set(rng.sample(range(5000), rng.randint(6, 14)))
+                  for _ in range(max(1, count // 20))]
+        recipes = []
+        for _ in range(count):
+            features = set(rng.choice(dishes))
+            for feature in rng.sample(sorted(features), rng.randint(0, 3)):
+                features.discard(feature)
+            features.update(rng.sample(range(5000), rng.randint(0, 3)))
+            recipes.append(features or {rng.randrange(5000)})
+
+        return recipes
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        limit = options['limit']
+        recipes = self.synthetic(rng, options['recipes'])
+
+        start = time.perf_counter()
+        signatures = [signature(features) for features in recipes]
+        index = {}
+        for recipe_id, values in enumerate(signatures):
+            for bucket in buckets(values):
+                index.setdefault(bucket, []).append(recipe_id)
+        build = time.perf_counter() - start
+
+        queries = rng.sample(range(len(recipes)),
+                             min(options['queries'], len(recipes)))
+        start = time.perf_counter()
+        found = []
+        for query in queries:
+            own = signatures[query]
+            candidates = {recipe_id for bucket in buckets(own)
+                          for recipe_id in index[bucket]} - {query}
+            estimated = sorted(((estimate(own, signatures[pk]), pk)
+                                for pk in candidates), reverse=True)
+            ranked = sorted(
+                ((jaccard(recipes[query], recipes[pk]), pk)
+                 for _, pk in estimated[:RERANK * limit]), reverse=True)
+            found.append({pk for _, pk in ranked[:limit]})
+        lsh = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        exact = []
+        for query in queries:
+            own = recipes[query]
+            ranked = sorted(((jaccard(own, features), pk)
+                             for pk, features in enumerate(recipes)
+                             if pk != query), reverse=True)
+            exact.append({pk for score, pk in ranked[:limit]
+                          if score >= options['threshold']})
+        scan = (time.perf_counter() - start) / len(queries)
+
+        expected = sum(len(pks) for pks in exact)
+        hits = sum(len(pks & got) for pks, got in zip(exact, found))
+        recall = hits / expected if expected else 1.0
+        self.stdout.write(f'build   {build * 1e3:>10.2f} ms')
+        self.stdout.write(f'lsh     {lsh * 1e3:>10.2f} ms per lookup')
+        self.stdout.write(f'exact   {scan * 1e3:>10.2f} ms per lookup')
+        self.stdout.write(f'recall  {recall:>10.3f} of the top {limit} '
+                          f'from {options["threshold"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(recipes)} recipes, {len(queries)} lookups per run.'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from rest_framework.request import Request
+
+from core.throttling import BucketTable, RequestRateThrottle
+
+from .benchmark_reads import request_host
+
+
+class Command(BaseCommand):
+    """ django command to time the throttle checks of a request."""
+    help = ('Time the token bucket checks of the throttles, granted, '
+            'refused and through DRF.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checks', type=int, default=100000,
+            help='number of checks per run.')
+
+    def time_checks(self, check, checks):
+        """ return the seconds check takes per call."""
+        start = time.perf_counter()
+        for i in range(checks):
+            check(i)
+
+        return (time.perf_counter() - start) / checks
+
+    def handle(self, *args, **options):
+        checks = options['checks']
+        table = BucketTable(slots=4096)
+        try:
+            granted = self.time_checks(
+                lambda i: table.take(f'user:{i % 4096}', 10 ** 9, 10 ** 9),
+                checks)
+            table.take('user:empty', 1, 1e-9)
+            refused = self.time_checks(
+                lambda i: table.take('user:empty', 1, 1e-9), checks)
+        finally:
+            table.close()
+
+        request = Request(RequestFactory(HTTP_HOST=request_host()).get('/'))
+        throttle = RequestRateThrottle()
+        rates = {'DEFAULT_THROTTLE_RATES': {'read': f'{10 ** 9}/s'}}
+        with override_settings(THROTTLE_SLOTS=4096, REST_FRAMEWORK=rates):
+            drf = self.time_checks(
+                lambda i: throttle.allow_request(request, None), checks)
+
+        self.stdout.write(f'granted {granted * 1e6:>8.2f} us per check')
+        self.stdout.write(f'refused {refused * 1e6:>8.2f} us per check')
+        self.stdout.write(f'drf     {drf * 1e6:>8.2f} us per request')
+        self.stdout.write(self.style.SUCCESS(
+            f'{checks} checks per run.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from core.provisioning import get_executor
+from core.similarity import build
+
+
+class Command(BaseCommand):
+    """ django command to compute the similarity signatures of recipes."""
+    help = ('Compute the minhash signatures and buckets of the recipes of '
+            'every user, on worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id of a user to build, every user by default.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='recipes stored per transaction.')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='processes computing signatures, every core by default.')
+
+    def handle(self, *args, **options):
+        users = options['users'] or Recipe.objects.order_by(
+            'user_id').values_list('user_id', flat=True).distinct()
+        stored = 0
+        with get_executor(options['workers']) as executor:
+            for user_id in users:
+                stored += build(user_id, executor, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'stored {stored} signatures.'))
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    """ django command to hash partition the recipe tables online."""
+    help = 'Convert the recipe tables to tables hash partitioned by owner.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='alias of the database to convert.')
+        parser.add_argument(
+            '--partitions', type=int, default=None,
+            help='number of partitions, defaults to RECIPE_PARTITIONS.')
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='rows copied per transaction.')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='seconds to sleep between batches.')
+        parser.add_argument(
+            '--lock-timeout', type=float, default=5,
+            help='seconds the final swap may wait for its locks.')
+        parser.add_argument(
+            '--drop-old', action='store_true',
+            help='drop the unpartitioned tables left by a conversion.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if options['drop_old']:
+            partitioning.drop_unpartitioned(connection)
+            self.stdout.write(self.style.SUCCESS(
+                'unpartitioned recipe tables dropped.'))
+            return
+
+        partitions = options['partitions'] or settings.RECIPE_PARTITIONS
+        try:
+            converted = partitioning.partition_recipes(
+                connection,
+                partitions,
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                lock_timeout=options['lock_timeout'],
+                log=self.stdout.write,
+            )
+        except partitioning.PartitioningError as exc:
+            raise CommandError(exc)
+
+        if not converted:
+            self.stdout.write('recipe tables are partitioned already.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'recipe tables partitioned into {partitions} partitions, '
+            f'the originals are kept as *_unpartitioned until --drop-old.'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.deletion import process_deletions
+
+
+class Command(BaseCommand):
+    """ django command to delete queued users and recipes in batches."""
+    help = 'Delete the users and recipes that wait for deletion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='rows deleted per transaction.')
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='seconds to sleep between batches.')
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='keep running, looking for work every this many seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = process_deletions(
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+            )
+            if any(deleted.values()) or options['interval'] is None:
+                self.stdout.write(
+                    f"deleted {deleted['recipes']} recipes and "
+                    f"{deleted['users']} users.")
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,71 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import get_profiler_settings
+
+
+class Command(BaseCommand):
+    """ django command to merge request profiles into a per route report."""
+    help = 'Merge sampled request profiles into a hot function report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=None,
+            help='profiles directory, defaults to REQUEST_PROFILER["DIR"].')
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='number of functions to show per route.')
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=('cumulative', 'tottime', 'calls'),
+            help='sort key of the report.')
+        parser.add_argument(
+            '--route', default='',
+            help='only report routes that contain this text.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='remove the profiles after reporting them.')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or get_profiler_settings()['DIR']
+        if not os.path.isdir(directory):
+            raise CommandError(f'no profiles directory at {directory}')
+
+        for tag in sorted(os.listdir(directory)):
+            if options['route'] not in tag:
+                continue
+            paths = self.profile_paths(os.path.join(directory, tag))
+            if not paths:
+                continue
+
+            self.report(tag, paths, options['sort'], options['limit'])
+            if options['clear']:
+                for path in paths:
+                    os.remove(path)
+
+    def profile_paths(self, directory):
+        """ return the finished profiles of a route directory."""
+        if not os.path.isdir(directory):
+            return []
+
+        return [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith('.prof')
+        ]
+
+    def report(self, tag, paths, sort, limit):
+        """ write the merged top functions of one route."""
+        stream = io.StringIO()
+        stats = pstats.Stats(paths[0], stream=stream)
+        for path in paths[1:]:
+            stats.add(path)
+
+        stats.sort_stats(sort).print_stats(limit)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{tag} ({len(paths)} profiles, '
+            f'{stats.total_tt * 1000 / len(paths):.1f} ms avg)'))
+        self.stdout.write(stream.getvalue())
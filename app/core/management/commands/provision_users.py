@@ -0,0 +1,45 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.provisioning import provision_users, CREATED
+
+
+class Command(BaseCommand):
+    """ django command to create users in bulk from a csv."""
+    help = ('Create users from a csv with email, password and name columns, '
+            'reporting the rows that are duplicate or invalid.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='csv to read, - for the standard input.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='users inserted per statement.')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='processes hashing passwords, every core by default.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        source = sys.stdin if path == '-' else \
+            open(path, newline='', encoding='utf-8')
+        counts = {}
+        try:
+            for line, email, status, errors in provision_users(
+                    csv.DictReader(source),
+                    batch_size=options['batch_size'],
+                    workers=options['workers']):
+                counts[status] = counts.get(status, 0) + 1
+                if status != CREATED:
+                    detail = ' '.join(errors)
+                    self.stdout.write(
+                        f'line {line}: {email} {status} {detail}'.rstrip())
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{counts.get(status, 0)} {status}'
+            for status in ('created', 'duplicate', 'invalid'))))
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """ django command to correct the recipe counts of tags and
+    ingredients.
+    """
+    help = ('Recount the recipes of every tag and ingredient from their '
+            'links and correct the counts that drifted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default=None,
+            help='email of the only user to reconcile.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['user']:
+            users = users.filter(email=options['user'])
+
+        corrected = {Tag: 0, Ingredient: 0}
+        # one transaction per user and model keeps the row locks short.
+        for user_id in users.values_list('id', flat=True).iterator():
+            for model in corrected:
+                corrected[model] += model.objects.filter(
+                    user_id=user_id).reconcile()
+
+        self.stdout.write(
+            f'corrected {corrected[Tag]} tags and '
+            f'{corrected[Ingredient]} ingredients.')
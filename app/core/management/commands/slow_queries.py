@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.slow_query import get_slow_query_settings, read_slow_queries
+
+
+class Command(BaseCommand):
+    """ django command to show the slow query log grouped by template."""
+    help = 'Show logged slow queries grouped by their sql template.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='number of templates to show.')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='show the captured EXPLAIN plan of every template.')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='truncate the log after showing it.')
+
+    def handle(self, *args, **options):
+        path = get_slow_query_settings()['PATH']
+        groups = read_slow_queries(path)
+        if not groups:
+            self.stdout.write('no slow queries logged.')
+
+        for group in groups[:options['limit']]:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"[{group['fingerprint']}] {group['count']} calls, "
+                f"{group['total_ms']:.1f} ms total, "
+                f"{group['avg_ms']:.1f} ms avg, "
+                f"{group['max_ms']:.1f} ms max"))
+            self.stdout.write(f"  {group['template']}")
+            self.stdout.write(f"  views: {', '.join(group['views'])}")
+            self.stdout.write(f"  callers: {', '.join(group['callers'])}")
+            if options['plans'] and group['plan']:
+                for line in group['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if options['clear'] and os.path.exists(path):
+            open(path, 'w').close()
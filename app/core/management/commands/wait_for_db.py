@@ -2,20 +2,44 @@ import time
 
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """ django command to pause execution until database is available. """
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='alias of the database to wait for.')
+        parser.add_argument(
+            '--delay', type=float, default=0.5,
+            help='seconds to wait after the first failed attempt.')
+        parser.add_argument(
+            '--max-delay', type=float, default=8,
+            help='upper bound of the exponential backoff in seconds.')
+        parser.add_argument(
+            '--timeout', type=float, default=None,
+            help='give up after this many seconds, default is never.')
+
     def handle(self, *args, **options):
         self.stdout.write('waiting for database...')
-        db_conn = None
-        while not db_conn:
+        connection = connections[options['database']]
+        delay = options['delay']
+        deadline = None
+        if options['timeout'] is not None:
+            deadline = time.monotonic() + options['timeout']
+
+        while True:
             try:
-                db_conn = connections['default']
+                connection.ensure_connection()
+                break
             except OperationalError:
-                self.stdout.write("Database unavailable, waiting 1 second...")
-                time.sleep(1)
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise CommandError('Database unavailable, giving up.')
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:g} seconds...')
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available! '))
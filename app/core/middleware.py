@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, csrf
+
+
+HOOKS = ('process_view', 'process_exception', 'process_template_response')
+
+
+def is_skipped(request):
+    """ return true if request is under MIDDLEWARE_SKIPPED_PATHS."""
+    prefixes = tuple(getattr(settings, 'MIDDLEWARE_SKIPPED_PATHS', ()))
+
+    return bool(prefixes) and request.path_info.startswith(prefixes)
+
+
+def skipped_on_paths(middleware_class):
+    """ return a subclass of middleware_class that leaves the requests
+    under MIDDLEWARE_SKIPPED_PATHS alone.
+
+    the subclass passes the checks that look for the middleware, as the
+    admin's do for sessions, auth and messages.
+    """
+    def __call__(self, request):
+        if is_skipped(request):
+            return self.get_response(request)
+
+        return middleware_class.__call__(self, request)
+
+    def skip_hook(name):
+        hook = getattr(middleware_class, name)
+
+        def skippable(self, request, *args, **kwargs):
+            if is_skipped(request):
+                return None
+
+            return hook(self, request, *args, **kwargs)
+        skippable.__name__ = name
+
+        return skippable
+
+    attrs = {
+        '__call__': __call__,
+        '__module__': __name__,
+        '__doc__': middleware_class.__doc__,
+    }
+    # the handler calls these hooks directly, they are skipped as well.
+    for name in HOOKS:
+        if hasattr(middleware_class, name):
+            attrs[name] = skip_hook(name)
+
+    return type(middleware_class.__name__, (middleware_class, ), attrs)
+
+
+SessionMiddleware = skipped_on_paths(sessions.SessionMiddleware)
+CsrfViewMiddleware = skipped_on_paths(csrf.CsrfViewMiddleware)
+AuthenticationMiddleware = skipped_on_paths(auth.AuthenticationMiddleware)
+MessageMiddleware = skipped_on_paths(messages.MessageMiddleware)
+XFrameOptionsMiddleware = skipped_on_paths(
+    clickjacking.XFrameOptionsMiddleware)
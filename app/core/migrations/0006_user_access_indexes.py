@@ -0,0 +1,79 @@
+# Generated by Django 3.0.8 on 2026-10-19 08:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the m2m foreign key indexes the composites now cover, as django named
+# them in 0004: recipe_id leads the unique index, the target column the
+# reverse index.
+M2M_COLUMN_INDEXES = (
+    ('core_recipe_tags', 'recipe_id', 'core_recipe_tags_recipe_id_7754231e'),
+    ('core_recipe_tags', 'tag_id', 'core_recipe_tags_tag_id_10c0ffea'),
+    ('core_recipe_ingredients', 'recipe_id',
+     'core_recipe_ingredients_recipe_id_eeb7255a'),
+    ('core_recipe_ingredients', 'ingredient_id',
+     'core_recipe_ingredients_ingredient_id_a8fec9ee'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'id'], name='core_ingredient_user_id_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='core_recipe_user_id_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'id'], name='core_tag_user_id_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunSQL(
+            sql=[
+                'CREATE INDEX core_tag_user_lower_name_idx '
+                'ON core_tag (user_id, lower(name))',
+                'CREATE INDEX core_ingredient_user_lower_name_idx '
+                'ON core_ingredient (user_id, lower(name))',
+                'CREATE INDEX core_recipe_tags_tag_recipe_idx '
+                'ON core_recipe_tags (tag_id, recipe_id)',
+                'CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+                'ON core_recipe_ingredients (ingredient_id, recipe_id)',
+            ],
+            reverse_sql=[
+                'DROP INDEX core_tag_user_lower_name_idx',
+                'DROP INDEX core_ingredient_user_lower_name_idx',
+                'DROP INDEX core_recipe_tags_tag_recipe_idx',
+                'DROP INDEX core_recipe_ingredients_ingredient_recipe_idx',
+            ],
+        ),
+        migrations.RunSQL(
+            sql=[f'DROP INDEX {index}'
+                 for _, _, index in M2M_COLUMN_INDEXES],
+            reverse_sql=[f'CREATE INDEX {index} ON {table} ({column})'
+                         for table, column, index in M2M_COLUMN_INDEXES],
+        ),
+    ]
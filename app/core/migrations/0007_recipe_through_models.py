@@ -0,0 +1,151 @@
+# Generated by Django 3.0.8 on 2026-10-19 08:54
+
+import core.fields
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+import django.db.models.deletion
+
+
+BATCH_SIZE = 10000
+
+
+def backfill_owner(apps, schema_editor, model_name):
+    """ copy the recipe owner into the through rows, a batch at a time.
+
+    each batch commits on its own, so a large table is not locked by one
+    long transaction; rows added meanwhile are picked up by a final pass.
+    """
+    db = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    through = apps.get_model('core', model_name)
+    owner = Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe_id')).values('user_id')[:1]
+    )
+    rows = through.objects.using(db)
+
+    last_id = rows.aggregate(last_id=Max('id'))['last_id'] or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        with transaction.atomic(using=db):
+            rows.filter(
+                id__gt=start,
+                id__lte=start + BATCH_SIZE,
+                user__isnull=True
+            ).update(user_id=owner)
+
+    with transaction.atomic(using=db):
+        rows.filter(user__isnull=True).update(user_id=owner)
+
+
+def backfill_recipe_tag_owner(apps, schema_editor):
+    backfill_owner(apps, schema_editor, 'RecipeTag')
+
+
+def backfill_recipe_ingredient_owner(apps, schema_editor):
+    backfill_owner(apps, schema_editor, 'RecipeIngredient')
+
+
+class SetOwnerNotNull(migrations.AlterField):
+    """ alter the owner column of a through table to NOT NULL.
+
+    on postgres a NOT VALID check is added and validated first: that
+    scan only blocks schema changes, and SET NOT NULL then trusts the
+    check instead of scanning the table under an exclusive lock.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor,
+                                             from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        table = model._meta.db_table
+        column = model._meta.get_field(self.name).column
+        check = f'{table}_{column}_not_null'
+        for sql in (
+            f'ALTER TABLE {table} ADD CONSTRAINT {check} '
+            f'CHECK ({column} IS NOT NULL) NOT VALID',
+            f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}',
+            f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL',
+            f'ALTER TABLE {table} DROP CONSTRAINT {check}',
+        ):
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_user_access_indexes'),
+    ]
+
+    operations = [
+        # the tables of the automatic through models are kept as they are,
+        # only the migration state learns about the explicit models.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='RecipeTag',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='tag_links', to='core.Recipe')),
+                        ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_links', to='core.Tag')),
+                    ],
+                    options={
+                        'db_table': 'core_recipe_tags',
+                        'unique_together': {('recipe', 'tag')},
+                    },
+                ),
+                migrations.CreateModel(
+                    name='RecipeIngredient',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('ingredient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_links', to='core.Ingredient')),
+                        ('recipe', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ingredient_links', to='core.Recipe')),
+                    ],
+                    options={
+                        'db_table': 'core_recipe_ingredients',
+                        'unique_together': {('recipe', 'ingredient')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='ingredients',
+                    field=core.fields.UserScopedManyToManyField(through='core.RecipeIngredient', to='core.Ingredient'),
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='tags',
+                    field=core.fields.UserScopedManyToManyField(through='core.RecipeTag', to='core.Tag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipetag',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(
+            backfill_recipe_tag_owner,
+            migrations.RunPython.noop,
+        ),
+        migrations.RunPython(
+            backfill_recipe_ingredient_owner,
+            migrations.RunPython.noop,
+        ),
+        SetOwnerNotNull(
+            model_name='recipetag',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        SetOwnerNotNull(
+            model_name='recipeingredient',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
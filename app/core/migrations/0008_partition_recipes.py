@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+from core import partitioning
+
+
+def partition_recipes(apps, schema_editor):
+    """ partition the recipe tables when RECIPE_PARTITIONS asks for it."""
+    partitions = getattr(settings, 'RECIPE_PARTITIONS', 0)
+    if partitions < 2 or schema_editor.connection.vendor != 'postgresql':
+        return
+
+    partitioning.partition_recipes(
+        schema_editor.connection, partitions, apps=apps, log=print)
+
+
+class Migration(migrations.Migration):
+    # the rows are copied in batches that commit on their own.
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_recipe_through_models'),
+    ]
+
+    operations = [
+        # going back keeps the partitioned tables, they serve the earlier
+        # schema as well.
+        migrations.RunPython(partition_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.0.8 on 2026-10-19 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_existing_objects(apps, schema_editor):
+    """ give every existing object a change, so a first sync gets it."""
+    db = schema_editor.connection.alias
+    User = apps.get_model('core', 'User')
+    Change = apps.get_model('core', 'Change')
+    kinds = (
+        ('tag', apps.get_model('core', 'Tag').objects),
+        ('ingredient', apps.get_model('core', 'Ingredient').objects),
+        ('recipe', apps.get_model('core', 'Recipe').objects.filter(
+            deleted_at__isnull=True)),
+    )
+
+    for user_id in User.objects.using(db).values_list('id', flat=True):
+        changes = []
+        for kind, objects in kinds:
+            ids = objects.using(db).filter(user_id=user_id).order_by(
+                'id').values_list('id', flat=True)
+            changes += [
+                Change(user_id=user_id, kind=kind, object_id=object_id,
+                       seq=len(changes) + index)
+                for index, object_id in enumerate(ids, start=1)
+            ]
+        Change.objects.using(db).bulk_create(changes, batch_size=1000)
+        User.objects.using(db).filter(id=user_id).update(
+            change_seq=len(changes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_deletion_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'recipe'), ('tag', 'tag'), ('ingredient', 'ingredient')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('seq', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'seq'], name='core_change_user_seq_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='change',
+            unique_together={('user', 'kind', 'object_id')},
+        ),
+        migrations.RunPython(
+            record_existing_objects,
+            migrations.RunPython.noop,
+        ),
+    ]
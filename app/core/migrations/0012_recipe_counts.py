@@ -0,0 +1,49 @@
+# Generated by Django 3.0.8 on 2026-10-19 09:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """ set recipe_count from the links of live recipes."""
+    db = schema_editor.connection.alias
+    for name, through, field in (('Tag', 'RecipeTag', 'tag'),
+                                 ('Ingredient', 'RecipeIngredient',
+                                  'ingredient')):
+        links = apps.get_model('core', through).objects.using(db).filter(
+            **{field: OuterRef('pk')},
+            user=OuterRef('user'),
+            recipe__deleted_at__isnull=True
+        ).order_by().values('user').annotate(count=Count('*'))
+        apps.get_model('core', name).objects.using(db).update(
+            recipe_count=Coalesce(Subquery(links.values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_tag_ingredient_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_ingredient_usage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='core_tag_usage_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# indexes of the admin searches, see core.admin.ScalableAdminMixin.
+SEARCH_INDEXES = (
+    ('core_user_lower_email_idx', 'core_user', 'email'),
+    ('core_recipe_lower_title_idx', 'core_recipe', 'title'),
+    ('core_tag_lower_name_idx', 'core_tag', 'name'),
+    ('core_ingredient_lower_name_idx', 'core_ingredient', 'name'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """ index the lower cased prefixes, postgres needs the pattern ops
+    to search a LIKE prefix in it.
+    """
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    ops = ' text_pattern_ops' if postgresql else ''
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} (lower({column}){ops})')
+
+
+def drop_search_indexes(apps, schema_editor):
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['created_at'], name='core_recipe_created_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
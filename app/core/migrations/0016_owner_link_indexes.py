@@ -0,0 +1,68 @@
+# Generated by Django 3.0.8 on 2026-10-19 12:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core import partitioning
+
+
+# the reverse indexes of 0006 and the owner led indexes replacing them. the
+# queries of the through tables always match the owner, with user_id first
+# the planner has no single column owner index to prefer, and the deletions
+# of a user are served as well.
+LINK_INDEXES = (
+    ('core_recipe_tags', 'tag_id', 'core_recipe_tags_tag_recipe_idx',
+     'core_recipe_tags_user_tag_recipe_idx'),
+    ('core_recipe_ingredients', 'ingredient_id',
+     'core_recipe_ingredients_ingredient_recipe_idx',
+     'core_recipe_ingredients_user_ingredient_recipe_idx'),
+)
+
+
+def partitioned(schema_editor, table):
+    """ return true if table was partitioned by 0008, its partitions are
+    indexed on (user_id, target, recipe_id) already.
+    """
+    return (schema_editor.connection.vendor == 'postgresql' and
+            partitioning.is_partitioned(schema_editor.connection, table))
+
+
+def create_owner_indexes(apps, schema_editor):
+    # IF EXISTS, sqlite drops them rebuilding the table in the AlterField.
+    for table, target, reverse, owner in LINK_INDEXES:
+        if partitioned(schema_editor, table):
+            continue
+        schema_editor.execute(
+            f'CREATE INDEX {owner} ON {table} (user_id, {target}, recipe_id)')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {reverse}')
+
+
+def drop_owner_indexes(apps, schema_editor):
+    for table, target, reverse, owner in LINK_INDEXES:
+        if partitioned(schema_editor, table):
+            continue
+        schema_editor.execute(
+            f'CREATE INDEX {reverse} ON {table} ({target}, recipe_id)')
+        schema_editor.execute(f'DROP INDEX IF EXISTS {owner}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_ingredient_quantities'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipetag',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(create_owner_indexes, drop_owner_indexes),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.0.8 on 2026-10-19 12:24
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def backfill_servings(apps, schema_editor):
+    """ set the recipes saved for no servings to one, the default."""
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.using(schema_editor.connection.alias).filter(
+        servings=0).update(servings=1)
+
+
+class AddServingsCheck(migrations.AddConstraint):
+    """ add the check of the recipe servings.
+
+    on postgres it's added NOT VALID and validated apart: the validating
+    scan only blocks schema changes, not the reads and writes the exclusive
+    lock of adding a checked constraint would.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor,
+                                             from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        table = model._meta.db_table
+        name = self.constraint.name
+        for sql in (
+            f'ALTER TABLE {table} ADD CONSTRAINT {name} '
+            f'CHECK (servings >= 1) NOT VALID',
+            f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}',
+        ):
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # the check is validated outside of the transaction adding it.
+    atomic = False
+
+    dependencies = [
+        ('core', '0016_owner_link_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='servings',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(backfill_servings, migrations.RunPython.noop),
+        AddServingsCheck(
+            model_name='recipe',
+            constraint=models.CheckConstraint(check=models.Q(servings__gte=1), name='core_recipe_servings_min'),
+        ),
+    ]
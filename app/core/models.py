@@ -1,12 +1,23 @@
 import uuid
 import os
 
-from django.db import models
+from collections import Counter
+from functools import partial
+
+from django.core.validators import MinValueValidator
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager,\
                                        PermissionsMixin
 
 from django.conf import settings
 
+from . import events
+from .cache import invalidate_user
+from .fields import UserScopedManyToManyField
+from .units import UNIT_CHOICES
+
 
 def recipe_image_file_path(instance, filename):
     """ generate file path for new recipe images"""
@@ -34,12 +45,8 @@ class UserManager(BaseUserManager):
         if not email:
             raise ValueError("Users most have a email address. ")
 
-        user = self.create_user(email, password)
-        user.is_superuser = True
-        user.is_staff = True
-        user.save()
-
-        return user
+        return self.create_user(email, password, is_superuser=True,
+                                is_staff=True)
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -48,19 +55,79 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    change_seq = models.BigIntegerField(default=0, editable=False)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
 
+class RecipeAttrQuerySet(models.QuerySet):
+    """ tags or ingredients, recipe_count holds the number of live recipes
+    linked to each of them.
+    """
+
+    def with_linked_recipes(self):
+        """ annotate linked_recipes, the live recipes counted from the
+        links of each row.
+        """
+        links = self.model.recipe_links.rel.related_model.objects.filter(
+            **{self.model.recipe_links.field.name: OuterRef('pk')},
+            user=OuterRef('user'),
+            recipe__user=OuterRef('user'),
+            recipe__deleted_at__isnull=True
+        ).order_by().values('user').annotate(count=Count('*'))
+
+        return self.annotate(linked_recipes=Coalesce(
+            Subquery(links.values('count')), 0))
+
+    def reconcile(self):
+        """ correct the recipe_count of the rows where it drifted from
+        their links, return the number of rows corrected.
+        """
+        with transaction.atomic(using=self.db):
+            # the links counted after the lock are all there, a link
+            # added meanwhile waits to count itself on top.
+            list(self.select_for_update().order_by('id').values_list('id'))
+            drifted = self.with_linked_recipes().exclude(
+                recipe_count=F('linked_recipes')).values_list(
+                'id', 'user_id', 'linked_recipes')
+            by_count = {}
+            users = set()
+            for pk, user_id, count in drifted:
+                by_count.setdefault(count, []).append(pk)
+                users.add(user_id)
+            for count, ids in by_count.items():
+                self.model.objects.using(self.db).filter(id__in=ids).update(
+                    recipe_count=count)
+            for user_id in users:
+                transaction.on_commit(partial(invalidate_user, user_id),
+                                      using=self.db)
+
+        return sum(len(ids) for ids in by_count.values())
+
+
 class Tag(models.Model):
     """ tag of recipe """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_tag_user_id_id_idx'),
+            models.Index(fields=['user', '-recipe_count', 'id'],
+                         name='core_tag_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -71,28 +138,357 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_ingredient_user_id_id_idx'),
+            models.Index(fields=['user', '-recipe_count', 'id'],
+                         name='core_ingredient_usage_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def live(self):
+        """ exclude the recipes that wait for deletion."""
+        return self.filter(deleted_at__isnull=True)
+
+    def pending_deletion(self):
+        """ return the recipes that wait for deletion."""
+        return self.filter(deleted_at__isnull=False)
+
+    def delete(self):
+        """ delete the recipes and their tag and ingredient rows.
+
+        the through rows are deleted per owner first, the relations don't
+        cascade so no statement reads every partition of them.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            recipe_ids = {}
+            for user_id, recipe_id in self.values_list('user_id', 'id'):
+                recipe_ids.setdefault(user_id, []).append(recipe_id)
+
+            for user_id, ids in recipe_ids.items():
+                Change.objects.record(user_id, Change.RECIPE, ids,
+                                      deleted=True, using=self.db)
+
+            counts = {}
+            for through in (RecipeTag, RecipeIngredient):
+                for user_id, ids in recipe_ids.items():
+                    links = through.objects.using(self.db).filter(
+                        user_id=user_id,
+                        recipe_id__in=ids
+                    )
+                    # hidden recipes were uncounted already.
+                    links.filter(recipe__user_id=user_id,
+                                 recipe__deleted_at__isnull=True)\
+                        .update_counts(-1)
+                    _, deleted = links.delete()
+                    for label, count in deleted.items():
+                        counts[label] = counts.get(label, 0) + count
+
+            # derived from the links, not counted as deleted objects.
+            for model in (RecipeSignature, RecipeBucket):
+                for user_id, ids in recipe_ids.items():
+                    model.objects.using(self.db).filter(
+                        user_id=user_id, recipe_id__in=ids).delete()
+
+            _, deleted = super().delete()
+            counts.update(deleted)
+
+        return sum(counts.values()), counts
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Recipe(models.Model):
     """ recipe objects"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
+    servings = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
-    ingredients = models.ManyToManyField('Ingredient')
-    tags = models.ManyToManyField('Tag')
+    ingredients = UserScopedManyToManyField(
+        'Ingredient',
+        through='RecipeIngredient'
+    )
+    tags = UserScopedManyToManyField('Tag', through='RecipeTag')
     image = models.ImageField(
         null=True,
         upload_to=recipe_image_file_path)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='core_recipe_user_id_id_idx'),
+            models.Index(fields=['id'], name='core_recipe_pending_idx',
+                         condition=models.Q(deleted_at__isnull=False)),
+            models.Index(fields=['created_at'],
+                         name='core_recipe_created_idx'),
+        ]
+        # the quantities are scaled by the servings, none would divide by
+        # zero.
+        constraints = [
+            models.CheckConstraint(check=models.Q(servings__gte=1),
+                                   name='core_recipe_servings_min'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        # recipes never change owner, matching on it as well as on the id
+        # keeps updates to a single partition.
+        return super()._do_update(
+            base_qs.filter(user_id=self.user_id), using, pk_val, values,
+            update_fields, forced_update
+        )
+
+    def delete(self, using=None, keep_parents=False):
+        """ delete the recipe through its owner scoped queryset."""
+        return type(self).objects.using(using or self._state.db).filter(
+            user_id=self.user_id,
+            pk=self.pk
+        ).delete()
+
+
+class RecipeLinkQuerySet(models.QuerySet):
+    """ links of recipes to the target of their model, a tag or an
+    ingredient.
+    """
+
+    def update_counts(self, sign):
+        """ add sign times the number of these links to the recipe_count
+        of their targets, with one update per distinct number.
+        """
+        target = self.model.target
+        model = self.model._meta.get_field(target).related_model
+        by_count = {}
+        links = Counter(self.values_list(f'{target}_id', flat=True))
+        for pk, count in links.items():
+            by_count.setdefault(count, []).append(pk)
+        for count, ids in by_count.items():
+            model.objects.using(self.db).filter(id__in=sorted(ids)).update(
+                recipe_count=F('recipe_count') + sign * count)
+
+
+class RecipeTag(models.Model):
+    """ tag of a recipe, stored with the recipe owner."""
+    # the (user, tag, recipe) index of 0016 serves the owner lookups.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        db_index=False,
+        related_name='tag_links'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='recipe_links'
+    )
+
+    target = 'tag'
+    objects = RecipeLinkQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'core_recipe_tags'
+        unique_together = ('recipe', 'tag')
+
+
+class RecipeIngredient(models.Model):
+    """ ingredient of a recipe, stored with the recipe owner."""
+    # the (user, ingredient, recipe) index of 0016 serves the owner lookups.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        db_index=False,
+        related_name='ingredient_links'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='recipe_links'
+    )
+    # how much of the ingredient the recipe takes for its servings, none
+    # for an amount to taste.
+    quantity = models.DecimalField(max_digits=10, decimal_places=3,
+                                   null=True, blank=True)
+    unit = models.CharField(max_length=8, choices=UNIT_CHOICES, blank=True,
+                            default='')
+
+    target = 'ingredient'
+    objects = RecipeLinkQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'core_recipe_ingredients'
+        unique_together = ('recipe', 'ingredient')
+
+
+class RecipeSignature(models.Model):
+    """ minhash signature of the tags and ingredients of a recipe, see
+    core.similarity. recipes without any have none.
+    """
+    # no constraint, the recipes may be partitioned by owner.
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_constraint=False,
+        related_name='signature'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    signature = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='core_recipesig_user_idx'),
+        ]
+
+
+class RecipeBucket(models.Model):
+    """ lsh bucket of a band of a recipe signature, recipes sharing one
+    are candidates of each other.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        db_index=False,
+        db_constraint=False,
+        related_name='buckets'
+    )
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'bucket', 'recipe'],
+                         name='core_recipebucket_bucket_idx'),
+            models.Index(fields=['user', 'recipe'],
+                         name='core_recipebucket_recipe_idx'),
+        ]
+
+
+class ChangeManager(models.Manager):
+
+    def next_seq(self, user_id, count=1, using=None):
+        """ reserve count numbers of the change sequence of a user.
+
+        return the last one. the row lock taken on the user orders the
+        changes of concurrent transactions by commit.
+        """
+        using = using or self.db
+        users = User.objects.using(using).filter(pk=user_id)
+        with transaction.atomic(using=using, savepoint=False):
+            users.update(change_seq=F('change_seq') + count)
+
+            return users.values_list('change_seq', flat=True).get()
+
+    def record(self, user_id, kind, object_ids, deleted=False, using=None):
+        """ record that objects of a user changed, or were deleted, and
+        publish it to the event stream of the user.
+        """
+        object_ids = sorted(set(object_ids))
+        if not object_ids:
+            return
+        using = using or self.db
+        table = self.model._meta.db_table
+        with transaction.atomic(using=using, savepoint=False), \
+                connections[using].cursor() as cursor:
+            last = self.next_seq(user_id, len(object_ids), using)
+            first = last - len(object_ids) + 1
+            values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(object_ids))
+            params = []
+            for seq, object_id in enumerate(object_ids, start=first):
+                params += [user_id, kind, object_id, seq, deleted]
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(user_id, kind, object_id, seq, deleted) VALUES {values} '
+                f'ON CONFLICT (user_id, kind, object_id) DO UPDATE '
+                f'SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted',
+                params
+            )
+            events.publish(user_id, kind, object_ids, first, deleted, using)
+            transaction.on_commit(partial(invalidate_user, user_id),
+                                  using=using)
+
+
+class Change(models.Model):
+    """ latest change of a recipe, tag or ingredient of a user.
+
+    there is one row per object, seq is taken from User.change_seq on
+    every change so the rows after a seq are what changed since then.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = (
+        (RECIPE, 'recipe'),
+        (TAG, 'tag'),
+        (INGREDIENT, 'ingredient'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    seq = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    objects = ChangeManager()
+
+    class Meta:
+        unique_together = ('user', 'kind', 'object_id')
+        indexes = [
+            models.Index(fields=['user', 'seq'],
+                         name='core_change_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} at {self.seq}'
@@ -0,0 +1,250 @@
+import time
+
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.db import transaction, OperationalError
+
+
+MIN_SERVER_VERSION = 120000
+
+PartitionedTable = namedtuple(
+    'PartitionedTable', ['name', 'constraints', 'indexes'])
+
+
+class PartitioningError(Exception):
+    """ the recipe tables can't be partitioned on this database."""
+
+
+def recipe_tables(apps=global_apps):
+    """ return the recipe tables in the order they have to be converted.
+
+    the recipes come first: the through tables reference them by owner
+    and id, which is the primary key of a table partitioned by owner.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    users = Recipe._meta.get_field('user').related_model._meta.db_table
+    recipes = Recipe._meta.db_table
+    tables = [PartitionedTable(
+        name=recipes,
+        constraints=[
+            'PRIMARY KEY (user_id, id)',
+            f'FOREIGN KEY (user_id) REFERENCES {users} (id) '
+            f'DEFERRABLE INITIALLY DEFERRED',
+        ],
+        indexes=[],
+    )]
+
+    for field_name in ('tags', 'ingredients'):
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through._meta.db_table
+        target = field.m2m_reverse_name()
+        tables.append(PartitionedTable(
+            name=through,
+            constraints=[
+                'PRIMARY KEY (user_id, id)',
+                f'UNIQUE (user_id, recipe_id, {target})',
+                f'FOREIGN KEY (user_id, recipe_id) '
+                f'REFERENCES {recipes}_partitioned (user_id, id) '
+                f'DEFERRABLE INITIALLY DEFERRED',
+                f'FOREIGN KEY ({target}) '
+                f'REFERENCES {field.related_model._meta.db_table} (id) '
+                f'DEFERRABLE INITIALLY DEFERRED',
+            ],
+            indexes=[f'(user_id, {target}, recipe_id)'],
+        ))
+
+    return tables
+
+
+def is_partitioned(connection, table):
+    """ return true if table is a partitioned table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class "
+            "WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+
+    return bool(row and row[0])
+
+
+def check_supported(connection):
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('partitioning needs postgresql')
+    if connection.pg_version < MIN_SERVER_VERSION:
+        raise PartitioningError(
+            'partitioning needs postgresql 12 or newer, foreign keys to '
+            'partitioned tables are not supported before')
+    if connection.in_atomic_block:
+        raise PartitioningError(
+            'partitioning commits in batches, it can not run inside a '
+            'transaction')
+
+
+def create_tables(cursor, tables, partitions):
+    """ create the empty partitioned copies of tables."""
+    for table in tables:
+        new = f'{table.name}_partitioned'
+        cursor.execute(
+            f'CREATE TABLE {new} (LIKE {table.name} INCLUDING DEFAULTS) '
+            f'PARTITION BY HASH (user_id)')
+        for remainder in range(partitions):
+            cursor.execute(
+                f'CREATE TABLE {table.name}_p{remainder} PARTITION OF {new} '
+                f'FOR VALUES WITH (MODULUS {partitions}, '
+                f'REMAINDER {remainder})')
+        for constraint in table.constraints:
+            cursor.execute(f'ALTER TABLE {new} ADD {constraint}')
+        for columns in table.indexes:
+            cursor.execute(f'CREATE INDEX ON {new} {columns}')
+
+
+def drop_sync_trigger(cursor, table):
+    cursor.execute(f'DROP TRIGGER IF EXISTS {table.name}_sync ON {table.name}')
+    cursor.execute(f'DROP FUNCTION IF EXISTS {table.name}_sync()')
+
+
+def install_sync_trigger(cursor, table):
+    """ mirror every write on table into its partitioned copy."""
+    new = f'{table.name}_partitioned'
+    cursor.execute(f'''
+        CREATE FUNCTION {table.name}_sync() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM {new}
+                WHERE user_id = OLD.user_id AND id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO {new} VALUES (NEW.*);
+            END IF;
+            RETURN NULL;
+        END
+        $$''')
+    cursor.execute(
+        f'CREATE TRIGGER {table.name}_sync '
+        f'AFTER INSERT OR UPDATE OR DELETE ON {table.name} '
+        f'FOR EACH ROW EXECUTE FUNCTION {table.name}_sync()')
+
+
+def copy_rows(connection, table, batch_size, pause, log):
+    """ copy the existing rows of table in id ranges of batch_size.
+
+    rows written since the trigger was installed are already copied, the
+    conflicts are skipped. FOR SHARE waits for concurrent writers, so a
+    row deleted meanwhile is not brought back by a stale read.
+    """
+    new = f'{table.name}_partitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT coalesce(max(id), 0) FROM {table.name}')
+        last_id = cursor.fetchone()[0]
+
+    copied = 0
+    for start in range(0, last_id, batch_size):
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {new} '
+                f'SELECT * FROM {table.name} '
+                f'WHERE id > %s AND id <= %s FOR SHARE '
+                f'ON CONFLICT DO NOTHING',
+                [start, start + batch_size])
+            copied += cursor.rowcount
+        log(f'{table.name}: copied {copied} rows, up to id '
+            f'{min(start + batch_size, last_id)} of {last_id}')
+        if pause:
+            time.sleep(pause)
+
+
+def swap_tables(connection, tables, lock_timeout):
+    """ put the partitioned tables in place of the originals.
+
+    the originals are kept as <table>_unpartitioned until
+    drop_unpartitioned() removes them.
+    """
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        cursor.execute('SET LOCAL lock_timeout = %s', [f'{lock_timeout}s'])
+        cursor.execute('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE'.format(
+            ', '.join(table.name for table in tables)))
+        for table in tables:
+            drop_sync_trigger(cursor, table)
+            cursor.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)', [table.name, 'id'])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} '
+                f'OWNED BY {table.name}_partitioned.id')
+            cursor.execute(
+                f'ALTER TABLE {table.name} '
+                f'RENAME TO {table.name}_unpartitioned')
+            cursor.execute(
+                f'ALTER TABLE {table.name}_partitioned '
+                f'RENAME TO {table.name}')
+
+
+def drop_leftovers(connection, tables):
+    """ drop the partial copies of an interrupted conversion."""
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        for table in tables:
+            drop_sync_trigger(cursor, table)
+        for table in reversed(tables):
+            cursor.execute(f'DROP TABLE IF EXISTS {table.name}_partitioned')
+
+
+def partition_recipes(connection, partitions, batch_size=10000, pause=0,
+                      lock_timeout=5, swap_attempts=5, apps=global_apps,
+                      log=lambda message: None):
+    """ convert the recipe tables to tables hash partitioned by owner.
+
+    the copies are filled while the originals stay in use: triggers
+    mirror new writes and the existing rows are copied in batches that
+    each commit on their own. only the final rename takes a lock.
+    return false when the tables are partitioned already.
+    """
+    check_supported(connection)
+    if partitions < 2:
+        raise PartitioningError('use at least 2 partitions')
+
+    tables = recipe_tables(apps)
+    if is_partitioned(connection, tables[0].name):
+        return False
+
+    drop_leftovers(connection, tables)
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        create_tables(cursor, tables, partitions)
+
+    # the through tables are mirrored only once every recipe is copied,
+    # so each through row finds its recipe in the partitioned copy.
+    for table in tables:
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            install_sync_trigger(cursor, table)
+        copy_rows(connection, table, batch_size, pause, log)
+
+    for attempt in range(1, swap_attempts + 1):
+        try:
+            swap_tables(connection, tables, lock_timeout)
+            break
+        except OperationalError:
+            if attempt == swap_attempts:
+                raise
+            log(f'tables busy, retrying the swap ({attempt})')
+            time.sleep(pause or 1)
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'ANALYZE {table.name}')
+
+    return True
+
+
+def drop_unpartitioned(connection, apps=global_apps):
+    """ drop the original tables kept by partition_recipes()."""
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        for table in reversed(recipe_tables(apps)):
+            cursor.execute(
+                f'DROP TABLE IF EXISTS {table.name}_unpartitioned')
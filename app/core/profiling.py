@@ -0,0 +1,88 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+PROFILER_DEFAULTS = {
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'HTTP_X_PROFILE',
+    'TOKEN': '',
+    'DIR': os.path.join(settings.BASE_DIR, 'profiles'),
+}
+
+
+def get_profiler_settings():
+    """ return the request profiler settings merged with defaults. """
+    options = dict(PROFILER_DEFAULTS)
+    options.update(getattr(settings, 'REQUEST_PROFILER', {}))
+
+    return options
+
+
+def route_tag(request):
+    """ return a file system safe tag of the route that served request. """
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else 'unresolved'
+
+    return re.sub(r'[^\w.-]+', '.', f'{request.method}.{view_name}')
+
+
+def profile_path(directory, tag):
+    """ return a unique path for a new profile of the given route tag."""
+    filename = f'{int(time.time() * 1000)}-{os.getpid()}-' \
+               f'{uuid.uuid4().hex[:8]}.prof'
+
+    return os.path.join(directory, tag, filename)
+
+
+class ProfilingMiddleware:
+    """ profile a sample of requests with cProfile and dump them to disk.
+
+    a request is profiled when it is picked by SAMPLE_RATE or when it
+    carries the configured header with the secret TOKEN as value.
+    """
+
+    def __init__(self, get_response):
+        options = get_profiler_settings()
+        self.sample_rate = float(options['SAMPLE_RATE'])
+        self.header = options['HEADER']
+        self.token = options['TOKEN']
+        self.directory = options['DIR']
+
+        if self.sample_rate <= 0 and not self.token:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        """ return true if request is sampled or explicitly authorized."""
+        if self.token:
+            value = request.META.get(self.header, '')
+            if value and hmac.compare_digest(value, self.token):
+                return True
+
+        return random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        self.save(profiler, route_tag(request))
+
+        return response
+
+    def save(self, profiler, tag):
+        """ write the profile atomically so readers never see a partial."""
+        path = profile_path(self.directory, tag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
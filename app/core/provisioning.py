@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DEFAULT_DB_ALIAS
+
+
+# the api refuses shorter passwords as well, see user.serializers.
+PASSWORD_MIN_LENGTH = 5
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+def setup_worker():
+    """ load the settings and hashers in a worker process."""
+    django.setup()
+
+
+class SerialExecutor:
+    """ executor running map in the calling process."""
+
+    def map(self, function, *iterables, chunksize=1):
+        return map(function, *iterables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def get_executor(workers):
+    """ return a pool of workers processes, or a serial executor when
+    workers is 0.
+    """
+    if workers == 0:
+        return SerialExecutor()
+
+    # spawned, forked workers would share the database connections.
+    return ProcessPoolExecutor(
+        workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_worker
+    )
+
+
+def clean_row(row):
+    """ return the email, password and name of a row and its errors."""
+    email = get_user_model().objects.normalize_email(
+        (row.get('email') or '').strip())
+    password = row.get('password') or ''
+    name = (row.get('name') or '').strip()
+    errors = []
+    try:
+        validate_email(email)
+    except ValidationError:
+        errors.append('Enter a valid email address.')
+    if len(password) < PASSWORD_MIN_LENGTH:
+        errors.append(f'Ensure the password has at least '
+                      f'{PASSWORD_MIN_LENGTH} characters.')
+
+    return email, password, name, errors
+
+
+def numbered(rows):
+    """ pair rows with their line numbers: the file line a csv reader
+    ended the row on, the position of the row otherwise.
+    """
+    if not hasattr(rows, 'line_num'):
+        yield from enumerate(rows, start=1)
+        return
+    for row in rows:
+        yield rows.line_num, row
+
+
+def provision_batch(batch, executor, using):
+    """ create the users of a batch of (line, row) pairs, return the
+    result of every row.
+    """
+    User = get_user_model()
+    results = []
+    pending = {}
+    for line, row in batch:
+        email, password, name, errors = clean_row(row)
+        if errors:
+            results.append((line, email, INVALID, errors))
+        elif email in pending:
+            results.append((line, email, DUPLICATE, []))
+        else:
+            pending[email] = (line, password, name)
+
+    existing = set(User.objects.using(using).filter(
+        email__in=list(pending)).values_list('email', flat=True))
+    for email in existing:
+        results.append((pending.pop(email)[0], email, DUPLICATE, []))
+
+    passwords = [password for _, password, _ in pending.values()]
+    hashes = list(executor.map(
+        make_password, passwords,
+        chunksize=max(1, len(passwords) // ((os.cpu_count() or 1) * 4))))
+    users = [
+        User(email=email, name=name, password=hashed)
+        for (email, (_, _, name)), hashed in zip(pending.items(), hashes)
+    ]
+    # users signing up meanwhile are skipped, the salted hashes tell the
+    # rows inserted here apart from theirs.
+    User.objects.using(using).bulk_create(users, ignore_conflicts=True)
+    inserted = set(User.objects.using(using).filter(
+        email__in=list(pending), password__in=hashes
+    ).values_list('email', flat=True))
+    for email, (line, _, _) in pending.items():
+        results.append(
+            (line, email, CREATED if email in inserted else DUPLICATE, []))
+
+    return sorted(results)
+
+
+def provision_users(rows, batch_size=1000, workers=None,
+                    using=DEFAULT_DB_ALIAS):
+    """ create users from rows of email, password and name, yielding the
+    result of each row in order as (line, email, status, errors).
+    line is the line of the row in the file for a csv reader, see
+    numbered().
+
+    rows are read batch_size at a time, so any iterable streams through.
+    passwords are hashed on workers processes, all the cores by default
+    or in this process with 0, and users inserted with one bulk_create per
+    batch. duplicates and invalid rows are reported, not raised.
+    """
+    rows = numbered(rows)
+    with get_executor(workers) as executor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield from provision_batch(batch, executor, using)
@@ -0,0 +1,168 @@
+import random
+import threading
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+_state = threading.local()
+
+
+def get_replicas():
+    """ return the replica aliases mapped to their selection weights."""
+    return {
+        alias: weight
+        for alias, weight in getattr(settings, 'DATABASE_REPLICAS', {}).items()
+        if weight > 0
+    }
+
+
+def choose_replica(replicas=None):
+    """ return a replica alias picked by weight, or None without any."""
+    replicas = get_replicas() if replicas is None else replicas
+    if not replicas:
+        return None
+    aliases = list(replicas)
+
+    return random.choices(aliases, weights=[replicas[a] for a in aliases])[0]
+
+
+@contextmanager
+def reads_from(alias):
+    """ route the reads of this thread to alias while the block runs."""
+    previous = getattr(_state, 'read_alias', None)
+    _state.read_alias = alias
+    try:
+        yield
+    finally:
+        _state.read_alias = previous
+
+
+STICKY_SALT = 'core.routers.sticky'
+
+
+def sticky_cookie():
+    return getattr(settings, 'REPLICA_STICKY_COOKIE', 'replica_sticky')
+
+
+def sticky_window():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def mark_write(response, user_id):
+    """ keep the reads of user_id on the primary for the sticky window.
+
+    the mark is a signed cookie of the client, any process can check it
+    without a lookup.
+    """
+    response.set_signed_cookie(
+        sticky_cookie(), str(user_id), salt=STICKY_SALT,
+        max_age=sticky_window(), httponly=True, samesite='Lax')
+
+
+def wrote_recently(cookies, user_id):
+    """ return true if cookies mark a write of user_id within the sticky
+    window.
+    """
+    name = sticky_cookie()
+    value = cookies.get(name)
+    if value is None:
+        return False
+    # as request.get_signed_cookie() signs them.
+    signer = signing.get_cookie_signer(salt=name + STICKY_SALT)
+    try:
+        return signer.unsign(value, max_age=sticky_window()) == str(user_id)
+    except signing.BadSignature:
+        return False
+
+
+class ReplicaRouter:
+    """ route reads to the replica chosen for the request, writes to the
+    primary. the replica is chosen per request by ReplicaMiddleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache':
+            # a cache is only useful if it's read where it's written.
+            return DEFAULT_DB_ALIAS
+        return getattr(_state, 'read_alias', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def token_user_id(request):
+    """ return the user id of a valid bearer token without a db lookup."""
+    return header_user_id(request.META.get('HTTP_AUTHORIZATION', ''))
+
+
+def header_user_id(header):
+    """ return the user id of the access token of an authorization
+    header, or None.
+    """
+    header = header.split()
+    if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        token = AccessToken(header[1])
+    except TokenError:
+        return None
+
+    return token.get(jwt_settings.USER_ID_CLAIM)
+
+
+class ReplicaMiddleware:
+    """ read safe requests from a replica unless their user just wrote.
+
+    only paths under REPLICA_ROUTED_PATHS are routed, everything else
+    keeps reading from the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def choose(self, request):
+        """ return the alias the reads of request should go to."""
+        if request.method not in SAFE_METHODS:
+            return None
+        prefixes = getattr(settings, 'REPLICA_ROUTED_PATHS', ('/api/', ))
+        if not request.path.startswith(tuple(prefixes)):
+            return None
+
+        replicas = get_replicas()
+        if not replicas:
+            return None
+        user_id = token_user_id(request)
+        if user_id is not None and wrote_recently(request.COOKIES, user_id):
+            return None
+
+        return choose_replica(replicas)
+
+    def __call__(self, request):
+        with reads_from(self.choose(request)):
+            response = self.get_response(request)
+
+        # views answering an unsafe method without writing, like a batch
+        # of reads, set wrote on their response.
+        wrote = getattr(response, 'wrote', request.method not in SAFE_METHODS)
+        if wrote and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_write(response, user.pk)
+
+        return response
@@ -0,0 +1,38 @@
+from django.conf import settings
+
+from rest_framework import serializers
+
+from .batch import is_batchable
+
+
+class BatchOperationSerializer(serializers.Serializer):
+
+    method = serializers.ChoiceField(
+        choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'),
+        default='GET'
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        """ accept the paths of BATCH_PATHS only."""
+        if not is_batchable(value):
+            raise serializers.ValidationError(
+                f'{value} can not be requested in a batch.')
+
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+
+    requests = BatchOperationSerializer(many=True, allow_empty=False)
+    atomic = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        """ limit a batch to BATCH_MAX_REQUESTS requests."""
+        limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(
+                f'a batch holds at most {limit} requests.')
+
+        return value
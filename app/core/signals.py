@@ -0,0 +1,118 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, \
+    m2m_changed
+
+from . import similarity
+from .models import Change, Recipe, RecipeTag, RecipeIngredient, Tag, \
+    Ingredient
+
+
+KINDS = {
+    Recipe: Change.RECIPE,
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+}
+
+
+def record_saved(sender, instance, using, **kwargs):
+    """ record a saved object, a recipe waiting for deletion is gone."""
+    deleted = getattr(instance, 'deleted_at', None) is not None
+    Change.objects.record(instance.user_id, KINDS[sender], [instance.pk],
+                          deleted=deleted, using=using)
+
+
+def record_deleted(sender, instance, using, **kwargs):
+    Change.objects.record(instance.user_id, KINDS[sender], [instance.pk],
+                          deleted=True, using=using)
+
+
+def record_unlinked_recipes(sender, instance, using, **kwargs):
+    """ record the recipes that lose a tag or ingredient being deleted."""
+    through = {Tag: RecipeTag, Ingredient: RecipeIngredient}[sender]
+    field = {Tag: 'tag', Ingredient: 'ingredient'}[sender]
+    links = through.objects.using(using).filter(**{field: instance})
+    for user_id, recipe_id in links.values_list('user_id', 'recipe_id'):
+        Change.objects.record(user_id, Change.RECIPE, [recipe_id],
+                              using=using)
+
+
+def record_membership(sender, instance, action, reverse, pk_set, using,
+                      **kwargs):
+    """ record the recipes whose tags or ingredients changed.
+
+    a recipe carries the ids of its tags and ingredients, so a change
+    of membership is a change of the recipe.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        recipe_ids = instance.recipe_set.values_list('id', flat=True)
+    else:
+        recipe_ids = pk_set
+    Change.objects.record(instance.user_id, Change.RECIPE, recipe_ids,
+                          using=using)
+
+
+def count_membership(sender, instance, action, reverse, pk_set, using,
+                     **kwargs):
+    """ keep the recipe_count of tags and ingredients as links of live
+    recipes are added and removed.
+
+    the counts change in the transaction of the links, added links are
+    counted once they exist and removed ones while they still do.
+    """
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    target = sender.target
+    links = sender.objects.using(using).filter(
+        user_id=instance.user_id,
+        recipe__user_id=instance.user_id,
+        recipe__deleted_at__isnull=True
+    )
+    if reverse:
+        links = links.filter(**{target: instance})
+        if pk_set is not None:
+            links = links.filter(recipe_id__in=pk_set)
+    else:
+        links = links.filter(recipe=instance)
+        if pk_set is not None:
+            links = links.filter(**{f'{target}_id__in': pk_set})
+    links.update_counts(1 if action == 'post_add' else -1)
+
+
+def refresh_signatures(sender, instance, action, reverse, pk_set, using,
+                       **kwargs):
+    """ recompute the signatures of the recipes whose tags or ingredients
+    changed, once the links did.
+    """
+    if action == 'pre_clear' and reverse:
+        # the recipes can't be read from the links after the clear.
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear') or \
+            pk_set is not None and not pk_set:
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', [])
+    else:
+        recipe_ids = pk_set
+    similarity.refresh(instance.user_id, recipe_ids, using=using)
+
+
+def connect():
+    """ keep the change feed of every user up to date."""
+    for model in KINDS:
+        post_save.connect(record_saved, sender=model)
+    # recipes record their deletes in RecipeQuerySet.delete, a receiver
+    # would stop the collector from deleting them by owner.
+    for model in (Tag, Ingredient):
+        pre_delete.connect(record_unlinked_recipes, sender=model)
+        post_delete.connect(record_deleted, sender=model)
+    for through in (RecipeTag, RecipeIngredient):
+        m2m_changed.connect(record_membership, sender=through)
+        m2m_changed.connect(count_membership, sender=through)
+        m2m_changed.connect(refresh_signatures, sender=through)
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+import django
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction, DatabaseError
+from django.utils import timezone
+
+
+SLOW_QUERY_DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 200,
+    'EXPLAIN': False,
+    'PATH': os.path.join(settings.BASE_DIR, 'slow_queries.log'),
+    # the log rotates past MAX_BYTES, keeping BACKUP_COUNT older files.
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 2,
+    # the reports group the entries of the last READ_BYTES of the log.
+    'READ_BYTES': 1024 * 1024,
+}
+
+DJANGO_DIR = os.path.dirname(django.__file__)
+
+_local = threading.local()
+_explained = set()
+_explained_lock = threading.Lock()
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_slow_query_settings():
+    """ return the slow query log settings merged with defaults. """
+    options = dict(SLOW_QUERY_DEFAULTS)
+    options.update(getattr(settings, 'SLOW_QUERY_LOG', {}))
+
+    return options
+
+
+def get_log(path, max_bytes, backup_count):
+    """ return the logger writing the entries to the rotating file at path,
+    one per path.
+    """
+    with _logs_lock:
+        if path not in _logs:
+            log = logging.getLogger(f'{__name__}.{fingerprint(path)}')
+            log.setLevel(logging.INFO)
+            log.propagate = False
+            # opened at the first entry.
+            handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                          backupCount=backup_count,
+                                          delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            log.addHandler(handler)
+            _logs[path] = log
+
+    return _logs[path]
+
+
+def normalize_sql(sql):
+    """ return the template of sql with literals and IN lists folded."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = sql.replace('%s', '?')
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def fingerprint(template):
+    """ return a short stable id of a sql template."""
+    return hashlib.sha1(template.encode()).hexdigest()[:12]
+
+
+def find_caller():
+    """ return the innermost application frame that ran the query.
+
+    frames of django itself, of this module and of middleware __call__
+    methods are plumbing; when no application frame is left the innermost
+    third party frame (e.g. rest_framework) is returned instead.
+    """
+    fallback = None
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if filename == __file__ or filename.startswith(DJANGO_DIR):
+            continue
+
+        if filename.startswith(settings.BASE_DIR):
+            if frame.name == '__call__':
+                continue
+            filename = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{filename}:{frame.lineno} in {frame.name}'
+        if fallback is None:
+            fallback = f'{filename}:{frame.lineno} in {frame.name}'
+
+    return fallback
+
+
+def explain_query(connection, sql, params):
+    """ return the postgres plan of sql without executing it."""
+    _local.explaining = True
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (ANALYZE off) ' + sql, params)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+    except DatabaseError:
+        return None
+    finally:
+        _local.explaining = False
+
+
+def should_explain(connection, sql, template, many):
+    """ return true the first time a select template is seen here."""
+    if many or connection.vendor != 'postgresql':
+        return False
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return False
+
+    with _explained_lock:
+        if template in _explained:
+            return False
+        _explained.add(template)
+
+    return True
+
+
+class SlowQueryLogger:
+    """ execute wrapper that records queries slower than the threshold."""
+
+    def __init__(self, log, threshold_ms, explain=True, request=None):
+        self.log = log
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+
+        if duration >= self.threshold_ms:
+            self.record(sql, params, many, duration, context['connection'])
+
+        return result
+
+    def view_name(self):
+        """ return the name of the view that is handling the request."""
+        if self.request is None:
+            return None
+        match = getattr(self.request, 'resolver_match', None)
+
+        return match.view_name if match else self.request.path
+
+    def record(self, sql, params, many, duration, connection):
+        """ append one slow query entry to the log."""
+        template = normalize_sql(sql)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'database': connection.alias,
+            'duration_ms': round(duration, 3),
+            'fingerprint': fingerprint(template),
+            'template': template,
+            'view': self.view_name(),
+            'caller': find_caller(),
+            'plan': None,
+        }
+        if self.explain and should_explain(connection, sql, template, many):
+            entry['plan'] = explain_query(connection, sql, params)
+
+        # logging reports the failed writes, they never fail the request.
+        self.log.info(json.dumps(entry))
+
+
+def read_tail(path, size):
+    """ return the whole lines of the last size bytes of path."""
+    with open(path, 'rb') as log:
+        end = log.seek(0, os.SEEK_END)
+        log.seek(max(0, end - size))
+        lines = log.read().decode(errors='replace').splitlines()
+
+    # the first line read is likely cut.
+    return lines[1:] if end > size else lines
+
+
+def read_slow_queries(path, read_bytes=None):
+    """ return the queries of the last read_bytes of the log grouped by
+    template, slowest first.
+    """
+    if read_bytes is None:
+        read_bytes = get_slow_query_settings()['READ_BYTES']
+    groups = {}
+    if not os.path.exists(path):
+        return []
+
+    for line in read_tail(path, read_bytes):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'template': entry['template'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'views': set(),
+            'callers': set(),
+            'last_seen': None,
+            'plan': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['views'].add(entry['view'])
+        group['callers'].add(entry['caller'])
+        group['last_seen'] = entry['time']
+        group['plan'] = group['plan'] or entry['plan']
+
+    result = sorted(groups.values(), key=lambda g: g['total_ms'],
+                    reverse=True)
+    for group in result:
+        group['total_ms'] = round(group['total_ms'], 3)
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 3)
+        group['views'] = sorted(v for v in group['views'] if v)
+        group['callers'] = sorted(c for c in group['callers'] if c)
+
+    return result
+
+
+class SlowQueryMiddleware:
+    """ log slow queries of every request with its view and caller."""
+
+    def __init__(self, get_response):
+        options = get_slow_query_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+
+        try:
+            os.makedirs(os.path.dirname(options['PATH']), exist_ok=True)
+        except OSError:
+            # the log is best effort, logging reports the failed writes.
+            pass
+        self.log = get_log(options['PATH'], options['MAX_BYTES'],
+                           options['BACKUP_COUNT'])
+        self.threshold_ms = float(options['THRESHOLD_MS'])
+        self.explain = options['EXPLAIN']
+        self.get_response = get_response
+
+    def __call__(self, request):
+        logger = SlowQueryLogger(self.log, self.threshold_ms,
+                                 self.explain, request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(logger))
+
+            return self.get_response(request)
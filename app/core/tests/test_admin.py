@@ -1,7 +1,19 @@
+import tempfile
+
+from unittest import mock
+
+from PIL import Image
+
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator, RecipeAdmin
+from core.deletion import request_recipe_deletion
+from core.models import Change, Recipe, Tag, Ingredient
+
 
 class AdminPageTest(TestCase):
 
@@ -41,3 +53,214 @@ class AdminPageTest(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_add_page_links_tags(self):
+        """ test that tags added on the recipe page get the owner."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        url = reverse("admin:core_recipe_add")
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {
+                'user': self.user.id,
+                'title': 'Soup',
+                'time_minutes': 5,
+                'servings': 1,
+                'price': '5.00',
+                'link': '',
+                'image': ntf,
+                'tag_links-TOTAL_FORMS': 1,
+                'tag_links-INITIAL_FORMS': 0,
+                'tag_links-0-tag': tag.id,
+                'ingredient_links-TOTAL_FORMS': 0,
+                'ingredient_links-INITIAL_FORMS': 0,
+            })
+
+        self.assertEqual(res.status_code, 302)
+        recipe = Recipe.objects.get(title='Soup')
+        recipe.image.delete()
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(recipe.tag_links.get().user, self.user)
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_recipe_change_page_counts_links(self):
+        """ test that links changed on the recipe page are counted and
+        recorded in the change feed.
+        """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        quick = Tag.objects.create(user=self.user, name='Quick')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price='5.00')
+        recipe.tags.add(vegan)
+        link = recipe.tag_links.get()
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {
+                'user': self.user.id,
+                'title': 'Soup',
+                'time_minutes': 5,
+                'servings': 1,
+                'price': '5.00',
+                'link': '',
+                'image': ntf,
+                'tag_links-TOTAL_FORMS': 2,
+                'tag_links-INITIAL_FORMS': 1,
+                'tag_links-0-id': link.id,
+                'tag_links-0-recipe': recipe.id,
+                'tag_links-0-tag': vegan.id,
+                'tag_links-0-DELETE': 'on',
+                'tag_links-1-recipe': recipe.id,
+                'tag_links-1-tag': quick.id,
+                'ingredient_links-TOTAL_FORMS': 0,
+                'ingredient_links-INITIAL_FORMS': 0,
+            })
+
+        self.assertEqual(res.status_code, 302)
+        recipe.refresh_from_db()
+        recipe.image.delete()
+        self.assertEqual(list(recipe.tags.all()), [quick])
+        vegan.refresh_from_db()
+        quick.refresh_from_db()
+        self.assertEqual((vegan.recipe_count, quick.recipe_count), (0, 1))
+        self.user.refresh_from_db()
+        last = Change.objects.get(user=self.user, seq=self.user.change_seq)
+        self.assertEqual((last.kind, last.object_id),
+                         (Change.RECIPE, recipe.id))
+
+
+class ScalableAdminTest(TestCase):
+    """ test the admin of large recipe, tag and ingredient tables."""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = get_user_model().objects.create_superuser(
+            email='testadmin@testmail.com',
+            password='testAdminPassword123'
+        )
+        self.client.force_login(self.admin)
+        self.user = get_user_model().objects.create_user(
+            email='test@testmail.com', password='testPassword')
+
+    def create_recipes(self, count, title='Soup'):
+        return [Recipe.objects.create(user=self.user, title=f'{title} {i}',
+                                      time_minutes=5, price='5.00')
+                for i in range(count)]
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+
+        return len(queries)
+
+    def test_changelist_queries(self):
+        """ test that the changelists query as much for more rows."""
+        for name, create in (
+                ('recipe', lambda: self.create_recipes(3)),
+                ('tag', lambda: [Tag.objects.create(user=self.user, name='t')
+                                 for _ in range(3)])):
+            url = reverse(f'admin:core_{name}_changelist')
+            create()
+            few = self.count_queries(url)
+            create()
+            create()
+
+            self.assertEqual(self.count_queries(url), few)
+
+    def test_change_form_lists_no_tags(self):
+        """ test that the recipe form doesn't render every tag."""
+        recipe = self.create_recipes(1)[0]
+        recipe.tags.add(Tag.objects.create(user=self.user, name='linked'))
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        few = self.count_queries(url)
+        for i in range(20):
+            Tag.objects.create(user=self.user, name=f'unlinked {i}')
+            Ingredient.objects.create(user=self.user, name=f'unused {i}')
+
+        self.assertEqual(self.count_queries(url), few)
+        res = self.client.get(url)
+        self.assertContains(res, 'linked')
+        self.assertNotContains(res, 'unlinked')
+        self.assertNotContains(res, 'unused')
+
+    def test_prefix_search(self):
+        """ test that the search matches the start of the titles."""
+        self.create_recipes(1, 'Soup')
+        self.create_recipes(1, 'Hot soup')
+        url = reverse('admin:core_recipe_changelist')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, {'q': 'SOU'})
+
+        self.assertEqual([str(recipe) for recipe in
+                          res.context['cl'].result_list], ['Soup 0'])
+        self.assertTrue(any('LIKE' in query['sql'] for query in queries))
+
+    def test_date_hierarchy(self):
+        """ test that recipes are listed by creation date."""
+        recipe = self.create_recipes(1)[0]
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url, {
+            'created_at__year': recipe.created_at.year})
+
+        self.assertEqual(list(res.context['cl'].result_list), [recipe])
+
+    @mock.patch.object(EstimatedCountPaginator, 'exact_limit', 2)
+    def test_estimated_count(self):
+        """ test that large results are counted up to the limit only."""
+        self.create_recipes(5)
+        url = reverse('admin:core_recipe_changelist')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+
+        counts = [query['sql'] for query in queries
+                  if 'COUNT(' in query['sql']]
+        self.assertIn('LIMIT 3', counts[0])
+        if connection.vendor == 'postgresql':
+            self.assertEqual(len(counts), 1)
+            self.assertGreaterEqual(res.context['cl'].result_count, 3)
+        else:
+            # counted in full without a planner to ask.
+            self.assertEqual(res.context['cl'].result_count, 5)
+
+    def test_queue_deletion_in_batches(self):
+        """ test that the delete action queues recipes in batches."""
+        recipes = self.create_recipes(5)
+        url = reverse('admin:core_recipe_changelist')
+
+        with mock.patch.object(RecipeAdmin, 'action_batch_size', 2), \
+                mock.patch('core.admin.request_recipe_deletion',
+                           wraps=request_recipe_deletion) as queue:
+            res = self.client.post(url, {
+                'action': 'queue_deletion',
+                '_selected_action': [recipe.id for recipe in recipes],
+            })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(queue.call_count, 3)
+        self.assertFalse(Recipe.objects.live().exists())
+
+    def test_delete_tags_in_batches(self):
+        """ test that tags are deleted in batches."""
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(3)]
+        url = reverse('admin:core_tag_changelist')
+
+        res = self.client.post(url, {
+            'action': 'delete_in_batches',
+            '_selected_action': [tag.id for tag in tags[:2]],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(Tag.objects.all()), tags[2:])
+
+    def test_default_delete_removed(self):
+        """ test that the delete listing every related row is gone."""
+        res = self.client.get(reverse('admin:core_recipe_changelist'))
+
+        self.assertNotContains(res, 'value="delete_selected"')
@@ -0,0 +1,229 @@
+import json
+import threading
+
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import batch
+from core.models import Recipe, Tag, Ingredient
+
+
+BATCH_URL = reverse('core:batch')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """ return recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def editor_requests(recipe):
+    return [
+        {'path': detail_url(recipe.id)},
+        {'path': TAGS_URL},
+        {'path': INGREDIENTS_URL},
+    ]
+
+
+class BatchTestMixin:
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(user=self.user,
+                                                    name='Salt')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=2)
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def assertEditorLoaded(self, responses):
+        for request, response in zip(editor_requests(self.recipe),
+                                     responses):
+            self.assertEqual(response['status'], status.HTTP_200_OK)
+            res = self.client.get(request['path'])
+            self.assertEqual(response['body'], json.loads(res.content))
+
+
+class BatchApiTest(BatchTestMixin, TestCase):
+    """ test the batch api."""
+
+    def test_authentication_required(self):
+        """ test that a batch needs a user."""
+        res = APIClient().post(BATCH_URL, {
+            'requests': [{'path': TAGS_URL}]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reads(self):
+        """ test that a batch returns the responses of its requests."""
+        res = self.client.post(BATCH_URL, {
+            'requests': editor_requests(self.recipe)}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['responses']), 3)
+        self.assertEditorLoaded(res.data['responses'])
+
+    def test_reads_not_sticky(self):
+        """ test that only a batch holding a write pins reads to the
+        primary.
+        """
+        res = self.client.post(BATCH_URL, {
+            'requests': editor_requests(self.recipe)}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, res.cookies)
+
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Quick'}},
+        ]}, format='json')
+
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, res.cookies)
+
+    def test_user_loaded_once(self):
+        """ test that the user is looked up for the batch only."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(BATCH_URL, {
+                'requests': editor_requests(self.recipe)}, format='json')
+
+        lookups = [query for query in queries
+                   if 'FROM "core_user"' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+
+    def test_writes_in_order(self):
+        """ test that a write is seen by the reads after it."""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Quick'}},
+            {'path': TAGS_URL},
+            {'method': 'PATCH', 'path': reverse('user:me'),
+             'body': {'name': 'Cook'}},
+        ]}, format='json')
+
+        created, listed, patched = res.data['responses']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertIn(created['body'], listed['body'])
+        self.assertEqual(patched['body']['name'], 'Cook')
+
+    def test_failures_are_independent(self):
+        """ test that a failed request leaves the others alone."""
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Quick'}},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {}},
+            {'path': '/api/recipe/missing/'},
+        ]}, format='json')
+
+        statuses = [response['status'] for response in res.data['responses']]
+        self.assertEqual(statuses, [201, 400, 404])
+        self.assertTrue(Tag.objects.filter(name='Quick').exists())
+
+    def test_atomic_rolls_back(self):
+        """ test that a failure rolls an atomic batch back."""
+        res = self.client.post(BATCH_URL, {'atomic': True, 'requests': [
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Quick'}},
+            {'method': 'POST', 'path': TAGS_URL, 'body': {}},
+            {'path': TAGS_URL},
+        ]}, format='json')
+
+        statuses = [response['status'] for response in res.data['responses']]
+        self.assertEqual(statuses, [201, 400, 424])
+        self.assertFalse(Tag.objects.filter(name='Quick').exists())
+
+    def test_atomic_commits(self):
+        """ test that a successful atomic batch is kept."""
+        res = self.client.post(BATCH_URL, {'atomic': True, 'requests': [
+            {'method': 'POST', 'path': TAGS_URL, 'body': {'name': 'Quick'}},
+            {'method': 'DELETE', 'path': detail_url(self.recipe.id)},
+        ]}, format='json')
+
+        statuses = [response['status'] for response in res.data['responses']]
+        self.assertEqual(statuses, [201, 204])
+        self.assertTrue(Tag.objects.filter(name='Quick').exists())
+
+    def test_paths_limited(self):
+        """ test that paths outside BATCH_PATHS are refused."""
+        for path in ('/admin/', BATCH_URL, '/api/core/slow-queries/'):
+            res = self.client.post(BATCH_URL, {
+                'requests': [{'path': path}]}, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_size_limited(self):
+        """ test that a batch holds BATCH_MAX_REQUESTS requests at most."""
+        res = self.client.post(BATCH_URL, {
+            'requests': editor_requests(self.recipe)}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentBatchTest(BatchTestMixin, TransactionTestCase):
+    """ test the reads of a batch outside of a transaction."""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(batch.shutdown)
+
+    def test_reads_run_concurrently(self):
+        """ test that the reads are dispatched on the batch threads."""
+        threads = set()
+        original = batch.dispatch
+
+        def dispatch(request):
+            threads.add(threading.current_thread().name)
+            return original(request)
+
+        with mock.patch('core.batch.dispatch', side_effect=dispatch):
+            res = self.client.post(BATCH_URL, {
+                'requests': editor_requests(self.recipe)}, format='json')
+
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('batch') for name in threads))
+        self.assertEditorLoaded(res.data['responses'])
+
+    def test_reads_overlap(self):
+        """ test that the reads run at the same time, each on a connection
+        of its thread, closed on shutdown.
+        """
+        reads = editor_requests(self.recipe)
+        # each read waits for the others, serial reads would time out.
+        barrier = threading.Barrier(len(reads), timeout=5)
+        original = batch.dispatch
+
+        def dispatch(request):
+            barrier.wait()
+            return original(request)
+
+        # the threads keep their connections only when they persist.
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}), \
+                mock.patch('core.batch.dispatch', side_effect=dispatch):
+            res = self.client.post(BATCH_URL, {'requests': reads},
+                                   format='json')
+
+        self.assertEditorLoaded(res.data['responses'])
+        with batch._executor_lock:
+            thread_connections = list(batch._connections)
+        self.assertEqual(len(thread_connections), len(reads))
+        self.assertNotIn(connection, thread_connections)
+
+        batch.shutdown()
+
+        self.assertFalse(batch._connections)
+        # django keeps in memory sqlite databases open.
+        if connection.vendor != 'sqlite':
+            for thread_connection in thread_connections:
+                self.assertIsNone(thread_connection.connection)
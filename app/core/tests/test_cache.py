@@ -0,0 +1,183 @@
+import threading
+import time
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.cache import LocalCache, api_cache
+from core.models import Recipe, Tag
+
+
+CACHE_STATS_URL = reverse('core:cache-stats')
+TAG_STATS_URL = reverse('recipe:tag-stats')
+
+
+class LocalCacheTest(TestCase):
+    """ test the cache of a process."""
+
+    def test_size_bound(self):
+        """ test that the least recently used values are dropped."""
+        cache = LocalCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_timeout(self):
+        """ test that values expire after the shorter timeout."""
+        cache = LocalCache(timeout=10)
+        cache.set('a', 1, timeout=5)
+
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 6):
+            self.assertIsNone(cache.get('a'))
+
+
+class TwoLevelCacheTest(TestCase):
+    """ test the cache in front of the shared one."""
+
+    def setUp(self):
+        self.cache = api_cache()
+        self.cache.clear()
+        self.cache.counts.clear()
+        self.addCleanup(self.cache.clear)
+
+    def test_levels(self):
+        """ test that values are read locally, then from the shared cache."""
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'],
+                          stats['misses']), (2, 1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.75)
+
+    def test_shared_between_processes(self):
+        """ test that a value set elsewhere is read from the shared cache."""
+        caches['shared'].set(self.cache.make_key('a'), 1)
+
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_bump(self):
+        """ test that bumping a namespace leaves its keys behind."""
+        key = self.cache.key_in('user:1', 'stats')
+        self.cache.set(key, 1)
+
+        self.cache.bump('user:1')
+
+        self.assertNotEqual(self.cache.key_in('user:1', 'stats'), key)
+        self.assertEqual(self.cache.key_in('user:2', 'stats'),
+                         self.cache.key_in('user:2', 'stats'))
+
+    def test_waits_for_other_process(self):
+        """ test that a key locked by another process is waited for."""
+        key = self.cache.make_key('a')
+        shared = caches['shared']
+        shared.add(f'lock:{key}', 1, 10)
+
+        def other_process(seconds):
+            shared.set(key, 'theirs')
+
+        with mock.patch('core.cache.time.sleep', side_effect=other_process):
+            value = self.cache.get_or_compute('a', lambda: 'ours')
+
+        self.assertEqual(value, 'theirs')
+
+    def test_stats_api(self):
+        """ test that staff read the metrics of the caches."""
+        user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get(CACHE_STATS_URL).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        self.cache.get('a')
+        res = client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['api']['misses'], 1)
+
+
+class SingleFlightTest(TransactionTestCase):
+    """ test that missing keys are computed once."""
+
+    def setUp(self):
+        self.cache = api_cache()
+        self.cache.clear()
+        self.cache.counts.clear()
+        self.addCleanup(self.cache.clear)
+
+    def test_computed_once(self):
+        """ test that a missing key is computed once for all the threads."""
+        started, release = threading.Event(), threading.Event()
+        computed = []
+
+        def compute():
+            computed.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+
+        def get():
+            results.append(self.cache.get_or_compute('a', compute))
+            connection.close()
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(computed, [1])
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(self.cache.stats()['computed'], 1)
+
+
+class CachedStatsTest(TransactionTestCase):
+    """ test the cached stats of a user."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        api_cache().clear()
+        self.addCleanup(api_cache().clear)
+
+    def test_cached_until_changed(self):
+        """ test that stats are cached until the user changes a recipe."""
+        self.client.get(TAG_STATS_URL)
+        with self.assertNumQueries(0):
+            self.client.get(TAG_STATS_URL)
+
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=2)
+        recipe.tags.add(self.tag)
+        res = self.client.get(TAG_STATS_URL)
+
+        self.assertEqual(res.data[0]['recipe_count'], 1)
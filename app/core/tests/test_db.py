@@ -0,0 +1,107 @@
+import threading
+
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import db
+
+
+HEALTHZ_URL = reverse('healthz')
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(TestCase):
+
+    def test_idle_connection_reused(self):
+        """ test that a released connection is handed out again."""
+        pool = db.ConnectionPool(max_size=2)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+
+        self.assertIs(pool.acquire(FakeConnection), conn)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_size_limited(self):
+        """ test that acquire times out when every connection is in use."""
+        pool = db.ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(FakeConnection)
+
+        with self.assertRaises(db.PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_wait_for_release(self):
+        """ test that a waiting acquire gets the released connection."""
+        pool = db.ConnectionPool(max_size=1, timeout=5)
+        conn = pool.acquire(FakeConnection)
+        timer = threading.Timer(0.05, pool.release, args=[conn])
+        timer.start()
+
+        self.assertIs(pool.acquire(FakeConnection), conn)
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_seconds_max'], 0)
+
+    def test_unusable_connection_discarded(self):
+        """ test that unusable connections are closed, not reused."""
+        pool = db.ConnectionPool(max_size=1)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn, reusable=False)
+
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.acquire(FakeConnection), conn)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+
+class HealthCheckTest(TestCase):
+
+    def setUp(self):
+        db._readiness.update(checked_at=None, ready=False)
+
+    def test_healthz_ok(self):
+        """ test that healthz reports a reachable database."""
+        res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['status'], 'ok')
+
+    def test_healthz_check_cached(self):
+        """ test that probes in a row reuse the database check."""
+        with patch.object(connection, 'is_usable',
+                          return_value=True) as is_usable:
+            self.client.get(HEALTHZ_URL)
+            self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(is_usable.call_count, 1)
+
+    @override_settings(HEALTHZ_CACHE_SECONDS=0)
+    def test_healthz_unavailable(self):
+        """ test that healthz fails when the database doesn't answer."""
+        with patch.object(connection, 'is_usable', return_value=False):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+
+    @override_settings(DB_HEALTH_CHECK_INTERVAL=0)
+    def test_broken_persistent_connection_closed(self):
+        """ test that request_started closes unusable connections."""
+        connection.ensure_connection()
+        connection.health_checked_at = 0
+        with patch.dict(connection.settings_dict, CONN_MAX_AGE=60), \
+                patch.object(connection, 'in_atomic_block', False), \
+                patch.object(connection, 'is_usable', return_value=False), \
+                patch.object(connection, 'close') as close:
+            db.check_connections()
+
+        close.assert_called_once_with()
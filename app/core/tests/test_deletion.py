@@ -0,0 +1,119 @@
+import threading
+
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from core import deletion
+from core.models import Change, Recipe, RecipeTag, Tag, Ingredient
+
+
+def sample_user(email='test@testmail.com'):
+    return get_user_model().objects.create_user(email, 'testPass')
+
+
+def sample_recipe(user, title='Soup'):
+    recipe = Recipe.objects.create(user=user, title=title, time_minutes=5,
+                                   price=5)
+    recipe.tags.add(Tag.objects.get_or_create(user=user, name='Vegan')[0])
+    recipe.ingredients.add(
+        Ingredient.objects.get_or_create(user=user, name='Salt')[0])
+
+    return recipe
+
+
+class ProcessDeletionsTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.other = sample_user('other@testmail.com')
+        self.other_recipe = sample_recipe(self.other)
+
+    def test_pending_recipes_purged(self):
+        """ test that queued recipes are deleted with their links."""
+        recipes = [sample_recipe(self.user, f'recipe {i}') for i in range(5)]
+        kept = sample_recipe(self.user, 'kept')
+        queued = deletion.request_recipe_deletion(
+            Recipe.objects.filter(id__in=[r.id for r in recipes]))
+
+        deleted = deletion.process_deletions(batch_size=2)
+
+        self.assertEqual(queued, 5)
+        self.assertEqual(deleted, {'recipes': 5, 'users': 0})
+        self.assertEqual(
+            set(Recipe.objects.values_list('id', flat=True)),
+            {kept.id, self.other_recipe.id}
+        )
+        self.assertEqual(RecipeTag.objects.filter(user=self.user).count(), 1)
+
+    def test_recipe_image_removed(self):
+        """ test that images are deleted along with their recipe."""
+        recipe = sample_recipe(self.user)
+        recipe.image.save('image.jpg', ContentFile(b'image'))
+        storage, name = recipe.image.storage, recipe.image.name
+        deletion.request_recipe_deletion(Recipe.objects.filter(id=recipe.id))
+
+        deletion.process_deletions()
+
+        self.assertFalse(storage.exists(name))
+
+    def test_pending_user_purged(self):
+        """ test that a queued user is deleted with all they own."""
+        for i in range(3):
+            sample_recipe(self.user, f'recipe {i}')
+        deletion.request_user_deletion(self.user)
+
+        deleted = deletion.process_deletions(batch_size=2)
+
+        self.assertEqual(deleted, {'recipes': 0, 'users': 1})
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists())
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertFalse(Ingredient.objects.filter(user=self.user).exists())
+        self.assertFalse(Change.objects.filter(user=self.user).exists())
+        self.assertEqual(list(self.other_recipe.tags.all()),
+                         list(Tag.objects.filter(user=self.other)))
+
+    def test_command_reports_counts(self):
+        """ test that the command deletes queued rows and reports them."""
+        recipe = sample_recipe(self.user)
+        deletion.request_recipe_deletion(Recipe.objects.filter(id=recipe.id))
+        out = StringIO()
+        call_command('process_deletions', stdout=out)
+
+        self.assertIn('deleted 1 recipes and 0 users.', out.getvalue())
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+    @skipUnless(connection.vendor == 'postgresql', 'postgres row locks')
+    def test_concurrent_requests_uncount_once(self):
+        """ test that a recipe queued twice at once is uncounted once."""
+        recipe = sample_recipe(self.user)
+        queued = []
+
+        def request():
+            try:
+                queued.append(deletion.request_recipe_deletion(
+                    Recipe.objects.filter(id=recipe.id)))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            queued.append(deletion.request_recipe_deletion(
+                Recipe.objects.filter(id=recipe.id)))
+            other = threading.Thread(target=request)
+            other.start()
+            # the second request waits for the first to commit.
+            other.join(0.5)
+            self.assertTrue(other.is_alive())
+        other.join()
+
+        self.assertEqual(queued, [1, 0])
+        self.assertEqual(Tag.objects.get(user=self.user).recipe_count, 0)
+        self.assertEqual(
+            Ingredient.objects.get(user=self.user).recipe_count, 0)
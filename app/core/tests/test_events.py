@@ -0,0 +1,211 @@
+import asyncio
+
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import events
+from core.models import Change, Tag
+
+
+def stream_scope(token=None, headers=(), query=''):
+    headers = list(headers)
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': events.EVENTS_PATH,
+        'headers': headers,
+        'query_string': query.encode(),
+    }
+
+
+class EventStream:
+    """ drive the event stream app the way an asgi server does."""
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.sent = []
+        self.received = asyncio.Queue()
+        self.received.put_nowait({'type': 'http.request', 'body': b''})
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    @property
+    def status(self):
+        return self.sent[0]['status'] if self.sent else None
+
+    @property
+    def body(self):
+        return b''.join(m.get('body', b'') for m in self.sent[1:]).decode()
+
+    async def wait_for(self, text, timeout=5):
+        for _ in range(int(timeout / 0.01)):
+            if text in self.body:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f'{text!r} not in {self.body!r}')
+
+    def start(self):
+        self.task = asyncio.ensure_future(events.EventsRouter(None)(
+            self.scope, self.received.get, self.send))
+
+    async def disconnect(self):
+        self.received.put_nowait({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def close_connections():
+    """ close the connections the stream opened in its sync thread."""
+    run(sync_to_async(connections.close_all, thread_sensitive=True)())
+
+
+class EventStreamTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.token = str(AccessToken.for_user(self.user))
+        self.addCleanup(close_connections)
+
+    def test_token_required(self):
+        """ test that the stream is refused without a valid token."""
+        for scope in (stream_scope(), stream_scope('invalid')):
+            stream = EventStream(scope)
+            stream.start()
+            run(stream.task)
+
+            self.assertEqual(stream.status, 401)
+            self.assertFalse(events.broker.subscribers)
+
+    def test_token_in_query(self):
+        """ test that an EventSource can send the token as ?token=."""
+        stream = EventStream(stream_scope(query=f'token={self.token}'))
+
+        async def connect():
+            stream.start()
+            await stream.wait_for('retry:')
+            await stream.disconnect()
+        run(connect())
+
+        self.assertEqual(stream.status, 200)
+
+    def test_changes_streamed(self):
+        """ test that changes of the user are pushed as they happen."""
+        other = get_user_model().objects.create_user(
+            'other@testmail.com', 'testPass')
+        stream = EventStream(stream_scope(self.token))
+
+        async def connect():
+            stream.start()
+            await stream.wait_for('retry:')
+            await sync_to_async(Tag.objects.create)(user=other, name='Raw')
+            tag = await sync_to_async(Tag.objects.create)(
+                user=self.user, name='Vegan')
+            await stream.wait_for('event: change')
+            await stream.disconnect()
+
+            return tag
+        tag = run(connect())
+
+        self.assertIn(f'"kind": "tag", "id": {tag.id}', stream.body)
+        self.assertEqual(stream.body.count('event: change'), 1)
+        self.assertFalse(events.broker.subscribers)
+
+    def test_missed_changes_replayed(self):
+        """ test that a reconnecting client gets what it missed."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Raw')
+        stream = EventStream(stream_scope(
+            self.token, headers=[(b'last-event-id', b'1')]))
+
+        async def connect():
+            stream.start()
+            await stream.wait_for('id: 2')
+            await stream.disconnect()
+        run(connect())
+
+        self.assertNotIn('id: 1\n', stream.body)
+
+    @override_settings(EVENTS_HEARTBEAT=0.01)
+    def test_heartbeat(self):
+        """ test that an idle stream sends keep-alive comments."""
+        stream = EventStream(stream_scope(self.token))
+
+        async def connect():
+            stream.start()
+            await stream.wait_for(': ping')
+            await stream.disconnect()
+        run(connect())
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    def test_slow_client_resyncs(self):
+        """ test that a client falling behind is told to resync."""
+        for name in ('a', 'b', 'c'):
+            Tag.objects.create(user=self.user, name=name)
+        stream = EventStream(stream_scope(
+            self.token, headers=[(b'last-event-id', b'0')]))
+
+        stream.start()
+        run(stream.task)
+
+        self.assertIn('event: resync', stream.body)
+        self.assertNotIn('event: change', stream.body)
+
+    def test_other_requests_passed_on(self):
+        """ test that other paths are served by the django application."""
+        calls = []
+
+        async def application(scope, receive, send):
+            calls.append(scope['path'])
+        scope = dict(stream_scope(), path='/api/recipe/tags/')
+        run(events.EventsRouter(application)(scope, None, None))
+
+        self.assertEqual(calls, ['/api/recipe/tags/'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'postgres LISTEN/NOTIFY')
+class PostgresBackendTest(TransactionTestCase):
+
+    def test_events_reach_other_processes(self):
+        """ test that changes are delivered through LISTEN/NOTIFY."""
+        user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        backend = events.PostgresBackend(poll_timeout=0.1)
+        broker = events.Broker()
+        backend.start(broker)
+        self.addCleanup(backend.stop)
+        self.addCleanup(close_connections)
+
+        def record():
+            with transaction.atomic(), \
+                    patch.object(events, '_backend', backend):
+                Change.objects.record(user.id, Change.TAG, [7])
+
+        async def listen():
+            subscription = broker.subscribe(user.id)
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                await sync_to_async(record)()
+                try:
+                    return await asyncio.wait_for(
+                        subscription.queue.get(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+        event = run(listen())
+
+        self.assertEqual(event['kind'], 'tag')
+        self.assertEqual(event['id'], 7)
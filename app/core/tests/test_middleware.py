@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import middleware
+
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class SkippedMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+
+    def test_api_skips_browser_middleware(self):
+        """ test that api responses come without session or frame headers."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.has_header('X-Frame-Options'))
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+
+    def test_api_posts_without_csrf(self):
+        """ test that the api doesn't ask token clients for a csrf token."""
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_authenticate(self.user)
+        res = client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_admin_keeps_middleware(self):
+        """ test that the admin still gets sessions, csrf and frame
+        protection.
+        """
+        client = Client(enforce_csrf_checks=True)
+        res = client.get(reverse('admin:login'))
+
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', res.cookies)
+        res = client.post(reverse('admin:login'), {
+            'username': 'test@testmail.com',
+            'password': 'testPass',
+        })
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_subclass_keeps_hooks(self):
+        """ test that only the hooks of the wrapped middleware are set."""
+        self.assertTrue(issubclass(
+            middleware.CsrfViewMiddleware,
+            middleware.csrf.CsrfViewMiddleware))
+        self.assertTrue(hasattr(middleware.CsrfViewMiddleware, 'process_view'))
+        self.assertFalse(
+            hasattr(middleware.SessionMiddleware, 'process_view'))
+
+    def test_benchmark_command(self):
+        """ test that the benchmark reports the time saved."""
+        out = StringIO()
+        call_command('benchmark_middleware', requests=10, stdout=out)
+
+        self.assertIn('us saved per request of /api/', out.getvalue())
@@ -1,9 +1,16 @@
+from io import StringIO
+
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 
 from unittest.mock import patch
 
 from core import models
+from core.fields import links_attr, prefetch_links
+from core.deletion import request_recipe_deletion
 
 
 def sample_user(email='test@testmail.com', password='testPass'):
@@ -47,6 +54,15 @@ class UserModelTest(TestCase):
         self.assertTrue(user.is_superuser)
         self.assertTrue(user.is_staff)
 
+    def test_create_super_user_saved_once(self):
+        """ test that a super user is inserted in a single query."""
+        with self.assertNumQueries(1):
+            user = get_user_model().objects.create_superuser(
+                'admin@testmail.com', 'testPass')
+
+        self.assertTrue(user.is_superuser)
+        self.assertTrue(user.is_staff)
+
     def test_tag_str(self):
         """ test that tags str work """
         tag = models.Tag.objects.create(
@@ -86,3 +102,256 @@ class UserModelTest(TestCase):
         exp_path = f'uploads/recipe/{uuid}.jpg'
 
         self.assertEqual(file_path, exp_path)
+
+
+class RecipeLinkTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=5.00,
+        )
+        self.tag = models.Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_links_store_owner(self):
+        """ test that tag and ingredient rows get the recipe owner."""
+        ingredient = models.Ingredient.objects.create(
+            user=self.user,
+            name='Salt'
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.set([ingredient])
+
+        self.assertEqual(
+            models.RecipeTag.objects.get(recipe=self.recipe).user,
+            self.user
+        )
+        self.assertEqual(
+            models.RecipeIngredient.objects.get(recipe=self.recipe).user,
+            self.user
+        )
+
+    def test_recipe_delete_removes_links(self):
+        """ test that deleting a recipe deletes its tag rows."""
+        self.recipe.tags.add(self.tag)
+        deleted, counts = self.recipe.delete()
+
+        self.assertEqual(deleted, 2)
+        self.assertEqual(counts['core.RecipeTag'], 1)
+        self.assertFalse(models.RecipeTag.objects.exists())
+        self.assertTrue(models.Tag.objects.filter(id=self.tag.id).exists())
+
+    def test_queryset_delete_removes_links(self):
+        """ test that bulk deletes remove the links of every owner."""
+        other = sample_user('other@testmail.com')
+        other_recipe = models.Recipe.objects.create(
+            user=other,
+            title='Salad',
+            time_minutes=5,
+            price=5.00,
+        )
+        other_recipe.tags.add(
+            models.Tag.objects.create(user=other, name='Raw'))
+        self.recipe.tags.add(self.tag)
+        models.Recipe.objects.all().delete()
+
+        self.assertFalse(models.RecipeTag.objects.exists())
+        self.assertFalse(models.Recipe.objects.exists())
+
+
+class UserScopedManagerTest(TestCase):
+    """ test that the many to many manager reads and writes the links of
+    the owner only.
+    """
+
+    def setUp(self):
+        self.user = sample_user()
+        self.recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=5.00,
+        )
+        self.tag = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.owner = f'"core_recipe_tags"."user_id" = {self.user.id}'
+
+    def link_queries(self, run):
+        """ return the sql of the queries on the tag links run() makes."""
+        with CaptureQueriesContext(connection) as context:
+            run()
+
+        return [query['sql'] for query in context.captured_queries
+                if '"core_recipe_tags"' in query['sql']]
+
+    def test_add_reads_owner_links(self):
+        """ test that add() looks for existing links of the owner."""
+        queries = self.link_queries(lambda: self.recipe.tags.add(self.tag))
+
+        self.assertIn(self.owner, queries[0])
+        self.assertTrue(any(sql.startswith('INSERT') for sql in queries))
+
+    def test_remove_deletes_owner_links(self):
+        """ test that remove() deletes the links of the owner only."""
+        self.recipe.tags.add(self.tag)
+
+        queries = self.link_queries(
+            lambda: self.recipe.tags.remove(self.tag))
+
+        delete = [sql for sql in queries if sql.startswith('DELETE')]
+        self.assertEqual(len(delete), 1)
+        self.assertIn(self.owner, delete[0])
+
+    def test_clear_deletes_owner_links(self):
+        """ test that clear() deletes the links of the owner only."""
+        self.recipe.tags.add(self.tag)
+
+        queries = self.link_queries(self.recipe.tags.clear)
+
+        delete = [sql for sql in queries if sql.startswith('DELETE')]
+        self.assertEqual(len(delete), 1)
+        self.assertIn(self.owner, delete[0])
+        self.assertFalse(self.recipe.tags.exists())
+
+    def test_set_keeps_links(self):
+        """ test that set() only adds and removes the changed links."""
+        other = models.Tag.objects.create(user=self.user, name='Quick')
+        self.recipe.tags.add(self.tag)
+
+        self.recipe.tags.set([other.id])
+
+        self.assertEqual(list(self.recipe.tags.all()), [other])
+        self.assertEqual(
+            list(models.RecipeTag.objects.values_list('user_id', flat=True)),
+            [self.user.id])
+
+    def test_prefetch_links_of_owner(self):
+        """ test that the links are prefetched by owner from the through
+        table alone.
+        """
+        self.recipe.tags.add(self.tag)
+
+        with CaptureQueriesContext(connection) as context:
+            recipes = list(models.Recipe.objects.filter(
+                user=self.user
+            ).prefetch_related(
+                prefetch_links(models.Recipe, 'tags', self.user.id)))
+
+        links = getattr(recipes[0], links_attr('tags'))
+        self.assertEqual([link.tag_id for link in links], [self.tag.id])
+        sql = context.captured_queries[-1]['sql']
+        self.assertIn(self.owner, sql)
+        self.assertNotIn('JOIN', sql)
+
+
+class ChangeFeedTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+
+    def test_changes_numbered_per_user(self):
+        """ test that every change takes the next seq of its owner."""
+        tag = models.Tag.objects.create(user=self.user, name='Vegan')
+        tag.name = 'Vegetarian'
+        tag.save()
+        models.Tag.objects.create(user=sample_user('other@testmail.com'),
+                                  name='Raw')
+
+        change = models.Change.objects.get(user=self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(change.seq, 2)
+        self.assertEqual(self.user.change_seq, 2)
+
+    def test_record_marks_deleted(self):
+        """ test that recording a delete turns the change in a tombstone."""
+        models.Change.objects.record(self.user.id, models.Change.RECIPE,
+                                     [3, 1, 3])
+        models.Change.objects.record(self.user.id, models.Change.RECIPE,
+                                     [1], deleted=True)
+
+        self.assertEqual(
+            list(models.Change.objects.order_by('seq').values_list(
+                'object_id', 'seq', 'deleted')),
+            [(3, 2, False), (1, 3, True)]
+        )
+
+
+class RecipeCountTest(TestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.recipes = [
+            models.Recipe.objects.create(user=self.user, title=title,
+                                         time_minutes=5, price=5.00)
+            for title in ('Soup', 'Salad')
+        ]
+        self.tags = [models.Tag.objects.create(user=self.user, name=name)
+                     for name in ('Vegan', 'Quick')]
+        self.ingredient = models.Ingredient.objects.create(
+            user=self.user, name='Salt')
+
+    def counts(self):
+        return [tag.recipe_count
+                for tag in models.Tag.objects.order_by('id')]
+
+    def test_links_counted(self):
+        """ test that adding and removing links keeps the counts."""
+        self.recipes[0].tags.add(*self.tags)
+        self.recipes[0].tags.add(self.tags[0])
+        self.recipes[1].tags.set([self.tags[0]])
+        self.assertEqual(self.counts(), [2, 1])
+
+        self.recipes[0].tags.remove(self.tags[0], self.tags[0])
+        self.recipes[1].tags.remove(self.tags[1])
+        self.assertEqual(self.counts(), [1, 1])
+
+        self.recipes[0].tags.clear()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_reverse_links_counted(self):
+        """ test that links added from the tag side are counted."""
+        self.tags[0].recipe_set.add(*self.recipes)
+        self.assertEqual(self.counts(), [2, 0])
+
+        self.tags[0].recipe_set.remove(self.recipes[0])
+        self.assertEqual(self.counts(), [1, 0])
+
+        self.tags[0].recipe_set.clear()
+        self.assertEqual(self.counts(), [0, 0])
+
+    def test_deleted_recipes_uncounted(self):
+        """ test that hidden and deleted recipes no longer count, once."""
+        for recipe in self.recipes:
+            recipe.tags.add(self.tags[0])
+            recipe.ingredients.add(self.ingredient)
+
+        request_recipe_deletion(
+            models.Recipe.objects.filter(id=self.recipes[0].id))
+        self.assertEqual(self.counts(), [1, 0])
+
+        models.Recipe.objects.all().delete()
+        self.assertEqual(self.counts(), [0, 0])
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.recipe_count, 0)
+
+    def test_reconcile(self):
+        """ test that reconcile corrects the counts that drifted."""
+        self.recipes[0].tags.add(*self.tags)
+        models.Tag.objects.filter(id=self.tags[0].id).update(recipe_count=7)
+
+        self.assertEqual(models.Tag.objects.reconcile(), 1)
+        self.assertEqual(self.counts(), [1, 1])
+        self.assertEqual(models.Tag.objects.reconcile(), 0)
+
+    def test_reconcile_command(self):
+        """ test that the command reconciles tags and ingredients."""
+        self.recipes[0].ingredients.add(self.ingredient)
+        models.Ingredient.objects.update(recipe_count=0)
+        out = StringIO()
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.recipe_count, 1)
+        self.assertIn('corrected 0 tags and 1 ingredients', out.getvalue())
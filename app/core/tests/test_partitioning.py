@@ -0,0 +1,137 @@
+import re
+
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import partitioning
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+PARTITION_RE = re.compile(
+    r'\b(core_recipe(?:_tags|_ingredients)?)_p(\d+)\b')
+TABLE_RE = re.compile(r'"core_recipe(?:_tags|_ingredients)?"')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def postgres_version():
+    return getattr(connection, 'pg_version', 0)
+
+
+def restore_unpartitioned(tables):
+    """ put the original tables back in place of the partitioned ones."""
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)', [table.name, 'id'])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(
+                f'ALTER SEQUENCE {sequence} '
+                f'OWNED BY {table.name}_unpartitioned.id')
+        for table in reversed(tables):
+            cursor.execute(f'DROP TABLE {table.name}')
+        for table in tables:
+            cursor.execute(
+                f'ALTER TABLE {table.name}_unpartitioned '
+                f'RENAME TO {table.name}')
+
+
+@skipUnless(connection.vendor == 'postgresql' and
+            postgres_version() >= partitioning.MIN_SERVER_VERSION,
+            'declarative partitioning of postgres 12+')
+class PartitionedRecipeTest(TransactionTestCase):
+    """ test the recipe api on tables partitioned by owner."""
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(f'test{i}@testmail.com',
+                                                 'testPass')
+            for i in range(4)
+        ]
+        for user in self.users:
+            tag = Tag.objects.create(user=user, name='Vegan')
+            recipe = Recipe.objects.create(user=user, title='Soup',
+                                           time_minutes=5, price=5)
+            recipe.tags.add(tag)
+        self.user = self.users[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tables = partitioning.recipe_tables()
+        partitioning.partition_recipes(connection, 4, batch_size=2)
+
+    def tearDown(self):
+        restore_unpartitioned(self.tables)
+
+    def partitions_read(self, queries):
+        """ return the partitions the plan of each query reads."""
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not TABLE_RE.search(sql) or sql.startswith('INSERT'):
+                    continue
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                plans.append((sql, set(PARTITION_RE.findall(plan))))
+
+        return plans
+
+    def test_rows_copied(self):
+        """ test that every row is moved into the partitioned tables."""
+        self.assertTrue(partitioning.is_partitioned(connection, 'core_recipe'))
+        self.assertEqual(Recipe.objects.count(), 4)
+        self.assertEqual(Recipe.tags.through.objects.count(), 4)
+
+    def test_already_partitioned(self):
+        """ test that converting twice leaves the tables alone."""
+        self.assertFalse(partitioning.partition_recipes(connection, 4))
+
+    def test_api_reads_one_partition(self):
+        """ test that the recipe api queries are pruned to one partition."""
+        tag = Tag.objects.get(user=self.user)
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(RECIPE_URL, {
+                'title': 'Salad',
+                'tags': [tag.id],
+                'ingredients': [ingredient.id],
+                'time_minutes': 10,
+                'price': 2.00
+            })
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            recipe_id = res.data['id']
+
+            self.client.get(RECIPE_URL)
+            self.client.get(RECIPE_URL, {
+                'tags': f'{tag.id}',
+                'ingredients': f'{ingredient.id}'
+            })
+            self.client.get(detail_url(recipe_id))
+            self.client.get(SHOPPING_LIST_URL,
+                            {'recipes': recipe_id, 'servings': 2})
+            self.client.get(reverse('recipe:recipe-scale', args=[recipe_id]),
+                            {'servings': 2})
+            self.client.patch(detail_url(recipe_id), {'tags': []})
+            res = self.client.delete(detail_url(recipe_id))
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        plans = self.partitions_read(context.captured_queries)
+        self.assertTrue(plans)
+        for sql, partitions in plans:
+            tables = [table for table, _ in partitions]
+            self.assertTrue(partitions, sql)
+            self.assertEqual(len(tables), len(set(tables)), sql)
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+
+
+CREATE_USER_URL = reverse('user:create')
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def profiler_settings(self, **params):
+        """ return profiler settings that write to the test directory."""
+        options = {
+            'SAMPLE_RATE': 0,
+            'TOKEN': 'secret',
+            'DIR': self.profile_dir
+        }
+        options.update(params)
+
+        return override_settings(REQUEST_PROFILER=options)
+
+    def route_profiles(self):
+        """ return the profiles written for the create user route."""
+        route_dir = os.path.join(self.profile_dir, 'GET.user.create')
+        if not os.path.isdir(route_dir):
+            return []
+
+        return os.listdir(route_dir)
+
+    def test_sampled_request_profiled(self):
+        """ test that sampled requests are profiled and tagged by route."""
+        with self.profiler_settings(SAMPLE_RATE=1):
+            self.client.get(CREATE_USER_URL)
+
+        profiles = self.route_profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('.prof'))
+
+    def test_authorized_header_profiled(self):
+        """ test that requests with the token header are profiled."""
+        with self.profiler_settings():
+            self.client.get(CREATE_USER_URL, HTTP_X_PROFILE='secret')
+
+        self.assertEqual(len(self.route_profiles()), 1)
+
+    def test_unauthorized_header_not_profiled(self):
+        """ test that a wrong token does not profile the request."""
+        with self.profiler_settings():
+            self.client.get(CREATE_USER_URL, HTTP_X_PROFILE='wrong')
+
+        self.assertEqual(self.route_profiles(), [])
+
+    def test_profile_report(self):
+        """ test that the report command merges profiles of a route."""
+        with self.profiler_settings(SAMPLE_RATE=1):
+            self.client.get(CREATE_USER_URL)
+            self.client.get(CREATE_USER_URL)
+
+        out = StringIO()
+        call_command('profile_report', dir=self.profile_dir, limit=5,
+                     clear=True, stdout=out)
+
+        self.assertIn('GET.user.create (2 profiles', out.getvalue())
+        self.assertIn('function calls', out.getvalue())
+        self.assertEqual(self.route_profiles(), [])
@@ -0,0 +1,103 @@
+import csv
+import os
+import tempfile
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.provisioning import provision_users
+
+
+def rows(*emails, password='testPass'):
+    return [{'email': email, 'password': password, 'name': email.upper()}
+            for email in emails]
+
+
+class ProvisionUsersTest(TestCase):
+
+    def test_users_created(self):
+        """ test that users are created with their password and name."""
+        results = list(provision_users(
+            rows('a@testmail.com', 'b@TESTMAIL.com'), workers=0))
+
+        self.assertEqual(results, [
+            (1, 'a@testmail.com', 'created', []),
+            (2, 'b@testmail.com', 'created', []),
+        ])
+        user = get_user_model().objects.get(email='b@testmail.com')
+        self.assertTrue(user.check_password('testPass'))
+        self.assertEqual(user.name, 'B@TESTMAIL.COM')
+        self.assertTrue(user.is_active)
+
+    def test_duplicates_reported(self):
+        """ test that duplicate emails are reported without aborting."""
+        get_user_model().objects.create_user('taken@testmail.com', 'pw')
+        results = list(provision_users(
+            rows('a@testmail.com', 'taken@testmail.com', 'b@testmail.com',
+                 'a@testmail.com', 'c@testmail.com', 'b@testmail.com'),
+            batch_size=3, workers=0))
+
+        self.assertEqual([result[2] for result in results], [
+            'created', 'duplicate', 'created',
+            'duplicate', 'created', 'duplicate',
+        ])
+        self.assertEqual(get_user_model().objects.count(), 4)
+
+    def test_invalid_rows_reported(self):
+        """ test that rows without an email or password are reported."""
+        results = list(provision_users(
+            rows('not an email') + rows('a@testmail.com', password='pw'),
+            workers=0))
+
+        self.assertEqual([result[2] for result in results],
+                         ['invalid', 'invalid'])
+        self.assertTrue(all(result[3] for result in results))
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_csv_lines_reported(self):
+        """ test that rows of a csv are reported by their file line."""
+        reader = csv.DictReader(StringIO(
+            'email,password,name\n'
+            'a@testmail.com,testPass,"A\nB"\n'
+            '\n'
+            'not an email,testPass,C\n'))
+
+        results = list(provision_users(reader, workers=0))
+
+        self.assertEqual([(line, status) for line, _, status, _ in results],
+                         [(3, 'created'), (5, 'invalid')])
+
+    def test_batches_in_bulk(self):
+        """ test that a batch takes a fixed number of queries."""
+        with self.assertNumQueries(3):
+            list(provision_users(
+                rows(*[f'user{i}@testmail.com' for i in range(20)]),
+                workers=0))
+
+        self.assertEqual(get_user_model().objects.count(), 20)
+
+    def test_process_pool(self):
+        """ test that passwords hashed by worker processes check."""
+        list(provision_users(
+            rows('a@testmail.com', 'b@testmail.com'), workers=2))
+
+        for user in get_user_model().objects.all():
+            self.assertTrue(user.check_password('testPass'))
+
+    def test_command(self):
+        """ test that the command reads a csv and reports failures."""
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as csv_file:
+            csv_file.write('email,password,name\n'
+                           'a@testmail.com,testPass,A\n'
+                           'a@testmail.com,testPass,A\n')
+        out = StringIO()
+        call_command('provision_users', path, '--workers', '0', stdout=out)
+
+        # the header is line 1.
+        self.assertIn('line 3: a@testmail.com duplicate', out.getvalue())
+        self.assertIn('1 created, 1 duplicate, 0 invalid', out.getvalue())
@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import routers
+from core.models import Tag
+
+
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class ReplicaRouterTest(TestCase):
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_default_to_primary(self):
+        """ test that reads go to the primary outside of reads_from."""
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_reads_follow_chosen_replica(self):
+        """ test that reads inside reads_from go to its alias."""
+        with routers.reads_from('replica'):
+            self.assertEqual(self.router.db_for_read(Tag), 'replica')
+            self.assertEqual(self.router.db_for_write(Tag), 'default')
+        self.assertEqual(self.router.db_for_read(Tag), 'default')
+
+    def test_migrations_on_primary_only(self):
+        """ test that only the primary is migrated."""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+
+    @override_settings(DATABASE_REPLICAS={'replica': 1, 'drained': 0})
+    def test_weightless_replica_skipped(self):
+        """ test that replicas with a zero weight are never chosen."""
+        with patch('core.routers.random.choices',
+                   return_value=['replica']) as choices:
+            alias = routers.choose_replica()
+
+        self.assertEqual(alias, 'replica')
+        choices.assert_called_once_with(['replica'], weights=[1])
+
+
+@override_settings(DATABASE_REPLICAS={'replica': 1})
+class ReplicaMiddlewareTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com',
+            'testPassword'
+        )
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_tags(self):
+        """ list the tags, returning the queries run on each alias."""
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections['default']) as primary:
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+        return replica.captured_queries, primary.captured_queries
+
+    def test_reads_use_replica(self):
+        """ test that safe requests read from the replica."""
+        replica, primary = self.get_tags()
+
+        self.assertTrue(any('core_tag' in q['sql'] for q in replica))
+        self.assertFalse(any('core_tag' in q['sql'] for q in primary))
+
+    def test_reads_after_write_use_primary(self):
+        """ test that a user reads their own writes from the primary."""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        replica, primary = self.get_tags()
+
+        self.assertFalse(replica)
+        self.assertTrue(any('core_tag' in q['sql'] for q in primary))
+
+    def test_failed_write_not_sticky(self):
+        """ test that rejected writes don't pin reads to the primary."""
+        res = self.client.post(TAGS_URL, {'name': ''})
+
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, res.cookies)
+        replica, _ = self.get_tags()
+        self.assertTrue(replica)
+
+    def test_sticky_mark_needs_no_lookup(self):
+        """ test that the mark of a write is checked without a query."""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        _, primary = self.get_tags()
+
+        self.assertFalse(any('core_cache' in q['sql'] for q in primary))
+
+    def test_sticky_mark_of_the_user(self):
+        """ test that the mark is signed, for its user and window only."""
+        response = HttpResponse()
+        routers.mark_write(response, self.user.pk)
+        cookies = {name: morsel.value
+                   for name, morsel in response.cookies.items()}
+
+        self.assertTrue(routers.wrote_recently(cookies, self.user.pk))
+        self.assertFalse(routers.wrote_recently(cookies, self.user.pk + 1))
+        forged = {settings.REPLICA_STICKY_COOKIE: str(self.user.pk)}
+        self.assertFalse(routers.wrote_recently(forged, self.user.pk))
+        with override_settings(REPLICA_STICKY_SECONDS=-1):
+            self.assertFalse(routers.wrote_recently(cookies, self.user.pk))
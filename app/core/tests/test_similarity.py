@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core import similarity
+from core.deletion import delete_recipe_attrs, delete_recipe_rows, \
+    request_recipe_deletion
+from core.models import Ingredient, Recipe, RecipeBucket, RecipeSignature, \
+    Tag
+from core.provisioning import get_executor
+
+
+class SignatureTest(TestCase):
+    """ test the minhash signatures."""
+
+    def test_estimate(self):
+        """ test that signatures estimate the jaccard similarity."""
+        a = similarity.signature(set(range(0, 100)))
+        b = similarity.signature(set(range(50, 150)))
+        c = similarity.signature(set(range(1000, 1100)))
+
+        self.assertEqual(similarity.estimate(a, a), 1.0)
+        self.assertAlmostEqual(similarity.estimate(a, b), 1 / 3, delta=0.2)
+        self.assertLess(similarity.estimate(a, c), 0.1)
+
+    def test_packed(self):
+        """ test that a signature packs to 4 bytes per minhash."""
+        values = similarity.signature({1, 2, 3})
+        data = similarity.pack(values)
+
+        self.assertEqual(len(data), 4 * similarity.HASHES)
+        self.assertEqual(similarity.unpack(memoryview(data)), values)
+
+    def test_tags_and_ingredients_apart(self):
+        """ test that a tag and an ingredient of one id differ."""
+        self.assertEqual(similarity.features([1], [1]), {2, 3})
+
+
+class SimilarRecipesTest(TestCase):
+    """ test that signatures follow the recipes and find similar ones."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ingredient {i}')
+            for i in range(8)]
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    def recipe(self, title, *ingredients, user=None):
+        recipe = Recipe.objects.create(user=user or self.user, title=title,
+                                       time_minutes=5, price=5)
+        recipe.ingredients.add(*ingredients)
+
+        return recipe
+
+    def signature(self, recipe):
+        return similarity.unpack(
+            RecipeSignature.objects.get(recipe=recipe).signature)
+
+    def test_follows_links(self):
+        """ test that adding, removing and clearing links recomputes the
+        signature, from either side.
+        """
+        recipe = self.recipe('Soup', *self.ingredients[:2])
+        first = self.signature(recipe)
+        self.assertEqual(
+            RecipeBucket.objects.filter(recipe=recipe).count(),
+            similarity.BANDS)
+
+        self.tag.recipe_set.add(recipe)
+        self.assertNotEqual(self.signature(recipe), first)
+        self.tag.recipe_set.clear()
+        self.assertEqual(self.signature(recipe), first)
+
+        recipe.ingredients.clear()
+        self.assertFalse(RecipeSignature.objects.filter(recipe=recipe))
+        self.assertFalse(RecipeBucket.objects.filter(recipe=recipe))
+
+    def test_similar(self):
+        """ test that recipes are ranked by shared tags and ingredients."""
+        soup = self.recipe('Soup', *self.ingredients[:4])
+        close = self.recipe('Stew', *self.ingredients[:3])
+        closest = self.recipe('Broth', *self.ingredients[:4],
+                              self.ingredients[4])
+        self.recipe('Cake', *self.ingredients[6:])
+        hidden = self.recipe('Hidden', *self.ingredients[:4])
+        request_recipe_deletion(Recipe.objects.filter(id=hidden.id))
+        other = get_user_model().objects.create_user('o@testmail.com', 'pw')
+        self.recipe('Copy', *self.ingredients[:4], user=other)
+
+        self.assertEqual(similarity.similar(self.user.id, soup.id),
+                         [(closest.id, 0.8), (close.id, 0.75)])
+        self.assertEqual(similarity.similar(self.user.id, soup.id, 1),
+                         [(closest.id, 0.8)])
+
+    def test_deleted_ingredients(self):
+        """ test that deleting ingredients recomputes the signatures of
+        their recipes.
+        """
+        recipe = self.recipe('Soup', *self.ingredients[:2])
+        expected = similarity.signature(
+            similarity.features([], [self.ingredients[0].id]))
+
+        delete_recipe_attrs(Ingredient, self.user.id,
+                            [self.ingredients[1].id])
+
+        self.assertEqual(self.signature(recipe), expected)
+
+    def test_deleted_recipes(self):
+        """ test that deleted recipes lose their signatures."""
+        purged = self.recipe('Soup', *self.ingredients[:2])
+        deleted = self.recipe('Stew', *self.ingredients[:2])
+        kept = self.recipe('Broth', *self.ingredients[:2])
+
+        with connection.cursor() as cursor:
+            delete_recipe_rows(cursor, [(self.user.id, purged.id, '')])
+        Recipe.objects.filter(id=deleted.id).delete()
+
+        self.assertEqual(
+            set(RecipeSignature.objects.values_list('recipe_id', flat=True)),
+            {kept.id})
+        self.assertEqual(
+            set(RecipeBucket.objects.values_list('recipe_id', flat=True)),
+            {kept.id})
+
+    def test_build(self):
+        """ test that build stores the signatures refresh would."""
+        recipes = [self.recipe(f'recipe {i}', *self.ingredients[i:i + 3])
+                   for i in range(5)]
+        empty = self.recipe('Empty')
+        expected = {recipe.id: self.signature(recipe) for recipe in recipes}
+        RecipeSignature.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+
+        with get_executor(0) as executor:
+            stored = similarity.build(self.user.id, executor, batch_size=2)
+
+        self.assertEqual(stored, 5)
+        self.assertEqual(
+            {recipe.id: self.signature(recipe) for recipe in recipes},
+            expected)
+        self.assertFalse(RecipeSignature.objects.filter(recipe=empty))
+        self.assertEqual(RecipeBucket.objects.count(),
+                         5 * similarity.BANDS)
+
+    def test_stale_signatures_computed_again(self):
+        """ test that signatures computed before a change of the user are
+        computed again when stored.
+        """
+        recipe = self.recipe('Soup', *self.ingredients[:2])
+        seq = get_user_model().objects.get(pk=self.user.pk).change_seq
+        stale = similarity.signature({0})
+        recipe.ingredients.add(self.ingredients[2])
+        expected = self.signature(recipe)
+
+        similarity.refresh(self.user.id, [recipe.id], {recipe.id: stale}, seq)
+
+        self.assertEqual(self.signature(recipe), expected)
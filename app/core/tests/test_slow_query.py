@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import slow_query
+
+
+TAGS_URL = reverse('recipe:tag-list')
+SLOW_QUERIES_URL = reverse('core:slow-queries')
+
+
+class NormalizeSqlTest(TestCase):
+
+    def test_literals_replaced(self):
+        """ test that string and number literals become placeholders."""
+        template = slow_query.normalize_sql(
+            "SELECT * FROM t WHERE name = 'it''s' AND id = 42")
+
+        self.assertEqual(template, 'SELECT * FROM t WHERE name = ? AND id = ?')
+
+    def test_in_lists_folded(self):
+        """ test that IN lists of any length share one template."""
+        short = slow_query.normalize_sql('SELECT 1 WHERE id IN (%s)')
+        long = slow_query.normalize_sql('SELECT 1 WHERE id IN (%s, %s,  %s)')
+
+        self.assertEqual(short, long)
+        self.assertEqual(short, 'SELECT ? WHERE id IN (...)')
+
+
+class SlowQueryLogTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        fd, self.log_path = tempfile.mkstemp()
+        os.close(fd)
+        self.settings_override = override_settings(SLOW_QUERY_LOG={
+            'ENABLED': True,
+            'THRESHOLD_MS': 0,
+            'EXPLAIN': True,
+            'PATH': self.log_path
+        })
+        self.settings_override.enable()
+        slow_query._explained.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com',
+            'testPassword'
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        for path in (self.log_path, f'{self.log_path}.1'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_queries_logged_with_view(self):
+        """ test that queries above the threshold are logged by template."""
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+
+        groups = slow_query.read_slow_queries(self.log_path)
+        tag_queries = [g for g in groups if 'core_tag' in g['template']]
+
+        self.assertEqual(len(tag_queries), 1)
+        self.assertEqual(tag_queries[0]['views'], ['recipe:tag-list'])
+        self.assertTrue(tag_queries[0]['callers'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN is postgres only')
+    def test_plan_captured(self):
+        """ test that a plan is captured for slow select templates."""
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+
+        groups = slow_query.read_slow_queries(self.log_path)
+        tag_query = [g for g in groups if 'core_tag' in g['template']][0]
+
+        self.assertIn('core_tag', tag_query['plan'])
+
+    def test_log_rotates(self):
+        """ test that the log moves to a backup past its size."""
+        log = slow_query.get_log(self.log_path, 1024, 1)
+        for _ in range(20):
+            log.info('x' * 100)
+
+        self.assertLessEqual(os.path.getsize(self.log_path), 1024)
+        self.assertTrue(os.path.exists(f'{self.log_path}.1'))
+
+    def test_read_bounded(self):
+        """ test that only the last entries of the log are read."""
+        log = slow_query.get_log(self.log_path, 1024 * 1024, 1)
+        for template in ('SELECT old', 'SELECT new', 'SELECT new'):
+            log.info(json.dumps({
+                'time': '2026-10-19T00:00:00', 'duration_ms': 1,
+                'fingerprint': slow_query.fingerprint(template),
+                'template': template, 'view': None, 'caller': None,
+                'plan': None}))
+        size = os.path.getsize(self.log_path) // 3 + 1
+
+        groups = slow_query.read_slow_queries(self.log_path, size)
+
+        self.assertEqual([(g['template'], g['count']) for g in groups],
+                         [('SELECT new', 1)])
+
+    def test_slow_queries_command(self):
+        """ test that the command shows logged templates."""
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+
+        self.assertIn('core_tag', out.getvalue())
+        self.assertIn('recipe:tag-list', out.getvalue())
+
+    def test_endpoint_staff_only(self):
+        """ test that only staff users can read the slow query log."""
+        self.client.force_authenticate(self.user)
+        res = self.client.get(SLOW_QUERIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_endpoint_lists_templates(self):
+        """ test that staff users get the grouped slow queries."""
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(self.user)
+        self.client.get(TAGS_URL)
+        res = self.client.get(SLOW_QUERIES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        templates = [group['template'] for group in res.data]
+        self.assertTrue(any('core_tag' in t for t in templates))
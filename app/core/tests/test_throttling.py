@@ -0,0 +1,172 @@
+import os
+import tempfile
+
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import PROBES, BucketTable, parse_rate
+
+
+TOKEN_URL = reverse('user:token')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def throttled(**rates):
+    """ return settings of rates, on a table of their own."""
+    return override_settings(
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                        'DEFAULT_THROTTLE_RATES': rates},
+        THROTTLE_TABLE='', THROTTLE_SLOTS=1024)
+
+
+class BucketTableTest(TestCase):
+    """ test the token buckets."""
+
+    def setUp(self):
+        self.table = BucketTable(slots=64)
+        self.addCleanup(self.table.close)
+
+    def test_parse_rate(self):
+        """ test that rates give a capacity and a refill per second."""
+        self.assertEqual(parse_rate('120/min'), (120, 2))
+        self.assertEqual(parse_rate('5/s'), (5, 5))
+
+    def test_capacity(self):
+        """ test that a bucket grants its capacity then refuses."""
+        granted = [self.table.take('a', 3, 1, now=100)[0] for _ in range(4)]
+
+        self.assertEqual(granted, [True, True, True, False])
+        self.assertEqual(self.table.take('a', 3, 1, now=100), (False, 1))
+        self.assertTrue(self.table.take('b', 3, 1, now=100)[0])
+
+    def test_refill(self):
+        """ test that a bucket refills with time."""
+        self.table.take('a', 1, 0.5, now=100)
+
+        self.assertEqual(self.table.take('a', 1, 0.5, now=101), (False, 1))
+        self.assertTrue(self.table.take('a', 1, 0.5, now=102)[0])
+
+    def test_shared_file(self):
+        """ test that tables of the same file share their buckets."""
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        first, second = BucketTable(path, 64), BucketTable(path, 64)
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+
+        first.take('a', 1, 1, now=100)
+
+        self.assertFalse(second.take('a', 1, 1, now=100)[0])
+
+    def test_peek(self):
+        """ test that peeking at a bucket takes no token."""
+        self.assertEqual(self.table.peek('a', 1, 1, now=100), (True, 0.0))
+        self.table.take('a', 1, 1, now=100)
+
+        self.assertEqual(self.table.peek('a', 1, 1, now=100), (False, 1))
+        self.assertTrue(self.table.peek('a', 1, 1, now=101)[0])
+        self.assertTrue(self.table.take('a', 1, 1, now=101)[0])
+
+    def test_collisions_keep_their_buckets(self):
+        """ test that keys of the same slot keep buckets of their own."""
+        table = BucketTable(slots=1)
+        self.addCleanup(table.close)
+        keys = [f'key:{i}' for i in range(PROBES)]
+
+        for key in keys:
+            self.assertTrue(table.take(key, 1, 0.01, now=100)[0])
+
+        for key in keys:
+            self.assertFalse(table.take(key, 1, 0.01, now=100)[0])
+
+    def test_full_probes_grant_no_tokens(self):
+        """ test that a key pushing out another starts no fuller than it."""
+        table = BucketTable(slots=1)
+        self.addCleanup(table.close)
+        for i in range(PROBES):
+            table.take(f'key:{i}', 1, 0.01, now=100)
+
+        self.assertFalse(table.take('other', 1, 0.01, now=100)[0])
+        self.assertFalse(table.take('key:0', 1, 0.01, now=100)[0])
+        self.assertTrue(table.take('other', 1, 0.01, now=200)[0])
+
+    def test_full_buckets_free_their_slot(self):
+        """ test that a full bucket leaves its slot to another key."""
+        table = BucketTable(slots=1)
+        self.addCleanup(table.close)
+        for i in range(PROBES):
+            table.take(f'key:{i}', 1, 1, now=100)
+
+        self.assertTrue(table.take('other', 1, 1, now=101)[0])
+        self.assertFalse(table.take('other', 1, 1, now=101)[0])
+
+    def test_default_table_shared(self):
+        """ test that the processes share a table file by default."""
+        self.assertTrue(settings.THROTTLE_TABLE)
+
+    def test_benchmark_command(self):
+        """ test that the benchmark reports the time of a check."""
+        out = StringIO()
+        call_command('benchmark_throttle', '--checks', '10', stdout=out)
+
+        self.assertIn('us per check', out.getvalue())
+
+
+class ThrottleApiTest(TestCase):
+    """ test the throttles of the api."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @throttled(read='2/min', write='1/min')
+    def test_reads_and_writes(self):
+        """ test that reads and writes have budgets of their own."""
+        for _ in range(2):
+            self.assertEqual(self.client.get(TAGS_URL).status_code,
+                             status.HTTP_200_OK)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.post(TAGS_URL, {'name': 'Quick'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttled(read='1/min')
+    def test_per_user(self):
+        """ test that users are throttled one by one."""
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            'other@testmail.com', 'testPass'))
+
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(self.client.get(TAGS_URL).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.get(TAGS_URL).status_code, status.HTTP_200_OK)
+
+    @throttled(login='2/min')
+    def test_login(self):
+        """ test that the password checks of an address are throttled."""
+        payload = {'email': 'test@testmail.com', 'password': 'testPass'}
+        client = APIClient()
+        for _ in range(2):
+            client.post(TOKEN_URL, {**payload, 'password': 'wrong'})
+        res = client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,248 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+from rest_framework import throttling
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+
+
+# version, key hash, tokens, time, capacity and refill of a bucket. the
+# version is odd while the bucket is written, readers retry or lock when it is.
+SLOT = struct.Struct('<QQdddd')
+VERSION = struct.Struct('<Q')
+BUCKET = struct.Struct('<Qdddd')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# slots a key looks at from the one it hashes to.
+PROBES = 8
+
+
+def parse_rate(rate):
+    """ return the capacity and refill per second of a rate such as
+    '100/min', as DRF writes them.
+    """
+    count, period = rate.split('/')
+
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+def key_hash(key):
+    """ return a non zero 64 bit hash of key, the same in every process."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+    return int.from_bytes(digest, 'little') or 1
+
+
+def refilled(tokens, stamp, capacity, refill, now):
+    """ return the tokens of a bucket at now."""
+    return min(capacity, tokens + max(0.0, now - stamp) * refill)
+
+
+class BucketTable:
+    """ token buckets in a table of slots shared by the processes that map
+    the same file.
+
+    a key hashes to a slot and keeps its bucket in the first of the PROBES
+    slots from there that is free, empty or holding a full bucket. when none
+    is, it takes the slot of the fullest bucket and starts as full as it, so
+    keys pushing each other out never gain tokens. a bucket that can't grant
+    a token is read without a lock, taking a token locks the probes of the
+    key with a record lock, and the thread lock as record locks are per
+    process.
+    """
+
+    def __init__(self, path=None, slots=65536):
+        self.slots = slots
+        # the probes of the last slots run past them, not around.
+        self.size = (slots + PROBES - 1) * SLOT.size
+        if path:
+            self.file = open(path, 'a+b')
+        else:
+            # in memory when possible, private to this process.
+            shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            self.file = tempfile.TemporaryFile(dir=shm)
+        self.fd = self.file.fileno()
+        if os.fstat(self.fd).st_size < self.size:
+            os.ftruncate(self.fd, self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+        # one lock, the probes of two keys overlap and a thread unlocking
+        # its records would unlock those of the others.
+        self.thread_lock = threading.Lock()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def read(self, first, key):
+        """ return the tokens and time of the bucket of key read without a
+        lock, or None while it's written or not in the probes of first.
+        """
+        for offset in range(first, first + PROBES * SLOT.size, SLOT.size):
+            version, slot_key, tokens, stamp, _, _ = SLOT.unpack_from(
+                self.map, offset)
+            if version & 1:
+                return None
+            if VERSION.unpack_from(self.map, offset)[0] != version:
+                return None
+            if slot_key == key:
+                return tokens, stamp
+
+        return None
+
+    def claim(self, first, key, capacity, refill, now):
+        """ return the offset and tokens of the bucket of key, the probes of
+        first locked.
+        """
+        fullest, share = None, -1.0
+        for offset in range(first, first + PROBES * SLOT.size, SLOT.size):
+            _, slot_key, tokens, stamp, slot_capacity, slot_refill = \
+                SLOT.unpack_from(self.map, offset)
+            if slot_key == key:
+                return offset, refilled(tokens, stamp, capacity, refill, now)
+            if not slot_key:
+                slot_share = 1.0
+            else:
+                slot_share = refilled(tokens, stamp, slot_capacity,
+                                      slot_refill, now) / slot_capacity
+            if slot_share > share:
+                fullest, share = offset, slot_share
+
+        return fullest, min(1.0, share) * capacity
+
+    def peek(self, key, capacity, refill, now=None):
+        """ return whether the bucket of key has a token, without taking
+        it, and the seconds until it has one.
+        """
+        now = time.time() if now is None else now
+        key = key_hash(key)
+        bucket = self.read(key % self.slots * SLOT.size, key)
+        if bucket is None:
+            return True, 0.0
+        tokens = refilled(*bucket, capacity, refill, now)
+
+        return tokens >= 1, max(0.0, (1 - tokens) / refill)
+
+    def take(self, key, capacity, refill, now=None):
+        """ take a token from the bucket of key.
+
+        return whether it was granted and the seconds until the next one.
+        """
+        now = time.time() if now is None else now
+        key = key_hash(key)
+        first = key % self.slots * SLOT.size
+
+        bucket = self.read(first, key)
+        if bucket is not None:
+            tokens = refilled(*bucket, capacity, refill, now)
+            if tokens < 1:
+                return False, (1 - tokens) / refill
+
+        with self.thread_lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, PROBES * SLOT.size, first)
+            try:
+                offset, tokens = self.claim(first, key, capacity, refill, now)
+                granted = tokens >= 1
+                if granted:
+                    tokens -= 1
+                version = VERSION.unpack_from(self.map, offset)[0]
+                VERSION.pack_into(self.map, offset, version + 1)
+                BUCKET.pack_into(self.map, offset + VERSION.size, key, tokens,
+                                 now, capacity, refill)
+                VERSION.pack_into(self.map, offset, version + 2)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, PROBES * SLOT.size, first)
+
+        return granted, 0.0 if granted else (1 - tokens) / refill
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_table():
+    """ return the bucket table of THROTTLE_TABLE, created at first use."""
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = BucketTable(getattr(settings, 'THROTTLE_TABLE', ''),
+                                 getattr(settings, 'THROTTLE_SLOTS', 65536))
+
+    return _table
+
+
+def reset_table(setting, **kwargs):
+    global _table
+    if setting in ('THROTTLE_TABLE', 'THROTTLE_SLOTS'):
+        with _table_lock:
+            if _table is not None:
+                _table.close()
+            _table = None
+
+
+setting_changed.connect(reset_table)
+
+
+def check(scope, ident, take=True):
+    """ take a token of scope for ident, a user or an address, or only
+    look whether one is left if take is false.
+
+    return whether the request is allowed and the seconds to wait if not,
+    scopes without a rate are not throttled.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if rate is None:
+        return True, 0.0
+    capacity, refill = parse_rate(rate)
+    table = get_table()
+    if not take:
+        return table.peek(f'{scope}:{ident}', capacity, refill)
+
+    return table.take(f'{scope}:{ident}', capacity, refill)
+
+
+class BucketRateThrottle(throttling.BaseThrottle):
+    """ token bucket throttle of a scope, per user or per address of the
+    anonymous clients. the rates are DEFAULT_THROTTLE_RATES.
+    """
+    scope = None
+
+    def get_scope(self, request):
+        return self.scope
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        allowed, self.delay = check(self.get_scope(request),
+                                    self.get_client(request))
+
+        return allowed
+
+    def wait(self):
+        return self.delay
+
+
+class RequestRateThrottle(BucketRateThrottle):
+    """ throttle the reads and the writes of a client on their own."""
+
+    def get_scope(self, request):
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+
+class LoginRateThrottle(BucketRateThrottle):
+    """ throttle the password checks of an address."""
+    scope = 'login'
+
+    def get_client(self, request):
+        return f'ip:{self.get_ident(request)}'
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.db.models import Case, CharField, DecimalField, Value, When
+
+
+# base unit and size in it of each unit of a quantity, quantities without
+# a unit are counts.
+UNITS = {
+    '': ('', Decimal(1)),
+    'g': ('g', Decimal(1)),
+    'kg': ('g', Decimal(1000)),
+    'mg': ('g', Decimal('0.001')),
+    'oz': ('g', Decimal('28.349523125')),
+    'lb': ('g', Decimal('453.59237')),
+    'ml': ('ml', Decimal(1)),
+    'l': ('ml', Decimal(1000)),
+    'tsp': ('ml', Decimal('4.92892159375')),
+    'tbsp': ('ml', Decimal('14.78676478125')),
+    'cup': ('ml', Decimal('236.5882365')),
+}
+
+UNIT_CHOICES = [(unit, unit or 'count') for unit in UNITS]
+
+QUANTITY = DecimalField(max_digits=20, decimal_places=3)
+
+
+def base_unit(field='unit'):
+    """ return an expression of the base unit of the unit in field."""
+    return Case(
+        *[When(**{field: unit}, then=Value(base))
+          for unit, (base, _) in UNITS.items()],
+        output_field=CharField()
+    )
+
+
+def in_base_unit(quantity, field='unit'):
+    """ return an expression of quantity converted from the unit in field
+    to its base unit.
+    """
+    return quantity * Case(
+        *[When(**{field: unit}, then=Value(size))
+          for unit, (_, size) in UNITS.items()],
+        output_field=QUANTITY
+    )
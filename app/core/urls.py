@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = 'core'
+
+urlpatterns = [
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    path('cache-stats/', views.CacheStatsView.as_view(),
+         name='cache-stats'),
+    path('slow-queries/', views.SlowQueryListView.as_view(),
+         name='slow-queries'),
+]
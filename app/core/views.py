@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from rest_framework import views, permissions
+from rest_framework.response import Response
+
+from .batch import run_atomic_batch, run_batch
+from .cache import TwoLevelCache
+from .db import database_ready, pool_stats
+from .serializers import BatchSerializer
+from .slow_query import get_slow_query_settings, read_slow_queries
+
+
+def healthz(request):
+    """ report readiness, reusing a cached database check."""
+    ready = database_ready()
+    body = {
+        'status': 'ok' if ready else 'unavailable',
+        'database': ready,
+        'pools': pool_stats(),
+    }
+
+    return JsonResponse(body, status=200 if ready else 503)
+
+
+class SlowQueryListView(views.APIView):
+    """ list logged slow queries grouped by template, staff only."""
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        """ return the slowest query templates."""
+        try:
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            limit = 50
+        groups = read_slow_queries(get_slow_query_settings()['PATH'])
+
+        return Response(groups[:limit])
+
+
+class CacheStatsView(views.APIView):
+    """ report the hits and misses of the two level caches of this
+    process, staff only.
+    """
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response({
+            alias: caches[alias].stats() for alias in settings.CACHES
+            if isinstance(caches[alias], TwoLevelCache)
+        })
+
+
+class BatchView(views.APIView):
+    """ run several api requests of the user in one round trip.
+
+    the user is authenticated once for all of them. the reads between two
+    writes run concurrently, atomic runs them all in one transaction.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def post(self, request):
+        """ return the responses of the requests, in order."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = [dict(operation) for operation
+                      in serializer.validated_data['requests']]
+        run = run_atomic_batch if serializer.validated_data['atomic'] \
+            else run_batch
+
+        response = Response({'responses': run(request, operations)})
+        response.wrote = any(
+            operation['method'] not in permissions.SAFE_METHODS
+            for operation in operations)
+
+        return response
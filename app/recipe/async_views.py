@@ -0,0 +1,336 @@
+import asyncio
+import re
+
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.http.cookie import parse_cookie
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from core.asyncdb import get_database, close_databases
+from core.models import User, Tag, Ingredient, Recipe, RecipeTag, \
+    RecipeIngredient
+from core.routers import header_user_id, get_replicas, choose_replica, \
+    wrote_recently
+from core.throttling import check
+
+
+RECIPES = Recipe._meta.db_table
+RECIPE_TAGS = RecipeTag._meta.db_table
+RECIPE_INGREDIENTS = RecipeIngredient._meta.db_table
+
+PRICE = serializers.DecimalField(
+    max_digits=Recipe._meta.get_field('price').max_digits,
+    decimal_places=Recipe._meta.get_field('price').decimal_places,
+)
+
+SECURITY_MIDDLEWARE = 'django.middleware.security.SecurityMiddleware'
+
+LIST_ALLOW = b'GET, POST, HEAD, OPTIONS'
+DETAIL_ALLOW = b'GET, PUT, PATCH, DELETE, HEAD, OPTIONS'
+
+
+class Request:
+    """ the parts of an asgi request the read handlers look at."""
+
+    def __init__(self, scope):
+        self.path = scope['path']
+        self.scheme = scope.get('scheme', 'http')
+        self.headers = {
+            name.decode('latin1'): value.decode('latin1')
+            for name, value in scope.get('headers', ())
+        }
+        self.cookies = parse_cookie(self.headers.get('cookie', ''))
+        self.query_params = {
+            name: values[-1] for name, values in parse_qs(
+                scope.get('query_string', b'').decode('latin1'),
+                keep_blank_values=True).items()
+        }
+
+    def is_secure(self):
+        """ return true if the request came over https, trusting
+        SECURE_PROXY_SSL_HEADER like django does.
+        """
+        if settings.SECURE_PROXY_SSL_HEADER:
+            name, value = settings.SECURE_PROXY_SSL_HEADER
+            header = self.headers.get(
+                name[len('HTTP_'):].lower().replace('_', '-'))
+            if header is not None:
+                return header == value
+
+        return self.scheme == 'https'
+
+
+def params_to_ints(qs):
+    """ convert a comma separated list of ids to a list of integers."""
+    return [int(str_id) for str_id in qs.split(',') if str_id.isdigit()]
+
+
+def linked_ids(table, column):
+    """ sql array of the ids linked to recipe r through table."""
+    return (f'ARRAY(SELECT {column} FROM {table} '
+            f'WHERE user_id = r.user_id AND recipe_id = r.id '
+            f'ORDER BY {column})')
+
+
+def linked_values(table, column, model, field):
+    """ sql array of a field of the objects linked to recipe r."""
+    return (f'ARRAY(SELECT t.{field} FROM {table} l '
+            f'JOIN {model._meta.db_table} t ON t.id = l.{column} '
+            f'WHERE l.user_id = r.user_id AND l.recipe_id = r.id '
+            f'ORDER BY t.id)')
+
+
+async def recipe_list(db, user_id, params):
+    sql = (
+        f'SELECT r.id, r.title, r.time_minutes, r.servings, r.price, r.link, '
+        f'{linked_ids(RECIPE_INGREDIENTS, "ingredient_id")}, '
+        f'{linked_ids(RECIPE_TAGS, "tag_id")} '
+        f'FROM {RECIPES} r '
+        f'WHERE r.user_id = %s AND r.deleted_at IS NULL'
+    )
+    args = [user_id]
+    for name, table, column in (
+            ('tags', RECIPE_TAGS, 'tag_id'),
+            ('ingredients', RECIPE_INGREDIENTS, 'ingredient_id')):
+        if params.get(name):
+            sql += (f' AND EXISTS (SELECT 1 FROM {table} '
+                    f'WHERE user_id = r.user_id AND recipe_id = r.id '
+                    f'AND {column} = ANY(%s))')
+            args.append(params_to_ints(params[name]))
+    rows = await db.fetch(sql + ' ORDER BY r.id DESC', args)
+
+    return [
+        {
+            'id': recipe_id,
+            'title': title,
+            'ingredients': list(ingredients),
+            'tags': list(tags),
+            'time_minutes': time_minutes,
+            'servings': servings,
+            'price': PRICE.to_representation(price),
+            'link': link,
+        }
+        for (recipe_id, title, time_minutes, servings, price, link,
+             ingredients, tags) in rows
+    ]
+
+
+async def recipe_detail(db, user_id, params, pk):
+    linked = [
+        linked_values(table, column, model, field)
+        for table, column, model in (
+            (RECIPE_INGREDIENTS, 'ingredient_id', Ingredient),
+            (RECIPE_TAGS, 'tag_id', Tag))
+        for field in ('id', 'name')
+    ]
+    sql = (
+        f'SELECT r.id, r.title, r.time_minutes, r.servings, r.price, r.link, '
+        f'{", ".join(linked)} '
+        f'FROM {RECIPES} r '
+        f'WHERE r.user_id = %s AND r.id = %s AND r.deleted_at IS NULL'
+    )
+    rows = await db.fetch(sql, [user_id, int(pk)])
+    if not rows:
+        # let django answer the 404.
+        return None
+    (recipe_id, title, time_minutes, servings, price, link,
+     ingredient_ids, ingredient_names, tag_ids, tag_names) = rows[0]
+
+    return {
+        'id': recipe_id,
+        'title': title,
+        'ingredients': [{'id': i, 'name': name} for i, name
+                        in zip(ingredient_ids, ingredient_names)],
+        'tags': [{'id': i, 'name': name} for i, name
+                 in zip(tag_ids, tag_names)],
+        'time_minutes': time_minutes,
+        'servings': servings,
+        'price': PRICE.to_representation(price),
+        'link': link,
+    }
+
+
+def attribute_list(model):
+    table = model._meta.db_table
+
+    async def handler(db, user_id, params):
+        sql = f'SELECT id, name FROM {table} WHERE user_id = %s'
+        args = [user_id]
+        if params.get('name'):
+            sql += ' AND LOWER(name) = LOWER(%s)'
+            args.append(params['name'])
+        rows = await db.fetch(sql + ' ORDER BY id DESC', args)
+
+        return [{'id': pk, 'name': name} for pk, name in rows]
+
+    return handler
+
+
+ROUTES = (
+    (re.compile(r'^/api/recipe/recipes/$'), recipe_list,
+     {'tags', 'ingredients'}, LIST_ALLOW),
+    (re.compile(r'^/api/recipe/recipes/(\d+)/$'), recipe_detail,
+     set(), DETAIL_ALLOW),
+    (re.compile(r'^/api/recipe/tags/$'), attribute_list(Tag),
+     {'name'}, LIST_ALLOW),
+    (re.compile(r'^/api/recipe/ingredients/$'), attribute_list(Ingredient),
+     {'name'}, LIST_ALLOW),
+)
+
+
+def async_reads_enabled():
+    return getattr(settings, 'ASYNC_READS', False) and \
+        connections[DEFAULT_DB_ALIAS].vendor == 'postgresql'
+
+
+def read_alias(request, user_id):
+    """ return the alias to read from, like ReplicaMiddleware does."""
+    replicas = get_replicas()
+    if not replicas or wrote_recently(request.cookies, user_id):
+        return DEFAULT_DB_ALIAS
+
+    return choose_replica(replicas)
+
+
+async def is_active(db, user_id):
+    rows = await db.fetch(
+        f'SELECT is_active FROM {User._meta.db_table} WHERE id = %s',
+        [user_id])
+
+    return bool(rows and rows[0][0])
+
+
+def handles(request, allowed_params):
+    """ return true if request can be answered without django.
+
+    anything else, such as the browsable api or a profiled request, is
+    served by the django views.
+    """
+    accept = request.headers.get('accept', 'application/json')
+    if 'text/html' in accept:
+        return False
+    profiler = getattr(settings, 'REQUEST_PROFILER', {}).get('HEADER', '')
+    if profiler[len('HTTP_'):].lower().replace('_', '-') in request.headers:
+        return False
+
+    # the security middleware redirects these to https.
+    if settings.SECURE_SSL_REDIRECT and not request.is_secure():
+        return False
+
+    return set(request.query_params) <= allowed_params
+
+
+def security_headers(request):
+    """ return the headers the security middleware adds to the response
+    to request, built from the same settings.
+    """
+    if SECURITY_MIDDLEWARE not in settings.MIDDLEWARE:
+        return []
+    headers = []
+    if settings.SECURE_HSTS_SECONDS and request.is_secure():
+        value = f'max-age={settings.SECURE_HSTS_SECONDS}'
+        if settings.SECURE_HSTS_INCLUDE_SUBDOMAINS:
+            value += '; includeSubDomains'
+        if settings.SECURE_HSTS_PRELOAD:
+            value += '; preload'
+        headers.append((b'strict-transport-security', value.encode()))
+    if settings.SECURE_CONTENT_TYPE_NOSNIFF:
+        headers.append((b'x-content-type-options', b'nosniff'))
+    if settings.SECURE_BROWSER_XSS_FILTER:
+        headers.append((b'x-xss-protection', b'1; mode=block'))
+    if settings.SECURE_REFERRER_POLICY:
+        policy = settings.SECURE_REFERRER_POLICY
+        if isinstance(policy, str):
+            policy = policy.split(',')
+        headers.append((b'referrer-policy',
+                        ','.join(v.strip() for v in policy).encode()))
+
+    return headers
+
+
+async def respond(request, routes=ROUTES):
+    """ return the status, headers and body of a hot read, or None to
+    leave the request to django.
+    """
+    for pattern, handler, allowed_params, allow in routes:
+        match = pattern.match(request.path)
+        if match:
+            break
+    else:
+        return None
+    if not handles(request, allowed_params):
+        return None
+
+    # tokens are checked in process, an invalid one gets django's 401.
+    user_id = header_user_id(request.headers.get('authorization', ''))
+    if user_id is None:
+        return None
+    # a throttled read is refused by django. the token is taken once the
+    # read is answered here, django takes its own for the others.
+    if not check('read', f'user:{user_id}', take=False)[0]:
+        return None
+
+    db = get_database(read_alias(request, user_id))
+    try:
+        active, data = await asyncio.gather(
+            is_active(db, user_id),
+            handler(db, user_id, request.query_params, *match.groups()))
+    except ValueError:
+        return None
+    if not active or data is None:
+        return None
+    if not check('read', f'user:{user_id}')[0]:
+        return None
+
+    body = JSONRenderer().render(data)
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'vary', b'Accept'),
+        (b'allow', allow),
+        (b'content-length', str(len(body)).encode()),
+        *security_headers(request),
+    ]
+
+    return 200, headers, body
+
+
+class AsyncReadRouter:
+    """ asgi application answering the hot recipe reads with async
+    queries, other requests go to the django application.
+
+    the reads are only served here on postgresql with ASYNC_READS set,
+    and only for valid tokens of active users.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_databases()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET' and \
+                async_reads_enabled():
+            response = await respond(Request(scope))
+            if response is not None:
+                status, headers, body = response
+                await send({'type': 'http.response.start',
+                            'status': status, 'headers': headers})
+                await send({'type': 'http.response.body', 'body': body})
+                return
+
+        return await self.application(scope, receive, send)
@@ -0,0 +1,278 @@
+import threading
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from core.models import Change, Recipe, RecipeIngredient
+
+
+def count_bits(bitmaps):
+    """ add up bitmaps position by position.
+
+    return the bit slices of the sums, slice j holds bit j of the sum at
+    each position, so k bitmaps add up in log2(k) slices.
+    """
+    slices = []
+    for bitmap in bitmaps:
+        carry = bitmap
+        for j, bits in enumerate(slices):
+            slices[j] = bits ^ carry
+            carry &= bits
+            if not carry:
+                break
+        else:
+            if carry:
+                slices.append(carry)
+
+    return slices
+
+
+def equal_to(slices, count, within):
+    """ return the positions of within where the sum in slices is count."""
+    if count >> len(slices):
+        return 0
+    bitmap = within
+    for j, bits in enumerate(slices):
+        bitmap &= bits if count >> j & 1 else ~bits
+
+    return bitmap
+
+
+def bitmap_of(positions, size):
+    """ return the bitmap of positions below size, built as bytes rather
+    than one int at a time.
+    """
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+
+    return int.from_bytes(data, 'little')
+
+
+def highest(bitmap, limit):
+    """ return the highest limit positions set in bitmap."""
+    positions = []
+    while bitmap and len(positions) < limit:
+        position = bitmap.bit_length() - 1
+        positions.append(position)
+        bitmap ^= 1 << position
+
+    return positions
+
+
+class CoverageIndex:
+    """ the recipes of a user by ingredient, as bitmaps of positions.
+
+    each recipe takes the next position when it's indexed, the bitmap of
+    an ingredient is a python int with the bits of its recipes set, the
+    bitmap of a size those of the recipes with that many ingredients.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seq = None
+        self.positions = {}
+        self.recipes = []
+        self.ingredients = []
+        self.by_ingredient = {}
+        self.by_size = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def unset(self, bitmaps, key, bit):
+        bitmap = bitmaps[key] & ~bit
+        if bitmap:
+            bitmaps[key] = bitmap
+        else:
+            del bitmaps[key]
+
+    def discard(self, position):
+        bit = 1 << position
+        ingredient_ids = self.ingredients[position]
+        for ingredient_id in ingredient_ids:
+            self.unset(self.by_ingredient, ingredient_id, bit)
+        self.unset(self.by_size, len(ingredient_ids), bit)
+        self.ingredients[position] = None
+
+    def set(self, recipe_id, ingredient_ids):
+        """ index recipe_id with ingredient_ids, in place of what it had."""
+        position = self.positions.get(recipe_id)
+        if position is None:
+            position = self.positions[recipe_id] = len(self.recipes)
+            self.recipes.append(recipe_id)
+            self.ingredients.append(None)
+        else:
+            self.discard(position)
+        bit = 1 << position
+        ingredient_ids = frozenset(ingredient_ids)
+        for ingredient_id in ingredient_ids:
+            self.by_ingredient[ingredient_id] = \
+                self.by_ingredient.get(ingredient_id, 0) | bit
+        self.by_size[len(ingredient_ids)] = \
+            self.by_size.get(len(ingredient_ids), 0) | bit
+        self.ingredients[position] = ingredient_ids
+
+    def load(self, recipes):
+        """ index recipes, a mapping of recipe ids to ingredient ids, into
+        an empty index.
+        """
+        by_ingredient = {}
+        by_size = {}
+        for position, (recipe_id, ingredient_ids) in enumerate(
+                recipes.items()):
+            ingredient_ids = frozenset(ingredient_ids)
+            self.positions[recipe_id] = position
+            self.recipes.append(recipe_id)
+            self.ingredients.append(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                by_ingredient.setdefault(ingredient_id, []).append(position)
+            by_size.setdefault(len(ingredient_ids), []).append(position)
+
+        size = len(self.recipes)
+        self.by_ingredient = {key: bitmap_of(positions, size)
+                              for key, positions in by_ingredient.items()}
+        self.by_size = {key: bitmap_of(positions, size)
+                        for key, positions in by_size.items()}
+
+    def remove(self, recipe_id):
+        position = self.positions.pop(recipe_id, None)
+        if position is not None:
+            self.discard(position)
+
+    def search(self, ingredient_ids, limit, max_missing=None):
+        """ rank the recipes using any of ingredient_ids, fewest missing
+        ingredients first, then most covered, then latest indexed.
+
+        return (recipe id, covered, missing ingredient ids) triples.
+        """
+        bitmaps = [self.by_ingredient[ingredient_id]
+                   for ingredient_id in set(ingredient_ids)
+                   if ingredient_id in self.by_ingredient]
+        if not bitmaps:
+            return []
+        slices = count_bits(bitmaps)
+        candidates = 0
+        for bitmap in bitmaps:
+            candidates |= bitmap
+        by_covered = [(count, equal_to(slices, count, candidates))
+                      for count in range(len(bitmaps), 0, -1)]
+        by_covered = [(count, bitmap) for count, bitmap in by_covered
+                      if bitmap]
+
+        # a recipe misses one ingredient less than the largest has at most.
+        missing_counts = max(self.by_size)
+        if max_missing is not None:
+            missing_counts = min(missing_counts, max_missing + 1)
+        have = frozenset(ingredient_ids)
+        results = []
+        for missing in range(missing_counts):
+            for covered, bitmap in by_covered:
+                bucket = bitmap & self.by_size.get(covered + missing, 0)
+                for position in highest(bucket, limit - len(results)):
+                    results.append((
+                        self.recipes[position], covered,
+                        sorted(self.ingredients[position] - have)))
+                if len(results) == limit:
+                    return results
+
+        return results
+
+
+def load_links(user_id, recipe_ids=None, using=DEFAULT_DB_ALIAS):
+    """ return the ingredient ids of the live recipes of user_id, of
+    recipe_ids only if given.
+    """
+    recipes = Recipe.objects.using(using).live().filter(user_id=user_id)
+    links = RecipeIngredient.objects.using(using).filter(
+        user_id=user_id,
+        recipe__user_id=user_id,
+        recipe__deleted_at__isnull=True
+    )
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        links = links.filter(recipe_id__in=recipe_ids)
+    ingredients = {recipe_id: [] for recipe_id in
+                   recipes.order_by('id').values_list('id', flat=True)}
+    for recipe_id, ingredient_id in links.values_list(
+            'recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].append(ingredient_id)
+
+    return ingredients
+
+
+def build(index, user_id, using=DEFAULT_DB_ALIAS):
+    """ fill index with the recipes of user_id."""
+    # changes after this seq are applied by the next sync.
+    seq = get_user_model().objects.using(using).filter(
+        pk=user_id).values_list('change_seq', flat=True).get()
+    index.load(load_links(user_id, using=using))
+    index.seq = seq
+
+
+def sync(index, user_id, using=DEFAULT_DB_ALIAS):
+    """ bring index up to date, reindexing the recipes that changed since
+    it was, from the change feed of the user.
+
+    the feed holds the recipes whose ingredients were added, removed or
+    deleted, the writes of every process included.
+    """
+    if index.seq is None:
+        return build(index, user_id, using)
+    changes = list(Change.objects.using(using).filter(
+        user_id=user_id, seq__gt=index.seq
+    ).values_list('kind', 'object_id', 'seq'))
+    if not changes:
+        return
+    rebuild = getattr(settings, 'COVERAGE_INDEX_REBUILD', 5000)
+    holes = len(index.recipes) - len(index)
+    if len(changes) > rebuild or holes > max(len(index), rebuild):
+        index.reset()
+        return build(index, user_id, using)
+
+    recipe_ids = sorted(object_id for kind, object_id, _ in changes
+                        if kind == Change.RECIPE)
+    ingredients = load_links(user_id, recipe_ids, using)
+    for recipe_id in recipe_ids:
+        if recipe_id in ingredients:
+            index.set(recipe_id, ingredients[recipe_id])
+        else:
+            index.remove(recipe_id)
+    index.seq = max(seq for *_, seq in changes)
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def search(user_id, ingredient_ids, limit, max_missing=None,
+           using=DEFAULT_DB_ALIAS):
+    """ rank the recipes of user_id by coverage of ingredient_ids, see
+    CoverageIndex.search.
+
+    the index of a user is built at its first search and kept for the
+    COVERAGE_INDEX_USERS users searching most recently.
+    """
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = CoverageIndex()
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > getattr(settings, 'COVERAGE_INDEX_USERS', 100):
+            _indexes.popitem(last=False)
+
+    with index.lock:
+        sync(index, user_id, using)
+        return index.search(ingredient_ids, limit, max_missing)
+
+
+def clear():
+    """ drop the indexes of every user."""
+    with _indexes_lock:
+        _indexes.clear()
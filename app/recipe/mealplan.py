@@ -0,0 +1,287 @@
+import heapq
+import time
+
+from bisect import bisect_right, insort
+from collections import namedtuple
+from itertools import accumulate
+
+from django.db import DEFAULT_DB_ALIAS
+
+from core.models import Recipe, RecipeTag
+
+
+# price in cents, minutes and tags as a bitmap, integers all.
+Candidate = namedtuple('Candidate', 'id price minutes tags')
+
+# days of recipe ids, the number of distinct tags and total price of the
+# plan, and whether no better plan exists.
+Plan = namedtuple('Plan', 'days tags price optimal')
+
+CHECK_EVERY = 512
+
+
+def count_tags(tags):
+    return bin(tags).count('1')
+
+
+def undominated(candidates, slots):
+    """ drop the candidates no plan needs.
+
+    a candidate of the same tags as slots others at most as expensive and
+    as long is never needed: one of those is free to take its place.
+    """
+    groups = {}
+    for candidate in candidates:
+        groups.setdefault(candidate.tags, []).append(candidate)
+    kept = []
+    for group in groups.values():
+        minutes = []
+        for candidate in sorted(group, key=lambda c: (c.price, c.minutes,
+                                                      c.id)):
+            if bisect_right(minutes, candidate.minutes) < slots:
+                kept.append(candidate)
+            insort(minutes, candidate.minutes)
+
+    return kept
+
+
+class Deadline(Exception):
+    pass
+
+
+class Solver:
+    """ branch and bound search of the plan of days of meals recipes
+    covering the most distinct tags, then costing the least, within the
+    budget and the minutes of each day.
+
+    candidates are tried most tags first. a plan is searched in one order
+    only: the recipes of a day in candidate order, the days in the order
+    of their first recipe. branches are cut when the cheapest recipes
+    overrun the budget or when the most tags the remaining slots could add
+    don't beat the best plan found.
+    """
+
+    def __init__(self, candidates, days, meals, budget, minutes):
+        self.days = days
+        self.meals = meals
+        self.slots = days * meals
+        self.budget = budget
+        self.minutes = minutes
+        candidates = [c for c in candidates
+                      if c.price <= budget and c.minutes <= minutes]
+        self.candidates = sorted(
+            undominated(candidates, self.slots),
+            key=lambda c: (-count_tags(c.tags), c.price, c.minutes, c.id))
+        self.counts = [count_tags(c.tags) for c in self.candidates]
+        self.all_tags = 0
+        for candidate in self.candidates:
+            self.all_tags |= candidate.tags
+        # the sums of the cheapest 0, 1, ... slots candidates from each one
+        # on, the rest of a plan comes after the first recipe of its day.
+        self.cheapest = [[0]]
+        prices = []
+        for candidate in reversed(self.candidates):
+            if len(prices) < self.slots:
+                heapq.heappush(prices, -candidate.price)
+            elif candidate.price < -prices[0]:
+                heapq.heapreplace(prices, -candidate.price)
+            self.cheapest.append(
+                [0] + list(accumulate(sorted(-price for price in prices))))
+        self.cheapest.reverse()
+        self.shortest = min((c.minutes for c in self.candidates), default=0)
+        self.best = None
+        self.best_key = (-1, 0)
+        self.nodes = 0
+        self.deadline = None
+
+    def cheapest_sum(self, count, start=0):
+        """ return the price of the count cheapest candidates from start,
+        over the budget if there are less.
+        """
+        sums = self.cheapest[start]
+        if count >= len(sums):
+            return self.budget + 1
+        return sums[count]
+
+    def suffix_counts(self, start, count):
+        """ return the most tags count candidates from start have."""
+        return sum(self.counts[start:start + count])
+
+    def record(self, chosen, tags, price):
+        key = (tags, -price)
+        if key > self.best_key:
+            self.best_key = key
+            self.best = list(chosen)
+
+    def cut(self, price, most_tags, least_price):
+        """ return whether a branch of price so far, adding most_tags at
+        most and least_price at least can't beat the best plan.
+        """
+        best_tags, best_price = self.best_key
+        price += least_price
+
+        return price > self.budget or most_tags < best_tags or \
+            most_tags == best_tags and price >= -best_price
+
+    def greedy(self):
+        """ fill the slots in order with the recipe adding the most tags
+        for the least, for a first plan to beat.
+        """
+        used = set()
+        chosen = []
+        covered = price = 0
+        for slot in range(self.slots):
+            meal = slot % self.meals
+            if meal == 0:
+                day_minutes = 0
+            later = self.meals - meal - 1
+            room = self.minutes - day_minutes - later * self.shortest
+            spare = self.budget - price - self.cheapest_sum(
+                self.slots - slot - 1)
+            pick = None
+            for index, candidate in enumerate(self.candidates):
+                if index in used or candidate.price > spare or \
+                        candidate.minutes > room:
+                    continue
+                key = (count_tags(candidate.tags & ~covered),
+                       -candidate.price)
+                if pick is None or key > pick[0]:
+                    pick = (key, index)
+            if pick is None:
+                return
+            index = pick[1]
+            candidate = self.candidates[index]
+            used.add(index)
+            chosen.append(index)
+            covered |= candidate.tags
+            price += candidate.price
+            day_minutes += candidate.minutes
+        self.record(chosen, count_tags(covered), price)
+
+    def search(self, chosen, used, first, covered, tags, price, day_minutes):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 and \
+                time.monotonic() > self.deadline:
+            raise Deadline
+        slot = len(chosen)
+        if slot == self.slots:
+            self.record(chosen, tags, price)
+            return
+        left = self.slots - slot
+        most = tags + count_tags(self.all_tags & ~covered)
+        meal = slot % self.meals
+        if meal == 0:
+            day_minutes = 0
+            start = first + 1
+        else:
+            start = chosen[-1] + 1
+            # the rest of the plan comes after the first of the day.
+            if self.cut(price, min(most, tags + self.suffix_counts(
+                    first + 1, left)), self.cheapest_sum(left, first + 1)):
+                return
+            spare = self.budget - price - self.cheapest_sum(left - 1,
+                                                            first + 1)
+        later = self.meals - meal - 1
+        room = self.minutes - day_minutes - later * self.shortest
+
+        for index in range(start, len(self.candidates)):
+            if meal == 0:
+                # the rest comes after index, the bounds only get worse
+                # with it.
+                if self.cut(price, min(most, tags + self.suffix_counts(
+                        index, left)), self.cheapest_sum(left, index)):
+                    return
+                spare = self.budget - price - self.cheapest_sum(left - 1,
+                                                                index + 1)
+            if used[index]:
+                continue
+            candidate = self.candidates[index]
+            if candidate.price > spare or candidate.minutes > room:
+                continue
+            gained = count_tags(candidate.tags & ~covered)
+            used[index] = True
+            chosen.append(index)
+            self.search(chosen, used, index if meal == 0 else first,
+                        covered | candidate.tags, tags + gained,
+                        price + candidate.price,
+                        day_minutes + candidate.minutes)
+            chosen.pop()
+            used[index] = False
+
+    def solve(self, time_limit=None):
+        """ return the best plan found, within time_limit seconds if
+        given.
+        """
+        self.deadline = None if time_limit is None else \
+            time.monotonic() + time_limit
+        optimal = True
+        if len(self.candidates) >= self.slots:
+            self.greedy()
+            try:
+                self.search([], [False] * len(self.candidates), -1, 0, 0, 0,
+                            0)
+            except Deadline:
+                optimal = False
+        if self.best is None:
+            return Plan([], 0, 0, optimal)
+        ids = [self.candidates[index].id for index in self.best]
+        days = [ids[day * self.meals:(day + 1) * self.meals]
+                for day in range(self.days)]
+
+        return Plan(days, self.best_key[0], -self.best_key[1], optimal)
+
+
+def solve(candidates, days, meals, budget, minutes, time_limit=None):
+    """ return the plan of days of meals candidates, each used once, with
+    the most distinct tags and then the lowest price, costing budget at most
+    and taking minutes a day at most. its days are empty if none fits.
+
+    the plan is the best found in time_limit seconds if given, its optimal
+    is false if the search ran out of time.
+    """
+    return Solver(candidates, days, meals, budget, minutes).solve(time_limit)
+
+
+def keep(plan, candidates, ids):
+    """ return plan without its recipes missing from ids, deleted since
+    it was searched, its tags and price those of the candidates kept. a
+    plan that lost recipes is not optimal.
+    """
+    days = [[pk for pk in day if pk in ids] for day in plan.days]
+    if days == plan.days:
+        return plan
+    by_id = {candidate.id: candidate for candidate in candidates}
+    kept = [by_id[pk] for day in days for pk in day]
+    covered = 0
+    for candidate in kept:
+        covered |= candidate.tags
+
+    return Plan(days, count_tags(covered),
+                sum(candidate.price for candidate in kept), False)
+
+
+def load_candidates(user_id, budget, minutes, using=DEFAULT_DB_ALIAS):
+    """ return the live recipes of user_id costing budget and taking
+    minutes at most as candidates, their tags numbered in order of reading.
+    """
+    fits = {
+        'deleted_at__isnull': True,
+        'price__lte': budget,
+        'time_minutes__lte': minutes,
+    }
+    bits = {}
+    tags = {}
+    for recipe_id, tag_id in RecipeTag.objects.using(using).filter(
+        user_id=user_id,
+        recipe__user_id=user_id,
+        **{f'recipe__{lookup}': value for lookup, value in fits.items()}
+    ).values_list('recipe_id', 'tag_id'):
+        bit = bits.setdefault(tag_id, len(bits))
+        tags[recipe_id] = tags.get(recipe_id, 0) | 1 << bit
+    recipes = Recipe.objects.using(using).filter(user_id=user_id, **fits)
+
+    return [
+        Candidate(pk, int(price * 100), time_minutes, tags.get(pk, 0))
+        for pk, price, time_minutes in recipes.values_list(
+            'id', 'price', 'time_minutes')
+    ]
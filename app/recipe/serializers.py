@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField, \
+    PKOnlyObject
 
-from core.models import Tag, Ingredient, Recipe
+from core.fields import links_attr
+from core.models import Tag, Ingredient, Recipe, RecipeIngredient
+from core.units import UNIT_CHOICES
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -10,6 +14,13 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', )
 
 
+class TagStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = fields
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
@@ -17,30 +28,96 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', )
 
 
+class IngredientStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ingredient
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = fields
+
+
+class LinkedTargetsMixin:
+    """ read the targets of a recipe relation from the links of its owner,
+    when the view prefetched them with core.fields.prefetch_links().
+    """
+
+    def get_attribute(self, instance):
+        links = getattr(instance, links_attr(self.source), None)
+        if links is None:
+            return super().get_attribute(instance)
+
+        return self.targets(links)
+
+
+class LinkedManyRelatedField(LinkedTargetsMixin, ManyRelatedField):
+
+    def targets(self, links):
+        # the ids are all the field renders.
+        return [PKOnlyObject(getattr(link, f'{link.target}_id'))
+                for link in links]
+
+
+class LinkedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return LinkedManyRelatedField(**list_kwargs)
+
+
+class LinkedListSerializer(LinkedTargetsMixin, serializers.ListSerializer):
+
+    def targets(self, links):
+        return [getattr(link, link.target) for link in links]
+
+
 class RecipeSerializer(serializers.ModelSerializer):
+    """ serialize a recipe, optionally with some of its fields only.
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    fields names the fields to keep, expand the relations rendered as
+    objects instead of ids.
+    """
+    ingredients = LinkedPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = LinkedPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
 
+    expandable = {
+        'ingredients': IngredientSerializer,
+        'tags': TagSerializer,
+    }
+
     class Meta:
         model = Recipe
         fields = (
-            'id', 'title', 'ingredients', 'tags', 'time_minutes', 'price',
-            'link'
+            'id', 'title', 'ingredients', 'tags', 'time_minutes',
+            'servings', 'price', 'link'
         )
         read_only_fields = ('id', )
 
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = LinkedListSerializer(
+                child=self.expandable[name](), read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 
 class RecipeDetailSerializer(RecipeSerializer):
+    """ serialize a recipe with its ingredients and tags expanded."""
 
-    ingredients = IngredientSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('expand', tuple(self.expandable))
+        super().__init__(*args, **kwargs)
 
 
 class RecipeImageSerializer(RecipeSerializer):
@@ -49,3 +126,107 @@ class RecipeImageSerializer(RecipeSerializer):
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000
+    )
+
+
+def validate_ids(value, message):
+    """ return the comma separated ids of value, refusing none."""
+    ids = [int(str_id) for str_id in value.split(',') if str_id.isdigit()]
+    if not ids:
+        raise serializers.ValidationError(message)
+
+    return ids
+
+
+class SyncQuerySerializer(serializers.Serializer):
+
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000,
+                                     default=500)
+
+
+class StatsQuerySerializer(serializers.Serializer):
+
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+
+class CoverageQuerySerializer(serializers.Serializer):
+
+    ingredients = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def validate_ingredients(self, value):
+        """ return the comma separated ids of the ingredients at hand."""
+        return validate_ids(value, 'Give ingredient ids.')
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class IngredientQuantitySerializer(serializers.Serializer):
+    """ serialize how much of an ingredient a recipe takes."""
+    id = serializers.IntegerField()
+    name = serializers.CharField(read_only=True)
+    quantity = serializers.DecimalField(
+        max_digits=RecipeIngredient._meta.get_field('quantity').max_digits,
+        decimal_places=3,
+        min_value=0,
+        allow_null=True
+    )
+    unit = serializers.ChoiceField(choices=UNIT_CHOICES, default='')
+
+
+class TotalQuantitySerializer(IngredientQuantitySerializer):
+    """ serialize a quantity computed over recipes, which may not fit the
+    digits of a stored one.
+    """
+    quantity = serializers.DecimalField(max_digits=None, decimal_places=3,
+                                        allow_null=True)
+
+
+class ScaleQuerySerializer(serializers.Serializer):
+
+    servings = serializers.IntegerField(min_value=1, max_value=1000)
+
+
+class ShoppingListQuerySerializer(serializers.Serializer):
+
+    recipes = serializers.CharField()
+    servings = serializers.IntegerField(min_value=1, max_value=1000,
+                                        required=False)
+
+    def validate_recipes(self, value):
+        """ return the comma separated ids of the recipes to shop for."""
+        ids = validate_ids(value, 'Give recipe ids.')
+        if len(ids) > 100:
+            raise serializers.ValidationError(
+                'Give at most 100 recipe ids.')
+
+        return ids
+
+
+class MealPlanQuerySerializer(serializers.Serializer):
+
+    budget = serializers.DecimalField(max_digits=8, decimal_places=2,
+                                      min_value=0)
+    minutes = serializers.IntegerField(min_value=1, max_value=1440)
+    days = serializers.IntegerField(min_value=1, max_value=14, default=7)
+    meals = serializers.IntegerField(min_value=1, max_value=3, default=1)
+
+
+class MealSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'time_minutes', 'price')
+        read_only_fields = fields
@@ -0,0 +1,243 @@
+import asyncio
+import json
+
+from io import StringIO
+
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TransactionTestCase, \
+    override_settings
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.asyncdb import close_databases
+from core.models import Recipe, Tag, Ingredient
+from core.routers import mark_write
+from recipe.async_views import AsyncReadRouter, Request, handles, \
+    read_alias, security_headers
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def get(path, query='', token=None, headers=()):
+    """ return the status, headers and body the router sends for a GET,
+    and whether it passed the request on to django.
+    """
+    sent, passed_on = [], []
+
+    async def django_application(scope, receive, send):
+        passed_on.append(scope['path'])
+
+    async def send(message):
+        sent.append(message)
+
+    headers = list(headers)
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {'type': 'http', 'method': 'GET', 'path': path,
+             'query_string': query.encode(), 'headers': headers}
+    run(AsyncReadRouter(django_application)(scope, None, send))
+    if passed_on:
+        return None
+
+    return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+
+class RequestFilterTest(SimpleTestCase):
+
+    def request(self, query='', headers=(), scheme='http'):
+        return Request({'path': '/', 'query_string': query.encode(),
+                        'headers': list(headers), 'scheme': scheme})
+
+    def test_json_requests_handled(self):
+        """ test that plain json reads are answered asynchronously."""
+        self.assertTrue(handles(self.request('name=a'), {'name'}))
+        self.assertTrue(handles(
+            self.request(headers=[(b'accept', b'application/json')]), set()))
+
+    def test_other_requests_left_to_django(self):
+        """ test that the browsable api, unknown parameters and profiled
+        requests are left to django.
+        """
+        self.assertFalse(handles(
+            self.request(headers=[(b'accept', b'text/html')]), set()))
+        self.assertFalse(handles(self.request('format=api'), {'name'}))
+        self.assertFalse(handles(
+            self.request(headers=[(b'x-profile', b'token')]), set()))
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_insecure_requests_left_to_django(self):
+        """ test that requests django redirects to https are left to it."""
+        self.assertFalse(handles(self.request(), set()))
+        self.assertTrue(handles(self.request(scheme='https'), set()))
+
+    @override_settings(SECURE_HSTS_SECONDS=3600,
+                       SECURE_HSTS_INCLUDE_SUBDOMAINS=True,
+                       SECURE_REFERRER_POLICY='same-origin, origin',
+                       SECURE_PROXY_SSL_HEADER=('HTTP_X_FORWARDED_PROTO',
+                                                'https'))
+    def test_security_headers(self):
+        """ test that the security middleware headers are built from
+        the settings.
+        """
+        forwarded = self.request(
+            headers=[(b'x-forwarded-proto', b'https')])
+
+        self.assertEqual(dict(security_headers(forwarded)), {
+            b'strict-transport-security': b'max-age=3600; includeSubDomains',
+            b'x-content-type-options': b'nosniff',
+            b'referrer-policy': b'same-origin,origin',
+        })
+        self.assertNotIn(b'strict-transport-security',
+                         dict(security_headers(self.request())))
+
+    @override_settings(DATABASE_REPLICAS={'replica': 1})
+    def test_read_alias_sticky(self):
+        """ test that a user who just wrote reads from the primary."""
+        response = HttpResponse()
+        mark_write(response, 1)
+        cookie = response.cookies.output(attrs=[], header='').strip()
+        marked = self.request(headers=[(b'cookie', cookie.encode())])
+
+        self.assertEqual(read_alias(marked, 1), 'default')
+        self.assertEqual(read_alias(marked, 2), 'replica')
+        self.assertEqual(read_alias(self.request(), 1), 'replica')
+
+    def test_lifespan(self):
+        """ test that the router completes the asgi lifespan itself."""
+        messages = asyncio.Queue()
+        for message in ('lifespan.startup', 'lifespan.shutdown'):
+            messages.put_nowait({'type': message})
+        sent = []
+
+        async def send(message):
+            sent.append(message['type'])
+        run(AsyncReadRouter(None)({'type': 'lifespan'}, messages.get, send))
+
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'async reads need postgres')
+class AsyncReadTest(TransactionTestCase):
+    """ test that the async reads answer like the django views."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(run, close_databases())
+
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.soup = Recipe.objects.create(user=self.user, title='Soup',
+                                          time_minutes=5, price=5.5)
+        self.soup.tags.add(self.vegan)
+        self.soup.ingredients.add(self.salt)
+        Recipe.objects.create(user=self.user, title='Salad',
+                              time_minutes=10, price=2, link='https://a.b')
+        other = get_user_model().objects.create_user(
+            'other@testmail.com', 'testPass')
+        Tag.objects.create(user=other, name='Raw')
+
+    def assertSameAsDjango(self, path, query=''):
+        status, headers, body = get(path, query, self.token)
+        res = self.client.get(f'{path}?{query}')
+
+        self.assertEqual(status, res.status_code)
+        self.assertEqual(body, res.content)
+        self.assertEqual({name.decode() for name in headers},
+                         set(res._headers))
+        for name, value in headers.items():
+            self.assertEqual(value.decode(), res[name.decode()])
+
+    def test_recipe_list(self):
+        """ test that the recipe list matches the django view."""
+        self.assertSameAsDjango('/api/recipe/recipes/')
+        self.assertSameAsDjango('/api/recipe/recipes/',
+                                f'tags={self.vegan.id},x')
+        self.assertSameAsDjango('/api/recipe/recipes/',
+                                f'ingredients={self.salt.id + 1}')
+
+    def test_recipe_detail(self):
+        """ test that a recipe matches the django detail view."""
+        self.assertSameAsDjango(f'/api/recipe/recipes/{self.soup.id}/')
+
+    def test_attribute_lists(self):
+        """ test that the tag and ingredient lists match django."""
+        Tag.objects.create(user=self.user, name='Fruity')
+        self.assertSameAsDjango('/api/recipe/tags/')
+        self.assertSameAsDjango('/api/recipe/tags/', 'name=vEGAN')
+        self.assertSameAsDjango('/api/recipe/ingredients/')
+
+    def test_reads_left_to_django_not_throttled(self):
+        """ test that a token is only taken for the reads answered here,
+        django takes its own for the others.
+        """
+        rates = {**settings.REST_FRAMEWORK,
+                 'DEFAULT_THROTTLE_RATES': {'read': '2/min'}}
+        with override_settings(REST_FRAMEWORK=rates, THROTTLE_TABLE=''):
+            self.assertIsNone(get('/api/recipe/recipes/0/', token=self.token))
+            for _ in range(2):
+                self.assertIsNotNone(
+                    get('/api/recipe/recipes/', token=self.token))
+            self.assertIsNone(get('/api/recipe/recipes/', token=self.token))
+
+    def test_deleted_recipe_hidden(self):
+        """ test that recipes waiting for deletion are not listed."""
+        self.client.delete(f'/api/recipe/recipes/{self.soup.id}/')
+
+        _, _, body = get('/api/recipe/recipes/', token=self.token)
+
+        self.assertEqual([r['title'] for r in json.loads(body)], ['Salad'])
+
+    def test_left_to_django(self):
+        """ test that errors and missing rows are answered by django."""
+        self.assertIsNone(get('/api/recipe/recipes/'))
+        self.assertIsNone(get('/api/recipe/recipes/', token='invalid'))
+        self.assertIsNone(get('/api/recipe/recipes/0/', token=self.token))
+        self.assertIsNone(get('/api/user/me/', token=self.token))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(get('/api/recipe/tags/', token=self.token))
+
+    @override_settings(ASYNC_READS=False)
+    def test_disabled(self):
+        """ test that every read goes to django when turned off."""
+        self.assertIsNone(get('/api/recipe/tags/', token=self.token))
+
+
+class ThreadedAsyncReadTest(AsyncReadTest):
+    """ test the async reads without asyncpg installed."""
+
+    def setUp(self):
+        patcher = patch('core.asyncdb.asyncpg', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'async reads need postgres')
+class BenchmarkReadsTest(TransactionTestCase):
+
+    def test_runs_compared(self):
+        """ test that the benchmark reports every run and cleans up."""
+        out = StringIO()
+        call_command('benchmark_reads', requests=4, concurrency=2,
+                     threads=2, recipes=3, stdout=out)
+
+        for run in ('wsgi', 'asgi, django views', 'asgi, async reads'):
+            self.assertIn(run, out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
@@ -0,0 +1,162 @@
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.deletion import delete_recipe_attrs, request_recipe_deletion
+from core.models import Ingredient, Recipe
+
+from recipe import coverage
+
+
+COOK_URL = reverse('recipe:recipe-cook')
+
+
+class CoverageIndexTest(TestCase):
+    """ test the ranking of the coverage index."""
+
+    def setUp(self):
+        self.recipes = {
+            1: {1, 2},
+            2: {1, 2, 3},
+            3: {3, 4, 5},
+            4: {1},
+            5: {2, 6},
+        }
+        self.index = coverage.CoverageIndex()
+        self.index.load(self.recipes)
+
+    def brute_force(self, have, max_missing=None):
+        ranked = []
+        for recipe_id, ingredients in self.recipes.items():
+            covered = len(ingredients & have)
+            missing = sorted(ingredients - have)
+            if covered and (max_missing is None or
+                            len(missing) <= max_missing):
+                ranked.append((recipe_id, covered, missing))
+
+        return sorted(ranked, key=lambda row: (len(row[2]), -row[1], -row[0]))
+
+    def test_count_bits(self):
+        """ test that bit slices add up bitmaps."""
+        slices = coverage.count_bits([0b1011, 0b0011, 0b0001])
+
+        for position, total in enumerate([3, 2, 0, 1]):
+            self.assertEqual(
+                sum((bits >> position & 1) << j
+                    for j, bits in enumerate(slices)), total)
+
+    def test_matches_brute_force(self):
+        """ test that every query ranks like checking each recipe."""
+        for size in range(1, 4):
+            for have in combinations(range(1, 8), size):
+                self.assertEqual(self.index.search(have, 10),
+                                 self.brute_force(set(have)), have)
+
+    def test_limit_and_max_missing(self):
+        """ test that results stop at limit and max_missing."""
+        self.assertEqual(self.index.search([1, 2], 2),
+                         self.brute_force({1, 2})[:2])
+        self.assertEqual(self.index.search([1, 2], 10, max_missing=0),
+                         [(1, 2, []), (4, 1, [])])
+
+    def test_updates(self):
+        """ test that recipes are reindexed and removed in place."""
+        self.recipes[4] = {1, 2}
+        del self.recipes[2]
+        self.index.set(4, {1, 2})
+        self.index.remove(2)
+
+        self.assertEqual(self.index.search([1, 2, 3], 10),
+                         self.brute_force({1, 2, 3}))
+
+
+class CookApiTest(TestCase):
+    """ test the cook with what I have api."""
+
+    def setUp(self):
+        coverage.clear()
+        self.addCleanup(coverage.clear)
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.salt, self.egg, self.flour = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Egg', 'Flour')]
+        self.omelette = self.recipe('Omelette', self.salt, self.egg)
+        self.cake = self.recipe('Cake', self.egg, self.flour, self.salt)
+
+    def recipe(self, title, *ingredients):
+        recipe = Recipe.objects.create(user=self.user, title=title,
+                                       time_minutes=5, price=5)
+        recipe.ingredients.add(*ingredients)
+
+        return recipe
+
+    def cook(self, *ingredients, **params):
+        res = self.client.get(COOK_URL, {
+            'ingredients': ','.join(str(i.id) for i in ingredients),
+            **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [(row['title'], row['covered'], row['missing'])
+                for row in res.data]
+
+    def test_ranking(self):
+        """ test that recipes missing fewer ingredients come first."""
+        res = self.client.get(COOK_URL, {
+            'ingredients': f'{self.salt.id},{self.egg.id}'})
+
+        self.assertEqual(res.data[0], {
+            'id': self.omelette.id, 'title': 'Omelette', 'covered': 2,
+            'missing': 0, 'missing_ingredients': []})
+        self.assertEqual(res.data[1]['missing_ingredients'], [self.flour.id])
+
+    def test_limited_to_user(self):
+        """ test that recipes of other users are not ranked."""
+        other = get_user_model().objects.create_user('o@testmail.com', 'pw')
+        salt = Ingredient.objects.create(user=other, name='Salt')
+        recipe = Recipe.objects.create(user=other, title='Brine',
+                                       time_minutes=5, price=5)
+        recipe.ingredients.add(salt)
+
+        self.assertEqual(self.cook(salt), [])
+
+    def test_follows_changes(self):
+        """ test that the index follows the changes of the recipes."""
+        self.assertEqual(self.cook(self.flour), [('Cake', 1, 2)])
+
+        self.omelette.ingredients.add(self.flour)
+        self.cake.ingredients.remove(self.salt)
+        self.assertEqual(self.cook(self.flour, self.egg, max_missing=0),
+                         [('Cake', 2, 0)])
+        self.assertEqual(self.cook(self.flour),
+                         [('Cake', 1, 1), ('Omelette', 1, 2)])
+
+        request_recipe_deletion(Recipe.objects.filter(id=self.cake.id))
+        delete_recipe_attrs(Ingredient, self.user.id, [self.salt.id])
+        self.assertEqual(self.cook(self.flour), [('Omelette', 1, 1)])
+
+        self.recipe('Bread', self.flour)
+        self.assertEqual(self.cook(self.flour, max_missing=0),
+                         [('Bread', 1, 0)])
+
+    def test_catch_up_queries(self):
+        """ test that a search after a change reads what changed only."""
+        self.cook(self.egg)
+        self.recipe('Boiled egg', self.egg)
+
+        with self.assertNumQueries(4):
+            self.assertEqual(self.cook(self.egg, max_missing=0),
+                             [('Boiled egg', 1, 0)])
+
+    def test_needs_ingredients(self):
+        """ test that a search needs ingredient ids."""
+        res = self.client.get(COOK_URL, {'ingredients': 'salt'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
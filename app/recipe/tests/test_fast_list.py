@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.encoders import row_encoder
+from recipe.serializers import RecipeSerializer, TagSerializer, \
+    IngredientSerializer
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class FastListTest(TestCase):
+    """ test that the list endpoints render like their serializers."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        names = ['Vegan', 'Café "Noir"', 'back\\slash', 'line\u2028break',
+                 '漢字 \U0001f35c']
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in names]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name)
+                       for name in reversed(names)]
+        for i, title in enumerate(names):
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=i,
+                price=['5', '0.1', '12.35', '999.99', '3.14159'][i],
+                link='' if i % 2 else f'https://example.com/{i}'
+            )
+            # links added out of id order.
+            recipe.tags.add(*reversed(tags[:i]))
+            recipe.ingredients.add(*ingredients[i:])
+
+    def expected(self, serializer_class, queryset):
+        return JSONRenderer().render(
+            serializer_class(queryset, many=True).data)
+
+    def test_recipes_identical(self):
+        """ test that the recipe list is byte for byte the serializer's."""
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.content,
+                         self.expected(RecipeSerializer, recipes))
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    def test_filtered_recipes_identical(self):
+        """ test that filtered recipe lists match the serializer."""
+        tag = Tag.objects.get(name='Vegan')
+        res = self.client.get(RECIPE_URL, {'tags': f'{tag.id}'})
+
+        recipes = Recipe.objects.filter(tags=tag).order_by('-id')
+        self.assertEqual(res.content,
+                         self.expected(RecipeSerializer, recipes))
+
+    def test_attributes_identical(self):
+        """ test that the tag and ingredient lists match the serializer."""
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.content, self.expected(
+            TagSerializer, Tag.objects.order_by('-id')))
+
+        res = self.client.get(INGREDIENTS_URL)
+        self.assertEqual(res.content, self.expected(
+            IngredientSerializer, Ingredient.objects.order_by('-id')))
+
+    def test_empty_list(self):
+        """ test that a user without recipes gets an empty list."""
+        Recipe.objects.all().delete()
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.content, b'[]')
+
+    def test_browsable_api_uses_serializer(self):
+        """ test that other formats than json still render."""
+        res = self.client.get(RECIPE_URL, HTTP_ACCEPT='text/html')
+
+        self.assertContains(res, 'Vegan')
+
+
+class EncoderTest(TestCase):
+
+    def test_unsupported_field(self):
+        """ test that fields without an encoder are refused up front."""
+        class DateSerializer(serializers.Serializer):
+            day = serializers.DateField()
+
+        with self.assertRaises(TypeError):
+            row_encoder(DateSerializer())
+
+    def test_null_values(self):
+        """ test that None renders as null."""
+        class NullSerializer(serializers.Serializer):
+            name = serializers.CharField(allow_null=True)
+
+        self.assertEqual(row_encoder(NullSerializer())((None, )),
+                         '{"name":null}')
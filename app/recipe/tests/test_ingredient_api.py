@@ -1,3 +1,5 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -5,12 +7,18 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 
 from recipe import serializers
 
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+BULK_DELETE_URL = reverse('recipe:ingredient-bulk-delete')
+
+
+def detail_url(ingredient_id):
+    """ return ingredient detail url"""
+    return reverse('recipe:ingredient-detail', args=[ingredient_id])
 
 
 class PublicIngredientsAPITest(TestCase):
@@ -46,7 +54,7 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(json.loads(res.content), serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """ test that ingredients returned for authenticated user. """
@@ -59,8 +67,9 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        data = json.loads(res.content)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['name'], ingredient.name)
 
     def test_create_ingredients_successful(self):
         """ test that ingredients create successful."""
@@ -80,3 +89,46 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.post(INGREDIENT_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_ingredients_by_name(self):
+        """ test that ingredients can be looked up by name ignoring case."""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Pepper')
+        res = self.client.get(INGREDIENT_URL, {'name': 'salt'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        data = json.loads(res.content)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], ingredient.id)
+
+    def test_delete_ingredient(self):
+        """ test that deleting an ingredient unlinks it from its recipes."""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=5)
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.delete(detail_url(ingredient.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertEqual(list(recipe.ingredients.all()), [])
+
+    def test_bulk_delete_ingredients(self):
+        """ test that bulk delete returns what it deleted."""
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ing {i}')
+            for i in range(2)]
+
+        res = self.client.post(BULK_DELETE_URL, {
+            'ids': [ingredient.id for ingredient in ingredients]},
+            format='json')
+
+        self.assertEqual(res.data, {'deleted': 2, 'unlinked': 0})
+        self.assertFalse(Ingredient.objects.exists())
+
+    def test_bulk_delete_needs_ids(self):
+        """ test that bulk delete rejects an empty list."""
+        res = self.client.post(BULK_DELETE_URL, {'ids': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,223 @@
+import random
+
+from itertools import combinations, permutations
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.deletion import request_recipe_deletion
+from core.models import Recipe, Tag
+
+from recipe import mealplan
+from recipe.mealplan import Candidate
+
+
+MEAL_PLAN_URL = reverse('recipe:recipe-meal-plan')
+
+
+def brute_force(candidates, days, meals, budget, minutes):
+    """ return the tags and price of the best plan trying every one."""
+    best = (0, 0)
+    for chosen in combinations(candidates, days * meals):
+        price = sum(c.price for c in chosen)
+        if price > budget:
+            continue
+        # any split of chosen into days will do.
+        for order in permutations(chosen):
+            days_minutes = [
+                sum(c.minutes for c in order[day * meals:(day + 1) * meals])
+                for day in range(days)]
+            if max(days_minutes) <= minutes:
+                tags = 0
+                for c in chosen:
+                    tags |= c.tags
+                key = (bin(tags).count('1'), -price)
+                best = max(best, key)
+                break
+
+    return best[0], -best[1]
+
+
+class SolverTest(TestCase):
+    """ test the meal plan solver."""
+
+    def random_candidates(self, rng, count):
+        return [Candidate(pk, rng.randint(1, 20), rng.randint(5, 40),
+                          rng.getrandbits(6))
+                for pk in range(1, count + 1)]
+
+    def test_matches_brute_force(self):
+        """ test that the plan is the best of every plan."""
+        rng = random.Random(0)
+        for _ in range(60):
+            candidates = self.random_candidates(rng, rng.randint(3, 7))
+            days = rng.randint(1, 2)
+            meals = rng.randint(1, 2)
+            budget = rng.randint(10, 60)
+            minutes = rng.randint(20, 70)
+            tags, price = brute_force(candidates, days, meals, budget,
+                                      minutes)
+
+            plan = mealplan.solve(candidates, days, meals, budget, minutes)
+
+            self.assertTrue(plan.optimal)
+            if not plan.days:
+                self.assertEqual((tags, price), (0, 0))
+                continue
+            self.assertEqual((plan.tags, plan.price), (tags, price))
+            chosen = {c.id: c for c in candidates}
+            for day in plan.days:
+                self.assertEqual(len(day), meals)
+                self.assertLessEqual(sum(chosen[pk].minutes for pk in day),
+                                     minutes)
+
+    def test_dominated_dropped(self):
+        """ test that candidates beaten by slots others of their tags are
+        dropped.
+        """
+        candidates = [Candidate(1, 5, 10, 1), Candidate(2, 6, 10, 1),
+                      Candidate(3, 7, 20, 1), Candidate(4, 9, 5, 1),
+                      Candidate(5, 9, 30, 2)]
+
+        kept = mealplan.undominated(candidates, 2)
+
+        self.assertEqual(sorted(c.id for c in kept), [1, 2, 4, 5])
+
+    def test_deadline(self):
+        """ test that the best plan found is returned when time runs out."""
+        rng = random.Random(1)
+        candidates = [Candidate(pk, rng.randint(100, 2000),
+                                rng.randint(10, 60), rng.getrandbits(20))
+                      for pk in range(1, 501)]
+
+        plan = mealplan.solve(candidates, 7, 2, 10000, 90, time_limit=0)
+
+        self.assertFalse(plan.optimal)
+        self.assertEqual(len(plan.days), 7)
+        self.assertLessEqual(plan.price, 10000)
+
+    def test_none_fits(self):
+        """ test that the days are empty when no plan fits."""
+        candidates = [Candidate(1, 10, 10, 1), Candidate(2, 10, 10, 2)]
+
+        self.assertEqual(mealplan.solve(candidates, 2, 1, 15, 60).days, [])
+        self.assertEqual(mealplan.solve(candidates, 3, 1, 50, 60).days, [])
+
+
+class MealPlanApiTest(TestCase):
+    """ test the meal plan api."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan, self.quick, self.spicy = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Quick', 'Spicy')]
+
+    def recipe(self, title, price, time_minutes, tags=(), user=None):
+        recipe = Recipe.objects.create(user=user or self.user, title=title,
+                                       price=price, time_minutes=time_minutes)
+        recipe.tags.add(*tags)
+
+        return recipe
+
+    def test_plan_within_budget_and_minutes(self):
+        """ test that the plan covers the most tags within the limits."""
+        salad = self.recipe('Salad', '3.50', 10, [self.vegan, self.quick])
+        curry = self.recipe('Curry', '6.00', 40, [self.vegan, self.spicy])
+        self.recipe('Chili', '9.00', 50, [self.spicy])
+        self.recipe('Stew', '4.00', 120, [self.quick, self.spicy])
+
+        res = self.client.get(MEAL_PLAN_URL, {'budget': '10', 'minutes': 45,
+                                              'days': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], 3)
+        self.assertEqual(res.data['price'], '9.50')
+        self.assertTrue(res.data['optimal'])
+        self.assertEqual(
+            sorted(day['recipes'][0]['id'] for day in res.data['days']),
+            [salad.id, curry.id])
+        for day in res.data['days']:
+            self.assertLessEqual(day['time_minutes'], 45)
+
+    def test_meals_per_day(self):
+        """ test that the meals of a day fit its minutes together."""
+        self.recipe('Salad', '3.00', 20, [self.vegan])
+        self.recipe('Curry', '3.00', 30, [self.spicy])
+        self.recipe('Toast', '3.00', 10, [self.quick])
+        self.recipe('Soup', '3.00', 15, [self.vegan])
+
+        res = self.client.get(MEAL_PLAN_URL, {'budget': '20', 'minutes': 40,
+                                              'days': 2, 'meals': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['price'], '12.00')
+        for day in res.data['days']:
+            self.assertEqual(len(day['recipes']), 2)
+            self.assertLessEqual(day['time_minutes'], 40)
+
+    def test_other_users_and_deleted_excluded(self):
+        """ test that only live recipes of the user are planned."""
+        other = get_user_model().objects.create_user(
+            'other@testmail.com', 'testPass')
+        self.recipe('Theirs', '1.00', 5, user=other)
+        deleted = self.recipe('Deleted', '1.00', 5)
+        request_recipe_deletion(Recipe.objects.filter(pk=deleted.pk))
+        mine = self.recipe('Mine', '2.00', 5)
+
+        res = self.client.get(MEAL_PLAN_URL, {'budget': '5', 'minutes': 10,
+                                              'days': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['days'][0]['recipes'][0]['id'], mine.id)
+
+    def test_deleted_while_searched(self):
+        """ test that recipes deleted during the search are left out."""
+        salad = self.recipe('Salad', '3.50', 10, [self.vegan, self.quick])
+        curry = self.recipe('Curry', '6.00', 40, [self.vegan, self.spicy])
+        load_candidates = mealplan.load_candidates
+
+        def load_then_delete(*args, **kwargs):
+            candidates = load_candidates(*args, **kwargs)
+            request_recipe_deletion(Recipe.objects.filter(pk=curry.pk))
+            return candidates
+
+        with patch('recipe.mealplan.load_candidates', load_then_delete):
+            res = self.client.get(MEAL_PLAN_URL, {'budget': '10',
+                                                  'minutes': 45, 'days': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted([meal['id'] for meal in day['recipes']]
+                                for day in res.data['days']), [[], [salad.id]])
+        self.assertEqual(res.data['tags'], 2)
+        self.assertEqual(res.data['price'], '3.50')
+        self.assertFalse(res.data['optimal'])
+
+    def test_nothing_fits(self):
+        """ test that the days are empty when no plan fits."""
+        self.recipe('Roast', '30.00', 200, [self.vegan])
+
+        res = self.client.get(MEAL_PLAN_URL, {'budget': '10', 'minutes': 60})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['days'], [])
+        self.assertEqual(res.data['tags'], 0)
+
+    def test_invalid_params(self):
+        """ test that bad limits are rejected."""
+        for params in ({'minutes': 60}, {'budget': '10'},
+                       {'budget': '-1', 'minutes': 60},
+                       {'budget': '10', 'minutes': 60, 'days': 15},
+                       {'budget': '10', 'minutes': 60, 'meals': 0}):
+            res = self.client.get(MEAL_PLAN_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             params)
@@ -0,0 +1,191 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Change, Ingredient, Recipe, RecipeIngredient
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+def quantities_url(recipe_id):
+    """ return quantities of recipe url"""
+    return reverse('recipe:recipe-quantities', args=[recipe_id])
+
+
+def scale_url(recipe_id):
+    """ return scale recipe url"""
+    return reverse('recipe:recipe-scale', args=[recipe_id])
+
+
+class QuantitiesApiTest(TestCase):
+    """ test the ingredient quantities of recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flour, self.milk, self.egg = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Flour', 'Milk', 'Egg')]
+        self.pancakes = self.recipe('Pancakes', 4, {
+            self.flour: ('250', 'g'),
+            self.milk: ('0.5', 'l'),
+            self.egg: ('2', ''),
+        })
+        self.bread = self.recipe('Bread', 2, {
+            self.flour: ('0.5', 'kg'),
+            self.milk: ('2', 'cup'),
+            self.egg: (None, ''),
+        })
+
+    def recipe(self, title, servings, quantities, user=None):
+        user = user or self.user
+        recipe = Recipe.objects.create(user=user, title=title,
+                                       time_minutes=5, price=5,
+                                       servings=servings)
+        recipe.ingredients.add(*quantities)
+        for ingredient, (quantity, unit) in quantities.items():
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient=ingredient
+            ).update(quantity=quantity, unit=unit)
+
+        return recipe
+
+    def test_quantities(self):
+        """ test that quantities are listed with their units."""
+        res = self.client.get(quantities_url(self.pancakes.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': self.flour.id, 'name': 'Flour', 'quantity': '250.000',
+             'unit': 'g'},
+            {'id': self.milk.id, 'name': 'Milk', 'quantity': '0.500',
+             'unit': 'l'},
+            {'id': self.egg.id, 'name': 'Egg', 'quantity': '2.000',
+             'unit': ''},
+        ])
+
+    def test_set_quantities(self):
+        """ test that quantities are set on the recipe ingredients and
+        recorded as a change of the recipe.
+        """
+        res = self.client.put(quantities_url(self.pancakes.id), [
+            {'id': self.flour.id, 'quantity': '300', 'unit': 'g'},
+            {'id': self.egg.id, 'quantity': None},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        links = dict(RecipeIngredient.objects.filter(
+            recipe=self.pancakes).values_list('ingredient_id', 'quantity'))
+        self.assertEqual(links, {self.flour.id: Decimal(300),
+                                 self.milk.id: Decimal('0.5'),
+                                 self.egg.id: None})
+        self.assertTrue(Change.objects.filter(
+            kind=Change.RECIPE, object_id=self.pancakes.id))
+
+    def test_set_quantity_of_other_ingredient(self):
+        """ test that only ingredients of the recipe get quantities."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+        res = self.client.put(quantities_url(self.pancakes.id), [
+            {'id': self.flour.id, 'quantity': '300', 'unit': 'g'},
+            {'id': salt.id, 'quantity': '1', 'unit': 'tsp'},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(RecipeIngredient.objects.get(
+            recipe=self.pancakes, ingredient=self.flour).quantity, 250)
+
+    def test_unknown_unit(self):
+        """ test that units are checked."""
+        res = self.client.put(quantities_url(self.pancakes.id), [
+            {'id': self.flour.id, 'quantity': '3', 'unit': 'handful'},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_scale(self):
+        """ test that a recipe is scaled to other servings."""
+        res = self.client.get(scale_url(self.pancakes.id), {'servings': 6})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['servings'], 6)
+        self.assertEqual([(row['quantity'], row['unit'])
+                          for row in res.data['ingredients']],
+                         [('375.000', 'g'), ('0.750', 'l'), ('3.000', '')])
+
+    def test_scale_needs_servings(self):
+        """ test that scaling needs a number of servings."""
+        res = self.client.get(scale_url(self.pancakes.id), {'servings': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_needs_servings(self):
+        """ test that a recipe for no servings is refused, its quantities
+        could not be scaled.
+        """
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Toast', 'time_minutes': 5, 'price': 1, 'servings': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.patch(
+            reverse('recipe:recipe-detail', args=[self.pancakes.id]),
+            {'servings': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertRaises(IntegrityError):
+            Recipe.objects.filter(id=self.pancakes.id).update(servings=0)
+
+    def test_shopping_list(self):
+        """ test that quantities are added up in their base units."""
+        res = self.client.get(SHOPPING_LIST_URL, {
+            'recipes': f'{self.pancakes.id},{self.bread.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': self.egg.id, 'name': 'Egg', 'quantity': '2.000',
+             'unit': ''},
+            {'id': self.flour.id, 'name': 'Flour', 'quantity': '750.000',
+             'unit': 'g'},
+            {'id': self.milk.id, 'name': 'Milk', 'quantity': '973.176',
+             'unit': 'ml'},
+        ])
+
+    def test_shopping_list_servings(self):
+        """ test that every recipe is scaled to the servings given, with
+        one query.
+        """
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'recipes': f'{self.pancakes.id},{self.bread.id}',
+                'servings': 1,
+            })
+
+        self.assertEqual(
+            [(row['name'], row['quantity']) for row in res.data],
+            [('Egg', '0.500'), ('Flour', '312.500'), ('Milk', '361.588')])
+
+    def test_shopping_list_of_user(self):
+        """ test that recipes of other users and hidden ones are left
+        out.
+        """
+        other = get_user_model().objects.create_user('o@testmail.com', 'pw')
+        flour = Ingredient.objects.create(user=other, name='Flour')
+        recipe = self.recipe('Bread', 1, {flour: ('1', 'kg')}, user=other)
+        self.bread.deleted_at = self.bread.created_at
+        self.bread.save()
+
+        res = self.client.get(SHOPPING_LIST_URL, {
+            'recipes': f'{self.pancakes.id},{self.bread.id},{recipe.id}'})
+
+        self.assertEqual(
+            [(row['name'], row['quantity']) for row in res.data],
+            [('Egg', '2.000'), ('Flour', '250.000'), ('Milk', '500.000')])
@@ -0,0 +1,144 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+TAG_STATS_URL = reverse('recipe:tag-stats')
+INGREDIENT_STATS_URL = reverse('recipe:ingredient-stats')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans of postgres')
+class QueryPlanTest(TestCase):
+    """ test that the api queries are served by the access pattern indexes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        users = [
+            get_user_model().objects.create_user(f'test{i}@testmail.com',
+                                                 'testPass')
+            for i in range(4)
+        ]
+        self.user = users[0]
+        self.client.force_authenticate(self.user)
+
+        for user in users:
+            for i in range(5):
+                tag = Tag.objects.create(user=user, name=f'Tag {i}')
+                ingredient = Ingredient.objects.create(user=user,
+                                                       name=f'Ingredient {i}')
+                recipe = Recipe.objects.create(user=user, title=f'recipe {i}',
+                                               time_minutes=5, price=5)
+                recipe.tags.add(tag)
+                recipe.ingredients.add(ingredient)
+            Tag.objects.bulk_create(
+                Tag(user=user, name=f'Extra tag {i}') for i in range(200))
+            Ingredient.objects.bulk_create(
+                Ingredient(user=user, name=f'Extra ingredient {i}')
+                for i in range(200))
+        self.tag = Tag.objects.filter(user=self.user).first()
+        self.ingredient = Ingredient.objects.filter(user=self.user).first()
+
+        with connection.cursor() as cursor:
+            for table in ('core_recipe', 'core_tag', 'core_ingredient',
+                          'core_recipe_tags', 'core_recipe_ingredients'):
+                cursor.execute(f'ANALYZE {table}')
+
+    def plan(self, url, params, table, disable=('seqscan', )):
+        """ return the plan of the query on table run by a GET of url."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, params)
+        sql = [
+            query['sql'] for query in context.captured_queries
+            if f'FROM "{table}"' in query['sql']
+        ][0]
+
+        with connection.cursor() as cursor:
+            for setting in disable:
+                cursor.execute(f'SET LOCAL enable_{setting} = off')
+            cursor.execute('EXPLAIN ' + sql)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_recipe_list_uses_user_id_index(self):
+        """ test that the recipe list is read in order from (user, id)."""
+        plan = self.plan(RECIPE_URL, {}, 'core_recipe',
+                         disable=('seqscan', 'sort'))
+
+        self.assertIn('core_recipe_user_id_id_idx', plan)
+
+    def test_tag_list_uses_user_id_index(self):
+        """ test that the tag list is read in order from (user, id)."""
+        plan = self.plan(TAGS_URL, {}, 'core_tag',
+                         disable=('seqscan', 'sort'))
+
+        self.assertIn('core_tag_user_id_id_idx', plan)
+
+    def test_ingredient_list_uses_user_id_index(self):
+        """ test that the ingredient list is read in order from (user, id)."""
+        plan = self.plan(INGREDIENT_URL, {}, 'core_ingredient',
+                         disable=('seqscan', 'sort'))
+
+        self.assertIn('core_ingredient_user_id_id_idx', plan)
+
+    def test_tag_stats_use_usage_index(self):
+        """ test that tag stats are read in order from the usage index."""
+        plan = self.plan(TAG_STATS_URL, {}, 'core_tag',
+                         disable=('seqscan', 'sort'))
+
+        self.assertIn('core_tag_usage_idx', plan)
+
+    def test_ingredient_stats_use_usage_index(self):
+        """ test that ingredient stats are read from the usage index."""
+        plan = self.plan(INGREDIENT_STATS_URL, {}, 'core_ingredient',
+                         disable=('seqscan', 'sort'))
+
+        self.assertIn('core_ingredient_usage_idx', plan)
+
+    def test_tag_name_filter_uses_lower_name_index(self):
+        """ test that the name lookup uses the (user, lower(name)) index."""
+        plan = self.plan(TAGS_URL, {'name': 'tag 1'}, 'core_tag')
+
+        self.assertIn('core_tag_user_lower_name_idx', plan)
+
+    def test_ingredient_name_filter_uses_lower_name_index(self):
+        """ test that the name lookup uses the (user, lower(name)) index."""
+        plan = self.plan(INGREDIENT_URL, {'name': 'ingredient 1'},
+                         'core_ingredient')
+
+        self.assertIn('core_ingredient_user_lower_name_idx', plan)
+
+    def test_admin_search_uses_lower_name_index(self):
+        """ test that the admin search reads the lower(name) prefixes."""
+        self.client.force_login(get_user_model().objects.create_superuser(
+            'admin@testmail.com', 'testPass'))
+
+        plan = self.plan(reverse('admin:core_tag_changelist'),
+                         {'q': 'extra tag 1'}, 'core_tag')
+
+        self.assertIn('core_tag_lower_name_idx', plan)
+
+    def test_recipe_tag_filter_uses_reverse_index(self):
+        """ test that filtering by tag reads core_recipe_tags by owner and
+        tag.
+        """
+        plan = self.plan(RECIPE_URL, {'tags': self.tag.id}, 'core_recipe')
+
+        self.assertIn('core_recipe_tags_user_tag_recipe_idx', plan)
+
+    def test_recipe_ingredient_filter_uses_reverse_index(self):
+        """ test that filtering by ingredient reads the reverse index."""
+        plan = self.plan(RECIPE_URL, {'ingredients': self.ingredient.id},
+                         'core_recipe')
+
+        self.assertIn('core_recipe_ingredients_user_ingredient_recipe_idx',
+                      plan)
@@ -1,3 +1,4 @@
+import json
 import tempfile
 import os
 
@@ -16,6 +17,7 @@ from recipe import serializers
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
 
 
 def upload_image_url(recipe_id):
@@ -23,6 +25,11 @@ def upload_image_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def similar_url(recipe_id):
+    """ return similar recipes of recipe url"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
 def detail_url(recipe_id):
     """ return recipe detail url"""
     return reverse('recipe:recipe-detail', args=[recipe_id])
@@ -85,8 +92,9 @@ class PrivateRecipeAPITest(TestCase):
         serializer = serializers.RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
-        self.assertEqual(res.data, serializer.data)
+        data = json.loads(res.content)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data, serializer.data)
 
     def test_recipe_limited_to_user(self):
         """ test that list return authorized user recipes."""
@@ -102,9 +110,10 @@ class PrivateRecipeAPITest(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = serializers.RecipeSerializer(recipes, many=True)
 
-        self.assertEqual(res.data, serializer.data)
+        data = json.loads(res.content)
+        self.assertEqual(data, serializer.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(data), 1)
 
     def test_recipe_detail(self):
         """ test viewing a recipe detail. """
@@ -254,6 +263,104 @@ class PrivateRecipeAPITest(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(tags.count(), 0)
 
+    def test_filter_recipes_by_tags(self):
+        """ test returning recipes with specific tags."""
+        recipe1 = sample_recipe(self.user, title='recipe 1')
+        recipe2 = sample_recipe(self.user, title='recipe 2')
+        recipe3 = sample_recipe(self.user, title='recipe 3')
+        tag1 = sample_tag(self.user, 'tag 1')
+        tag2 = sample_tag(self.user, 'tag 2')
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag2)
+        recipe2.tags.add(tag1)
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [recipe['id'] for recipe in json.loads(res.content)]
+        self.assertEqual(ids, [recipe2.id, recipe1.id])
+        self.assertNotIn(recipe3.id, ids)
+
+    def test_filter_recipes_by_ingredients(self):
+        """ test returning recipes with specific ingredients."""
+        recipe1 = sample_recipe(self.user, title='recipe 1')
+        recipe2 = sample_recipe(self.user, title='recipe 2')
+        ingredient = sample_ingredient(self.user, 'ingredient 1')
+        recipe1.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPE_URL, {'ingredients': f'{ingredient.id}'})
+
+        ids = [recipe['id'] for recipe in json.loads(res.content)]
+        self.assertEqual(ids, [recipe1.id])
+        self.assertNotIn(recipe2.id, ids)
+
+    def test_delete_recipe_hidden(self):
+        """ test that a deleted recipe is hidden before it's purged."""
+        recipe = sample_recipe(self.user)
+        res = self.client.delete(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(json.loads(self.client.get(RECIPE_URL).content), [])
+        res = self.client.get(detail_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Recipe.objects.pending_deletion().exists())
+
+    def test_bulk_delete_recipes(self):
+        """ test that bulk delete queues only the user's own recipes."""
+        recipe1 = sample_recipe(self.user, title='recipe 1')
+        recipe2 = sample_recipe(self.user, title='recipe 2')
+        other = get_user_model().objects.create_user(
+            email='other@testmail.com',
+            password='testPass'
+        )
+        other_recipe = sample_recipe(other)
+        res = self.client.post(BULK_DELETE_URL, {
+            'ids': [recipe1.id, other_recipe.id]
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data, {'pending': 1})
+        res = self.client.get(RECIPE_URL)
+        ids = [recipe['id'] for recipe in json.loads(res.content)]
+        self.assertEqual(ids, [recipe2.id])
+        other_recipe.refresh_from_db()
+        self.assertIsNone(other_recipe.deleted_at)
+
+    def test_bulk_delete_needs_ids(self):
+        """ test that bulk delete rejects an empty list."""
+        res = self.client.post(BULK_DELETE_URL, {'ids': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_recipes(self):
+        """ test that similar recipes share tags or ingredients."""
+        tag = sample_tag(self.user)
+        salt = sample_ingredient(self.user, name='Salt')
+        egg = sample_ingredient(self.user, name='Egg')
+        recipe = sample_recipe(self.user, title='Omelette')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(salt, egg)
+        similar = sample_recipe(self.user, title='Boiled egg')
+        similar.ingredients.add(salt, egg)
+        sample_recipe(self.user, title='Water')
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{
+            'id': similar.id, 'title': 'Boiled egg', 'similarity': 2 / 3}])
+
+    def test_similar_recipes_of_other_user(self):
+        """ test that other users' recipes can't be compared."""
+        other = get_user_model().objects.create_user(
+            email='other@testmail.com',
+            password='testPass'
+        )
+        recipe = sample_recipe(other)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class RecipeUploadImageTest(TestCase):
 
@@ -0,0 +1,112 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.serializers import RecipeSerializer
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """ return recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeFieldsTest(TestCase):
+    """ test the fields and expand parameters of the recipe api."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                     for i in range(3)]
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ing {i}')
+            for i in range(3)]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'recipe {i}', time_minutes=i,
+                price='1.50')
+            recipe.tags.add(*self.tags[i:])
+            recipe.ingredients.add(*self.ingredients[:i])
+        self.recipe = recipe
+
+    def recipes(self):
+        return Recipe.objects.filter(user=self.user).order_by('-id')
+
+    def test_list_fields(self):
+        """ test that only the requested fields are queried and returned."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPE_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), [
+            {'id': recipe.id, 'title': recipe.title}
+            for recipe in self.recipes()])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('price', queries[0]['sql'])
+
+    def test_list_expand(self):
+        """ test that expanded lists render like the serializer."""
+        res = self.client.get(RECIPE_URL, {'expand': 'tags,ingredients'})
+
+        serializer = RecipeSerializer(
+            self.recipes(), many=True, expand=('tags', 'ingredients'))
+        self.assertEqual(res.content, JSONRenderer().render(serializer.data))
+        self.assertEqual(json.loads(res.content)[0]['tags'],
+                         [{'id': self.tags[2].id, 'name': 'tag 2'}])
+
+    def test_list_expand_one_field(self):
+        """ test that fields and expand combine."""
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                RECIPE_URL, {'fields': 'id,tags', 'expand': 'tags'})
+
+        serializer = RecipeSerializer(
+            self.recipes(), many=True, fields=('id', 'tags'),
+            expand=('tags', ))
+        self.assertEqual(json.loads(res.content), serializer.data)
+
+    def test_detail_expanded_by_default(self):
+        """ test that a detail renders its tags and ingredients."""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(len(res.data['ingredients']), 2)
+        self.assertEqual(res.data['tags'][0],
+                         {'id': self.tags[2].id, 'name': 'tag 2'})
+
+    def test_detail_fields(self):
+        """ test that a detail of some fields skips the relations."""
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(self.recipe.id),
+                                  {'fields': 'id,price'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id, 'price': '1.50'})
+
+    def test_detail_not_expanded(self):
+        """ test that an empty expand renders ids."""
+        res = self.client.get(detail_url(self.recipe.id), {'expand': ''})
+
+        self.assertEqual(res.data['tags'], [self.tags[2].id])
+
+    def test_unknown_field(self):
+        """ test that unknown fields and expansions are refused."""
+        res = self.client.get(RECIPE_URL, {'fields': 'id,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(detail_url(self.recipe.id), {'expand': 'price'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,142 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def sample_recipe(user, title='Soup'):
+    return Recipe.objects.create(user=user, title=title, time_minutes=5,
+                                 price=5)
+
+
+class PublicSyncApiTest(TestCase):
+
+    def test_login_required(self):
+        """ test that login is required to sync."""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@testmail.com', 'testPass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=0, **params):
+        res = self.client.get(SYNC_URL, {'since': since, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data
+
+    def test_first_sync_returns_everything(self):
+        """ test that syncing from zero returns all live objects."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        other = get_user_model().objects.create_user(
+            'other@testmail.com', 'testPass')
+        Tag.objects.create(user=other, name='Fruity')
+
+        data = self.sync()
+
+        self.assertEqual([t['id'] for t in data['tags']], [tag.id])
+        self.assertEqual(
+            [i['id'] for i in data['ingredients']], [ingredient.id])
+        self.assertEqual(len(data['recipes']), 1)
+        self.assertEqual(data['recipes'][0]['tags'], [tag.id])
+        self.assertEqual(data['recipes'][0]['ingredients'], [ingredient.id])
+        self.assertFalse(data['more'])
+
+    def test_nothing_changed(self):
+        """ test that syncing at the latest cursor returns nothing."""
+        sample_recipe(self.user)
+        cursor = self.sync()['cursor']
+
+        with CaptureQueriesContext(connection) as context:
+            data = self.sync(cursor)
+
+        self.assertEqual(data['cursor'], cursor)
+        self.assertEqual(data['recipes'], [])
+        self.assertEqual(
+            data['deleted'], {'recipes': [], 'tags': [], 'ingredients': []})
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_only_changes_returned(self):
+        """ test that only objects changed after the cursor are returned."""
+        recipe = sample_recipe(self.user)
+        sample_recipe(self.user, 'Salad')
+        cursor = self.sync()['cursor']
+
+        recipe.title = 'Stew'
+        recipe.save()
+        data = self.sync(cursor)
+
+        self.assertEqual([r['title'] for r in data['recipes']], ['Stew'])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_membership_change_returns_recipe(self):
+        """ test that adding a tag to a recipe returns the recipe."""
+        recipe = sample_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        cursor = self.sync()['cursor']
+
+        recipe.tags.add(tag)
+        data = self.sync(cursor)
+
+        self.assertEqual(data['recipes'][0]['tags'], [tag.id])
+        self.assertEqual(data['tags'], [])
+
+    def test_deleted_objects_returned(self):
+        """ test that deleted recipes and tags come back as tombstones."""
+        recipe = sample_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag_id = tag.id
+        kept = sample_recipe(self.user, 'Salad')
+        kept.tags.add(tag)
+        cursor = self.sync()['cursor']
+
+        self.client.delete(
+            reverse('recipe:recipe-detail', args=[recipe.id]))
+        tag.delete()
+        data = self.sync(cursor)
+
+        self.assertEqual(data['deleted']['recipes'], [recipe.id])
+        self.assertEqual(data['deleted']['tags'], [tag_id])
+        self.assertEqual([r['id'] for r in data['recipes']], [kept.id])
+        self.assertEqual(data['recipes'][0]['tags'], [])
+
+    def test_paging(self):
+        """ test that a limited sync pages through the changes."""
+        recipes = [sample_recipe(self.user, f'recipe {i}') for i in range(5)]
+
+        first = self.sync(limit=3)
+        second = self.sync(first['cursor'], limit=3)
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(
+            [r['id'] for r in first['recipes'] + second['recipes']],
+            [r.id for r in recipes]
+        )
+
+    def test_invalid_cursor(self):
+        """ test that a negative or non numeric cursor is rejected."""
+        for since in (-1, 'abc'):
+            res = self.client.get(SYNC_URL, {'since': since})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,16 +1,27 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Change, Tag, Recipe
 
 from recipe import serializers
 
 
 TAGS_URL = reverse('recipe:tag-list')
+STATS_URL = reverse('recipe:tag-stats')
+BULK_DELETE_URL = reverse('recipe:tag-bulk-delete')
+
+
+def detail_url(tag_id):
+    """ return tag detail url"""
+    return reverse('recipe:tag-detail', args=[tag_id])
 
 
 class PublicTagsAPITest(TestCase):
@@ -46,7 +57,7 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(json.loads(res.content), serializer.data)
 
     def test_tags_limited_to_user(self):
         """ test that tags returned for authenticated user. """
@@ -59,8 +70,9 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        data = json.loads(res.content)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """ test that tags create successful."""
@@ -80,3 +92,93 @@ class PrivateTagsAPITest(TestCase):
         res = self.client.post(TAGS_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_tags_by_name(self):
+        """ test that tags can be looked up by name ignoring case."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+        res = self.client.get(TAGS_URL, {'name': 'vEGAN'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        data = json.loads(res.content)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], tag.id)
+
+    def test_tag_stats(self):
+        """ test that tag stats list the most used tags first."""
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('Vegan', 'Quick', 'Cheap')]
+        for i in range(3):
+            recipe = Recipe.objects.create(user=self.user, title=f'r{i}',
+                                           time_minutes=5, price=5)
+            recipe.tags.add(*tags[1:i + 1])
+        Tag.objects.create(
+            user=get_user_model().objects.create_user('o@testmail.com', 'pw'),
+            name='Other')
+
+        res = self.client.get(STATS_URL, {'limit': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': tags[1].id, 'name': 'Quick', 'recipe_count': 2},
+            {'id': tags[2].id, 'name': 'Cheap', 'recipe_count': 1},
+        ])
+
+    def test_delete_tag(self):
+        """ test that deleting a tag unlinks it from its recipes."""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=5)
+        recipe.tags.add(tag)
+
+        res = self.client.delete(detail_url(tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Tag.objects.filter(id=tag.id).exists())
+        self.assertEqual(list(recipe.tags.all()), [])
+        self.assertTrue(Change.objects.filter(
+            kind=Change.TAG, object_id=tag.id, deleted=True).exists())
+
+    def test_delete_tag_of_other_user(self):
+        """ test that tags of other users can't be deleted."""
+        other = get_user_model().objects.create_user('o@testmail.com', 'pw')
+        tag = Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.delete(detail_url(tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Tag.objects.filter(id=tag.id).exists())
+
+    def test_bulk_delete_tags(self):
+        """ test that bulk delete removes only the user's own tags."""
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(3)]
+        recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                       time_minutes=5, price=5)
+        recipe.tags.add(*tags)
+        other = Tag.objects.create(
+            user=get_user_model().objects.create_user('o@testmail.com', 'pw'),
+            name='Other')
+
+        res = self.client.post(BULK_DELETE_URL, {
+            'ids': [tags[0].id, tags[1].id, other.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2, 'unlinked': 2})
+        self.assertEqual(list(recipe.tags.all()), [tags[2]])
+        self.assertTrue(Tag.objects.filter(id=other.id).exists())
+
+    def test_bulk_delete_queries(self):
+        """ test that bulk delete queries as much for more tags."""
+        def delete(count):
+            tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                    for i in range(count)]
+            recipe = Recipe.objects.create(user=self.user, title='Soup',
+                                           time_minutes=5, price=5)
+            recipe.tags.add(*tags)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(BULK_DELETE_URL, {
+                    'ids': [tag.id for tag in tags]}, format='json')
+            return len(queries)
+
+        self.assertEqual(delete(2), delete(10))
@@ -1,58 +1,359 @@
+import hashlib
+
+from decimal import Decimal
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Lower
+
 from rest_framework import mixins, viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from core.models import Tag, Ingredient, Recipe
+from core.cache import api_cache, user_namespace
+from core import similarity
+from core.deletion import delete_recipe_attrs, request_recipe_deletion
+from core.fields import prefetch_links
+from core.models import Change, Tag, Ingredient, Recipe, RecipeTag, \
+    RecipeIngredient
+from core.units import QUANTITY, base_unit, in_base_unit
+
+from . import coverage, mealplan
+from .encoders import row_encoder, render_rows, EncodedResponse
 
 from .serializers import TagSerializer, IngredientSerializer,\
-                         RecipeSerializer, RecipeDetailSerializer,\
-                         RecipeImageSerializer
+                         TagStatsSerializer, IngredientStatsSerializer,\
+                         RecipeSerializer, RecipeImageSerializer,\
+                         BulkDeleteSerializer,\
+                         SyncQuerySerializer, StatsQuerySerializer,\
+                         CoverageQuerySerializer, SimilarQuerySerializer,\
+                         IngredientQuantitySerializer,\
+                         TotalQuantitySerializer, ScaleQuerySerializer,\
+                         ShoppingListQuerySerializer,\
+                         MealPlanQuerySerializer, MealSerializer
+
+
+def linked_ids(through, column, user, recipe_ids):
+    """ return the ids of column linked to each recipe, from one grouped
+    query on the through table of user.
+    """
+    if not recipe_ids:
+        return {}
+    links = through.objects.filter(user=user, recipe_id__in=recipe_ids)
+    if connections[links.db].vendor == 'postgresql':
+        from django.contrib.postgres.aggregates import ArrayAgg
+        return dict(
+            links.values('recipe_id')
+            .annotate(ids=ArrayAgg(column, ordering=column))
+            .values_list('recipe_id', 'ids')
+            .order_by()
+        )
+
+    grouped = {}
+    for recipe_id, target_id in links.order_by(column).values_list(
+            'recipe_id', column):
+        grouped.setdefault(recipe_id, []).append(target_id)
+
+    return grouped
+
+
+def linked_rows(through, relation, fields, user, recipe_ids):
+    """ return the fields of the relation objects linked to each recipe,
+    as rows ordered by id, from one query on the through table of user.
+    """
+    grouped = {}
+    if not recipe_ids:
+        return grouped
+    columns = [f'{relation}__{name}' for name in fields]
+    links = through.objects.filter(user=user, recipe_id__in=recipe_ids)\
+        .order_by(f'{relation}_id').values_list('recipe_id', *columns)
+    for recipe_id, *row in links:
+        grouped.setdefault(recipe_id, []).append(tuple(row))
+
+    return grouped
+
+
+def scaled(quantity, servings, recipe_servings):
+    """ return an expression of quantity for servings instead of the
+    recipe_servings it's for, computed by the database.
+    """
+    # a decimal with a fraction, sqlite divides integers as integers.
+    servings = Decimal(servings).quantize(Decimal('0.001'))
+
+    return ExpressionWrapper(
+        quantity * Value(servings) / recipe_servings, output_field=QUANTITY)
+
+
+def quantity_rows(links, quantity=F('quantity')):
+    """ return the ingredient, its name, quantity and unit of links, in
+    ingredient order.
+    """
+    return [
+        {'id': pk, 'name': name, 'quantity': amount, 'unit': unit}
+        for pk, name, amount, unit in links.annotate(amount=quantity)
+        .order_by('ingredient_id')
+        .values_list('ingredient_id', 'ingredient__name', 'amount', 'unit')
+    ]
+
+
+class FastListMixin:
+    """ list rows of values() with an encoder made for the serializer,
+    without serializer instances. the output is the same as the
+    serializer's, other formats than json use the serializer.
+    """
+
+    def get_list_rows(self, queryset, serializer):
+        """ return rows holding the values of the serializer fields."""
+        return queryset.values_list(*serializer.fields)
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json' or \
+                self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer()
+        rows = self.get_list_rows(queryset, serializer)
+
+        return EncodedResponse(render_rows(row_encoder(serializer), rows))
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+class BaseRecipeAttrViewSet(FastListMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
-                            mixins.CreateModelMixin):
+                            mixins.CreateModelMixin,
+                            mixins.DestroyModelMixin):
     """ base class to make recipe attributes easier."""
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        """ retrieve object of authenticated user."""
-        return self.queryset.filter(user=self.request.user)
+        """ retrieve object of authenticated user, optionally by name.
+
+        ?name= matches ignoring case, read from the (user, lower(name))
+        index of 0006_user_access_indexes.
+        """
+        queryset = self.queryset.filter(user=self.request.user)
+        name = self.request.query_params.get('name')
+        if name:
+            queryset = queryset.annotate(name_lower=Lower('name')).filter(
+                name_lower=Lower(Value(name))
+            )
+
+        return queryset.order_by('-id')
+
+    def get_serializer_class(self):
+        """ return appropriate serializer class."""
+        if self.action == 'stats':
+            return self.stats_serializer_class
+        elif self.action == 'bulk_delete':
+            return BulkDeleteSerializer
+
+        return self.serializer_class
 
     def perform_create(self, serializer):
         """ create new objects. """
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """ delete the object and its links to recipes."""
+        delete_recipe_attrs(self.queryset.model, instance.user_id,
+                            [instance.pk])
+
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """ delete objects of the user and their links to recipes."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        counts = delete_recipe_attrs(self.queryset.model, request.user.id,
+                                     serializer.validated_data['ids'])
+
+        return Response(counts)
+
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """ return the objects used by the most recipes first, read in
+        order from the usage index.
+        """
+        query = StatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        queryset = self.get_queryset().order_by('-recipe_count', 'id')
+
+        def compute():
+            return list(self.get_serializer(
+                queryset[:query.validated_data['limit']], many=True).data)
+
+        # cached until the user changes something, see Change.record.
+        cache = api_cache()
+        params = hashlib.md5(
+            request.query_params.urlencode().encode()).hexdigest()
+        key = cache.key_in(user_namespace(request.user.id),
+                           f'{self.basename}-stats:{params}')
+
+        return Response(cache.get_or_compute(key, compute))
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """ manage Tag in database. """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    stats_serializer_class = TagStatsSerializer
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """ manage Ingredient in database. """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    stats_serializer_class = IngredientStatsSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    """ manage recipe objects"""
+class RecipeViewSet(FastListMixin, viewsets.ModelViewSet):
+    """ manage recipe objects.
+
+    lists take ?tags= and ?ingredients=, comma separated ids, to return
+    the recipes linked to any of them. they read the through tables by
+    owner and target, from the indexes of 0016_owner_link_indexes.
+
+    lists and details take ?fields= to return some fields only and
+    ?expand= to render ingredients or tags as objects, details expand
+    both unless asked otherwise. the queries load the requested columns
+    and relations only.
+    """
     permission_classes = (IsAuthenticated, )
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
+    relations = {
+        'ingredients': (RecipeIngredient, 'ingredient'),
+        'tags': (RecipeTag, 'tag'),
+    }
+
+    def _params_to_ints(self, qs):
+        """ convert a comma separated list of ids to a list of integers."""
+        return [int(str_id) for str_id in qs.split(',') if str_id.isdigit()]
+
+    def _params_to_names(self, param, allowed):
+        """ convert a comma separated list of names to a tuple, refusing
+        the names not in allowed.
+        """
+        names = tuple(name.strip()
+                      for name in self.request.query_params[param].split(',')
+                      if name.strip())
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValidationError(
+                {param: [f'unknown field: {name}' for name in unknown]})
+
+        return names
+
+    def get_shape(self):
+        """ return the fields and the expanded relations to render."""
+        if not hasattr(self, '_shape'):
+            params = self.request.query_params
+            fields, expand = None, ()
+            if self.action == 'retrieve':
+                expand = tuple(RecipeSerializer.expandable)
+            if params.get('fields'):
+                fields = self._params_to_names(
+                    'fields', RecipeSerializer.Meta.fields)
+            if 'expand' in params:
+                expand = self._params_to_names(
+                    'expand', RecipeSerializer.expandable)
+            self._shape = fields, expand
+
+        return self._shape
 
     def get_queryset(self):
         """ retrieve the objects of authenticated user."""
-        return self.queryset.filter(user=self.request.user)
+        user = self.request.user
+        queryset = self.queryset.live().filter(user=user)
+        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients')
+        # the through rows are matched on their owner in the same filter()
+        # so a partitioned through table is read from one partition.
+        if tags:
+            queryset = queryset.filter(
+                tags__id__in=self._params_to_ints(tags),
+                tag_links__user=user
+            )
+        if ingredients:
+            queryset = queryset.filter(
+                ingredients__id__in=self._params_to_ints(ingredients),
+                ingredient_links__user=user
+            )
+        if tags or ingredients:
+            queryset = queryset.distinct()
+        queryset = queryset.order_by('-id')
+
+        if self.action in ('similar', 'quantities', 'scale'):
+            # these read the recipe row only.
+            return queryset
+        if self.action not in ('list', 'retrieve'):
+            # a single recipe, its relations are read by owner when it's
+            # serialized.
+            return queryset
+
+        fields, expand = self.get_shape()
+        fields = fields or RecipeSerializer.Meta.fields
+        # the relations are read from the links of user, the objects
+        # they link only when expanded.
+        lookups = [
+            prefetch_links(Recipe, name, user.id, targets=name in expand)
+            for name in fields if name in self.relations
+        ]
+
+        columns = ['user'] + [name for name in fields
+                              if name not in self.relations]
+
+        return queryset.only(*columns).prefetch_related(*lookups)
+
+    def get_list_rows(self, queryset, serializer):
+        """ return the recipe rows in the field order of serializer, with
+        the ids or the rows of their ingredients and tags.
+        """
+        fields = list(serializer.fields)
+        _, expand = self.get_shape()
+        columns = ['id'] + [name for name in fields
+                            if name != 'id' and name not in self.relations]
+        recipes = list(
+            queryset.prefetch_related(None).values_list(*columns))
+        recipe_ids = [recipe[0] for recipe in recipes]
+        user = self.request.user
+
+        getters = []
+        for name in fields:
+            if name not in self.relations:
+                getters.append(itemgetter(columns.index(name)))
+                continue
+            through, relation = self.relations[name]
+            if name in expand:
+                links = linked_rows(
+                    through, relation, serializer.fields[name].child.fields,
+                    user, recipe_ids)
+            else:
+                links = linked_ids(
+                    through, f'{relation}_id', user, recipe_ids)
+            getters.append(
+                lambda recipe, links=links: links.get(recipe[0], ()))
+
+        return [tuple([get(recipe) for get in getters]) for recipe in recipes]
+
+    def get_serializer(self, *args, **kwargs):
+        """ return the serializer, shaped by the request on reads."""
+        if self.action in ('list', 'retrieve'):
+            kwargs['fields'], kwargs['expand'] = self.get_shape()
+
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """ return appropriate serializer class."""
-        if self.action == 'retrieve':
-            return RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        if self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'bulk_delete':
+            return BulkDeleteSerializer
 
         return self.serializer_class
 
@@ -60,6 +361,209 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """ create a new recipe."""
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        """ hide the recipe, it's deleted in the background."""
+        request_recipe_deletion(
+            Recipe.objects.filter(user=instance.user_id, pk=instance.pk))
+
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """ queue recipes of the user for deletion."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pending = request_recipe_deletion(Recipe.objects.filter(
+            user=request.user,
+            id__in=serializer.validated_data['ids']
+        ))
+
+        return Response({'pending': pending}, status=status.HTTP_202_ACCEPTED)
+
+    @action(methods=['GET'], detail=False)
+    def cook(self, request):
+        """ rank the recipes of the user by how many of the ingredients
+        given they use and how many more they need, from the coverage index.
+        """
+        query = CoverageQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ranked = coverage.search(
+            request.user.id,
+            query.validated_data['ingredients'],
+            query.validated_data['limit'],
+            query.validated_data.get('max_missing')
+        )
+        titles = dict(Recipe.objects.live().filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, *_ in ranked]
+        ).values_list('id', 'title'))
+
+        return Response([
+            {
+                'id': recipe_id,
+                'title': titles[recipe_id],
+                'covered': covered,
+                'missing': len(missing),
+                'missing_ingredients': missing,
+            }
+            for recipe_id, covered, missing in ranked
+            if recipe_id in titles
+        ])
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """ return the recipes of the user sharing most tags and
+        ingredients with the recipe, from the signature buckets.
+        """
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        recipe = self.get_object()
+        ranked = similarity.similar(request.user.id, recipe.id,
+                                    query.validated_data['limit'])
+        titles = dict(Recipe.objects.live().filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, _ in ranked]
+        ).values_list('id', 'title'))
+
+        return Response([
+            {'id': recipe_id, 'title': titles[recipe_id], 'similarity': score}
+            for recipe_id, score in ranked
+            if recipe_id in titles
+        ])
+
+    def get_links(self, recipe):
+        """ return the ingredient links of recipe, read from the
+        partition of its owner.
+        """
+        return RecipeIngredient.objects.filter(user_id=recipe.user_id,
+                                               recipe=recipe)
+
+    @action(methods=['GET', 'PUT'], detail=True)
+    def quantities(self, request, pk=None):
+        """ return or set how much of each ingredient the recipe takes
+        for its servings.
+        """
+        recipe = self.get_object()
+        links = self.get_links(recipe)
+        if request.method == 'PUT':
+            serializer = IngredientQuantitySerializer(data=request.data,
+                                                      many=True)
+            serializer.is_valid(raise_exception=True)
+            self.set_quantities(recipe, links, serializer.validated_data)
+
+        return Response(IngredientQuantitySerializer(
+            quantity_rows(links), many=True).data)
+
+    def set_quantities(self, recipe, links, quantities):
+        """ store the quantities of the ingredients of recipe, with one
+        update per distinct quantity and unit.
+        """
+        by_amount = {}
+        for item in quantities:
+            by_amount.setdefault((item['quantity'], item['unit']), set())\
+                .add(item['id'])
+        ids = set().union(*by_amount.values())
+        with transaction.atomic():
+            unknown = ids - set(links.select_for_update().filter(
+                ingredient_id__in=ids).values_list('ingredient_id', flat=True))
+            if unknown:
+                raise ValidationError({'id': [
+                    f'not an ingredient of the recipe: {ingredient_id}'
+                    for ingredient_id in sorted(unknown)]})
+            for (quantity, unit), ingredient_ids in by_amount.items():
+                links.filter(ingredient_id__in=ingredient_ids).update(
+                    quantity=quantity, unit=unit)
+            Change.objects.record(recipe.user_id, Change.RECIPE, [recipe.id])
+
+    @action(methods=['GET'], detail=True)
+    def scale(self, request, pk=None):
+        """ return the quantities of the recipe for other servings."""
+        query = ScaleQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        recipe = self.get_object()
+        servings = query.validated_data['servings']
+        rows = quantity_rows(self.get_links(recipe), scaled(
+            F('quantity'), servings, Value(recipe.servings)))
+
+        return Response({
+            'id': recipe.id,
+            'servings': servings,
+            'ingredients': TotalQuantitySerializer(rows, many=True).data,
+        })
+
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """ return the total of each ingredient of the recipes given,
+        for servings of each if given, with one grouped query.
+
+        quantities are added up in the base unit of their units, grams,
+        millilitres or counts, an ingredient used in several kinds of unit
+        has a total for each.
+        """
+        query = ShoppingListQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        servings = query.validated_data.get('servings')
+        quantity = F('quantity')
+        if servings is not None:
+            quantity = scaled(quantity, servings, F('recipe__servings'))
+        totals = RecipeIngredient.objects.filter(
+            user=request.user,
+            recipe__user=request.user,
+            recipe__deleted_at__isnull=True,
+            recipe_id__in=query.validated_data['recipes']
+        ).annotate(base=base_unit()).values(
+            'ingredient_id', 'ingredient__name', 'base'
+        ).annotate(
+            total=Sum(in_base_unit(quantity), output_field=QUANTITY)
+        ).order_by('ingredient__name', 'ingredient_id', 'base')
+
+        return Response(TotalQuantitySerializer([
+            {'id': row['ingredient_id'], 'name': row['ingredient__name'],
+             'quantity': row['total'], 'unit': row['base']}
+            for row in totals
+        ], many=True).data)
+
+    @action(methods=['GET'], detail=False, url_path='meal-plan')
+    def meal_plan(self, request):
+        """ propose days of meals from the recipes of the user with the
+        most distinct tags, within a budget and minutes of cooking a day.
+
+        the plan is the best found in MEAL_PLAN_TIME_LIMIT seconds, optimal
+        tells whether none is better.
+        """
+        query = MealPlanQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        candidates = mealplan.load_candidates(
+            request.user.id, params['budget'], params['minutes'])
+        plan = mealplan.solve(
+            candidates,
+            params['days'],
+            params['meals'],
+            int(params['budget'] * 100),
+            params['minutes'],
+            settings.MEAL_PLAN_TIME_LIMIT
+        )
+        # recipes deleted during the search are left out of the plan.
+        recipes = Recipe.objects.live().filter(
+            user=request.user,
+            id__in=[pk for day in plan.days for pk in day]
+        ).only(*MealSerializer.Meta.fields).in_bulk()
+        plan = mealplan.keep(plan, candidates, recipes)
+
+        return Response({
+            'days': [
+                {
+                    'recipes': MealSerializer(
+                        [recipes[pk] for pk in day], many=True).data,
+                    'time_minutes': sum(
+                        recipes[pk].time_minutes for pk in day),
+                }
+                for day in plan.days
+            ],
+            'price': str(Decimal(plan.price).scaleb(-2)),
+            'tags': plan.tags,
+            'optimal': plan.optimal,
+        })
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         """ upload an image to a recipe."""
@@ -80,3 +584,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class SyncView(APIView):
+    """ return what changed for the user since a cursor.
+
+    the response carries the changed recipes, tags and ingredients, the
+    ids of deleted ones and the cursor to pass as since next time.
+    """
+    permission_classes = (IsAuthenticated,)
+    kinds = (
+        (Change.RECIPE, 'recipes', RecipeSerializer),
+        (Change.TAG, 'tags', TagSerializer),
+        (Change.INGREDIENT, 'ingredients', IngredientSerializer),
+    )
+
+    def get_objects(self, kind, ids):
+        user = self.request.user
+        if kind == Change.RECIPE:
+            return Recipe.objects.live().filter(user=user, id__in=ids)\
+                .prefetch_related(prefetch_links(Recipe, 'tags', user.id),
+                                  prefetch_links(Recipe, 'ingredients',
+                                                 user.id))
+        model = Tag if kind == Change.TAG else Ingredient
+
+        return model.objects.filter(user=user, id__in=ids)
+
+    def get(self, request):
+        query = SyncQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data['since']
+        limit = query.validated_data['limit']
+
+        changes = list(
+            Change.objects.filter(user=request.user, seq__gt=since)
+            .order_by('seq')
+            .values_list('kind', 'object_id', 'seq', 'deleted')[:limit + 1]
+        )
+        more = len(changes) > limit
+        changes = changes[:limit]
+
+        data = {
+            'cursor': changes[-1][2] if changes else since,
+            'more': more,
+            'deleted': {},
+        }
+        for kind, name, serializer_class in self.kinds:
+            changed, deleted = [], set()
+            for change_kind, object_id, _, is_deleted in changes:
+                if change_kind == kind:
+                    (deleted.add if is_deleted else changed.append)(object_id)
+            objects = []
+            if changed:
+                objects = list(
+                    self.get_objects(kind, changed).order_by('id'))
+            # an object deleted after its change was read is gone as well.
+            deleted.update(set(changed) - {obj.id for obj in objects})
+            data[name] = serializer_class(objects, many=True).data
+            data['deleted'][name] = sorted(deleted)
+
+        return Response(data)
@@ -1,6 +1,22 @@
 from django.contrib.auth import get_user_model
 
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_to_epoch
+
+
+def add_user_claims(token, user):
+    """ put the claims core.authentication trusts in stateless mode on
+    token, with the time they were read at.
+    """
+    token['is_active'] = user.is_active
+    token['is_staff'] = user.is_staff
+    token['iat'] = datetime_to_epoch(token.current_time)
+
+    return token
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,3 +38,34 @@ class UserSerializer(serializers.ModelSerializer):
             user.set_password(password)
             user.save()
         return user
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        """ return a refresh token whose access tokens carry the claims."""
+        return add_user_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+
+    def validate(self, attrs):
+        """ return a new access token with the current claims of the user,
+        the users deactivated since the login get none.
+        """
+        refresh = RefreshToken(attrs['refresh'])
+        user = get_user_model().objects.filter(**{
+            api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]
+        }).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User is inactive',
+                                       code='user_inactive')
+
+        data = {'access': str(add_user_claims(refresh.access_token, user))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            data['refresh'] = str(add_user_claims(refresh, user))
+
+        return data
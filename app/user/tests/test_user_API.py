@@ -1,14 +1,24 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.serializers import add_user_claims
 
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+VERIFY_URL = reverse('user:token-verify')
 ME_URL = reverse('user:me')
+PROVISION_URL = reverse('user:provision')
+TAGS_URL = reverse('recipe:tag-list')
 
 
 def create_user(**params):
@@ -137,3 +147,176 @@ class PrivateUserApiTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_delete_account_deactivates(self):
+        """ test that deleting the account deactivates it at once."""
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+
+
+class TokenApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.payload = {'email': 'test@testmail.com', 'password': 'testPass'}
+        self.user = create_user(name='testName', **self.payload)
+
+    def login(self):
+        return self.client.post(TOKEN_URL, self.payload).data
+
+    def test_access_token_claims(self):
+        """ test that access tokens carry the user claims."""
+        token = AccessToken(self.login()['access'])
+
+        self.assertTrue(token['is_active'])
+        self.assertFalse(token['is_staff'])
+        self.assertIn('iat', token)
+
+    def test_refresh_token(self):
+        """ test that a refresh token gets a working access token."""
+        refresh = self.login()['refresh']
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+        self.assertEqual(self.client.get(ME_URL).data['name'], 'testName')
+
+    def test_refresh_inactive_user(self):
+        """ test that deactivated users can't refresh their tokens."""
+        refresh = self.login()['refresh']
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_verify_token(self):
+        """ test that tokens can be verified."""
+        res = self.client.post(VERIFY_URL, {'token': self.login()['access']})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(VERIFY_URL, {'token': 'not.a.token'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_hash_upgraded_on_login(self):
+        """ test that logins hash passwords again with the policy."""
+        self.user.password = make_password(
+            'testPass', hasher='pbkdf2_sha1')
+        self.user.save()
+        self.login()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.login()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+@override_settings(JWT_STATELESS_SECONDS=60)
+class StatelessTokenTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='test@testmail.com',
+                                password='testPass', name='testName')
+
+    def authenticate(self, age=0):
+        token = add_user_claims(AccessToken.for_user(self.user), self.user)
+        token['iat'] -= age
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_fresh_token_skips_user_query(self):
+        """ test that fresh tokens authenticate without a user query."""
+        self.authenticate()
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_fresh_token_loads_profile(self):
+        """ test that the profile loads the fields the claims don't carry."""
+        self.authenticate()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data, {'email': self.user.email,
+                                    'name': 'testName'})
+
+        res = self.client.patch(ME_URL, {'name': 'new name'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'new name')
+        self.assertTrue(self.user.check_password('testPass'))
+
+    def test_stale_token_looks_user_up(self):
+        """ test that tokens older than the window read the user."""
+        self.authenticate(age=120)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProvisionApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            'admin@testmail.com', 'testPass')
+        self.client.force_authenticate(self.admin)
+
+    def provision(self, content, content_type='text/csv'):
+        return self.client.generic('POST', PROVISION_URL, content,
+                                   content_type=content_type)
+
+    def test_provision_users(self):
+        """ test that staff create users from a csv."""
+        with patch('core.provisioning.ProcessPoolExecutor') as pool:
+            res = self.provision(
+                'email,password,name\n'
+                'a@testmail.com,testPass,A\n'
+                'admin@testmail.com,testPass,B\n'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(result['line'], result['status']) for result in res.data],
+            [(2, 'created'), (3, 'duplicate')])
+        pool.assert_not_called()
+        self.assertTrue(get_user_model().objects.filter(
+            email='a@testmail.com', name='A').exists())
+
+    @override_settings(PROVISION_MAX_ROWS=1)
+    def test_provision_limited(self):
+        """ test that a csv holds PROVISION_MAX_ROWS users at most."""
+        res = self.provision(
+            'email,password,name\n'
+            'a@testmail.com,testPass,A\n'
+            'b@testmail.com,testPass,B\n'
+        )
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(get_user_model().objects.filter(
+            email='a@testmail.com').exists())
+
+    def test_provision_needs_csv(self):
+        """ test that other bodies than csv are refused."""
+        res = self.provision('{}', content_type='application/json')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_provision_staff_only(self):
+        """ test that users can't provision other users."""
+        self.client.force_authenticate(
+            create_user(email='test@testmail.com', password='testPass'))
+        res = self.provision('email,password\n')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
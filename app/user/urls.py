@@ -1,6 +1,6 @@
 from django.urls import path
 
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenVerifyView
 
 from . import views
 
@@ -8,7 +8,11 @@ app_name = 'user'
 
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
-    path('token/', TokenObtainPairView.as_view(), name='token'),
+    path('token/', views.TokenObtainPairView.as_view(), name='token'),
+    path('token/refresh/', views.TokenRefreshView.as_view(),
+         name='token-refresh'),
+    path('token/verify/', TokenVerifyView.as_view(), name='token-verify'),
     path('me/', views.UserProfileView.as_view(), name='me'),
+    path('provision/', views.ProvisionUsersView.as_view(), name='provision'),
 
 ]
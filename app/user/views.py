@@ -1,6 +1,21 @@
-from rest_framework import generics, permissions
+import codecs
+import csv
 
-from .serializers import UserSerializer
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework import generics, permissions, status, views
+from rest_framework.response import Response
+from rest_framework_simplejwt import views as jwt_views
+
+from core.deletion import request_user_deletion
+from core.provisioning import SerialExecutor, numbered, provision_batch
+from core.throttling import LoginRateThrottle
+
+from .serializers import UserSerializer, TokenObtainPairSerializer, \
+    TokenRefreshSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -8,11 +23,64 @@ class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(generics.RetrieveUpdateDestroyAPIView):
     """ manage authenticated users profile"""
     permission_classes = (permissions.IsAuthenticated, )
     serializer_class = UserSerializer
 
     def get_object(self):
         """ retrieve user object."""
-        return self.request.user
+        user = self.request.user
+        deferred = user.get_deferred_fields()
+        if deferred:
+            # authenticated from its token claims, the rest loads at once.
+            user.refresh_from_db(fields=deferred)
+
+        return user
+
+    def destroy(self, request, *args, **kwargs):
+        """ deactivate the account, its data is deleted in the background."""
+        request_user_deletion(self.get_object())
+
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """ issue a token pair for a password."""
+    serializer_class = TokenObtainPairSerializer
+    throttle_classes = (LoginRateThrottle, )
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    """ issue an access token for a refresh token, without the password."""
+    serializer_class = TokenRefreshSerializer
+
+
+class ProvisionUsersView(views.APIView):
+    """ create users from a csv of email, password and name, staff only.
+
+    the passwords are hashed in the request, one after the other, so a csv
+    holds PROVISION_MAX_ROWS users at most. larger files go through the
+    provision_users command, which hashes them on every core.
+    """
+    permission_classes = (permissions.IsAdminUser, )
+
+    def post(self, request):
+        if request.content_type != 'text/csv':
+            return Response({'detail': 'Send the users as text/csv.'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        limit = getattr(settings, 'PROVISION_MAX_ROWS', 50)
+        rows = csv.DictReader(codecs.iterdecode(request._request, 'utf-8'))
+        batch = list(islice(numbered(rows), limit + 1))
+        if len(batch) > limit:
+            return Response(
+                {'detail': f'Send at most {limit} users, provision larger '
+                           f'files with the provision_users command.'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        results = provision_batch(batch, SerialExecutor(), DEFAULT_DB_ALIAS)
+
+        return Response([
+            {'line': line, 'email': email, 'status': result,
+             'errors': errors}
+            for line, email, result, errors in results
+        ])